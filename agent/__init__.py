@@ -2,6 +2,7 @@ from .base_agent import BaseAgent
 from .always_send_notification_agent import AlwaysSendNotificationAgent
 from .q_learning_agent import QLearningAgent
 from .q_learning_agent_2 import QLearningAgent2
+from .vectorized_q_learning_agent import VectorizedQLearningAgent, VectorizedQLearningAgent2
 from .contextual_bandit_svm_agent import ContextualBanditSVMAgent
 from .contextual_bandit_svm_prob_agent import ContextualBanditSVMProbAgent
 from .classifier_data_collection_agent import ClassifierDataCollectionAgent
@@ -1,4 +1,5 @@
 import sys
+import numpy as np
 
 from .base_agent import BaseAgent
 
@@ -11,6 +12,17 @@ class AlwaysSendNotificationAgent(BaseAgent):
     def feedReward(self, reward):
         super().feedReward(reward)
         # who cares about the reward
+
+    def getActionBatch(self, stateTimes, stateDays, stateLocations, stateActivities,
+            stateLastNotifications, randomStates=None):
+        # the agent has no state, so it serves any number of runs
+        self._checkActionBatch(np.asarray(stateTimes), np.asarray(stateDays),
+                np.asarray(stateLocations), np.asarray(stateActivities),
+                np.asarray(stateLastNotifications))
+        return np.ones(len(stateTimes), dtype=bool)
+
+    def feedRewardBatch(self, rewards, randomStates=None):
+        self._checkRewardBatch()
     
     def generateInitialModel(self):
         pass
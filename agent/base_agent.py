@@ -1,3 +1,5 @@
+import numpy as np
+
 from constant import *
 
 from human_modeling_utils import utils
@@ -34,6 +36,10 @@ class BaseAgent:
     MODE_ITERATIVE = 0
     MODE_BATCH = 1
 
+    # the random generator of the agent (see `setRandomState()`). `None` stands for the global
+    # `np.random` generator.
+    randomState = None
+
     def __init__(self, operatingMode=None):
         self.stage = BaseAgent.STAGE_WAIT_ACTION
         self.generateInitialModel()
@@ -41,6 +47,21 @@ class BaseAgent:
         self.operatingMode = (operatingMode if operatingMode is not None
                 else BaseAgent.MODE_ITERATIVE)
 
+    def setRandomState(self, randomState):
+        """
+        Let the agent draw its random numbers from `randomState`, a `np.random.RandomState`,
+        instead of the global `np.random` generator, e.g., to give a simulation run a random
+        stream of its own. `None` restores the global generator.
+        """
+        self.randomState = randomState
+
+    def _getRandom(self):
+        """
+        Returns the generator to draw the random numbers from, which is either the random state
+        of the agent or the `np.random` module. Both offer the same drawing functions.
+        """
+        return self.randomState if self.randomState is not None else np.random
+
     def setNegativeReward(self, negativeReward):
         self.negativeReward = negativeReward
 
@@ -91,6 +112,43 @@ class BaseAgent:
             raise Exception("It is not in the stage of receiving reward")
         self.stage = BaseAgent.STAGE_WAIT_ACTION
     
+    def getActionBatch(self, stateTimes, stateDays, stateLocations, stateActivities,
+            stateLastNotifications, randomStates=None):
+        """
+        The array-shaped counterpart of `getAction()`, used by `BatchController` to advance many
+        simulation runs in lockstep. Each argument is a 1-D array holding the corresponding state
+        element of every run. If `randomStates` is given, it holds one `np.random.RandomState`
+        per run, and the random numbers of run `i` are drawn from `randomStates[i]` in the same
+        order as `getAction()` draws them.
+
+        Agents which serve many runs at once (e.g., `VectorizedQLearningAgent` with `numUsers`,
+        or a stateless agent) override it. The default implementation serves a single run
+        through `getAction()`, and raises an exception for more runs, because the runs would
+        share the learning state of the agent.
+
+        Returns:
+          A bool array indicating whether to send the notification in each run
+        """
+        states = [np.asarray(a).tolist() for a in [stateTimes, stateDays, stateLocations,
+                stateActivities, stateLastNotifications]]
+        self._checkSingleRun(len(states[0]))
+        randomState = randomStates[0] if randomStates is not None else None
+        action = utils.callWithObjectRandomState(
+                self, randomState, self.getAction, *[values[0] for values in states])
+        return np.array([action], dtype=bool)
+
+    def feedRewardBatch(self, rewards, randomStates=None):
+        """
+        The array-shaped counterpart of `feedReward()`. `rewards` is a 1-D array which has one
+        reward per run, in the same order as the actions returned by `getActionBatch()`, and
+        `randomStates` is the same as the one of `getActionBatch()`. The default implementation
+        serves a single run, like `getActionBatch()`.
+        """
+        rewards = np.asarray(rewards).tolist()
+        self._checkSingleRun(len(rewards))
+        randomState = randomStates[0] if randomStates is not None else None
+        utils.callWithObjectRandomState(self, randomState, self.feedReward, rewards[0])
+
     def feedBatchRewards(self, history):
         """
         After querying a couple of `getAction()` calls, the agent then get the reward results
@@ -123,3 +181,41 @@ class BaseAgent:
         """
         pass
 
+    def _checkSingleRun(self, numRuns):
+        if numRuns != 1:
+            raise Exception("%s serves a single run but got %d runs. Use one agent per run, or "
+                    "an agent which implements getActionBatch() for many runs"
+                    % (type(self).__name__, numRuns))
+
+    def _checkActionBatch(self, stateTimes, stateDays, stateLocations, stateActivities,
+            stateLastNotifications):
+        """
+        The stage and the argument checks of `getAction()` for a batch of states
+        """
+        if self.operatingMode == BaseAgent.MODE_ITERATIVE:
+            if self.stage != BaseAgent.STAGE_WAIT_ACTION:
+                raise Exception("It is not in the stage of determining action")
+            self.stage = BaseAgent.STAGE_WAIT_REWARD
+
+        for name, values, validValues in [
+                ('stateTime', stateTimes, utils.allTimeStates()),
+                ('stateDay', stateDays, utils.allDayStates()),
+                ('stateLocation', stateLocations, utils.allLocationStates()),
+                ('stateActivity', stateActivities, utils.allActivityStates()),
+                ('stateLastNotification', stateLastNotifications,
+                    utils.allLastNotificationStates()),
+        ]:
+            # the state values are 0 to n-1 (see `state_codec`), so a range check is enough
+            invalid = (values < 0) | (values >= len(validValues))
+            if np.any(invalid):
+                raise Exception("Invalid %s value (got %d)" % (name, values[invalid][0]))
+
+    def _checkRewardBatch(self):
+        """
+        The stage checks of `feedReward()` for a batch of rewards
+        """
+        if self.operatingMode != BaseAgent.MODE_ITERATIVE:
+            raise Exception("feedRewardBatch() is expected to call in the interative mode")
+        if self.stage != BaseAgent.STAGE_WAIT_REWARD:
+            raise Exception("It is not in the stage of receiving reward")
+        self.stage = BaseAgent.STAGE_WAIT_ACTION
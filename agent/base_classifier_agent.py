@@ -2,39 +2,71 @@ import sys
 import numpy as np
 
 from .base_agent import BaseAgent
+from .decision_cache import DecisionCache
+from human_modeling_utils import state_codec
+from human_modeling_utils import binary_cache
 from constant import *
 
 
+kTrainingFileCacheTag = 'classifier-training-data-v1'
+
+
 class BaseClassifierAgent(BaseAgent):
+    """
+    The model is evaluated over all the states once after it is trained, and `getAction()` looks
+    up the expected reward from `self.decisionCache`.
+    """
+
+    # whether `loadModel()` merges the identical training rows into weighted rows. It is off by
+    # default because a subclass has to treat the weights as row counts in its model selection,
+    # e.g., cross validation, to select the same model as on the repeated rows (see
+    # `SVMAgent.trainModel()`)
+    DEDUPLICATE_TRAINING_DATA = False
 
     def __init__(self, negRewardWeight=3):
         super().__init__()
         self.negRewardWeight = negRewardWeight
 
-    def loadModel(self, filepath):
-        with open(filepath) as f:
-            lines = f.readlines()
-        mat = np.array([list(map(int, l.strip().split(','))) for l in lines])
+    def loadModel(self, filepath, useCache=True):
+        """
+        Train the model from a CSV file whose rows are `reward,time,day,location,activity,
+        lastNotification`. The parsed rows are cached in a binary file next to the CSV file (see
+        `binary_cache`) unless `useCache` is false.
 
-        trainX = []
-        trainY = []
-        for reward, t, d, l, a, ln in mat:
-            vec = self.encode(t, d, l, a, ln)
-            repeat = 1 if reward >= 0 else self.negRewardWeight
-            for _ in range(repeat):
-                trainX.append(vec)
-                trainY.append(reward)
+        The negative rewards are weighted by `negRewardWeight` through the sample weights. If
+        `DEDUPLICATE_TRAINING_DATA` is true, the identical rows are also merged into one row, and
+        the weight of the row is its number of occurrences times `negRewardWeight` for a
+        negative reward, i.e., the number of times the row was repeated before.
+        """
+        if useCache:
+            mat = binary_cache.loadWithCache(
+                    filepath, _parseTrainingFile, kTrainingFileCacheTag)['data']
+        else:
+            mat = _parseTrainingFile(filepath)['data']
 
-        trainX = np.array(trainX)
-        trainY = np.array(trainY)
+        if self.DEDUPLICATE_TRAINING_DATA:
+            mat, counts = np.unique(mat, axis=0, return_counts=True)
+        else:
+            counts = np.ones(len(mat), dtype=int)
 
-        self.model = self.trainModel(trainX, trainY)
+        rewards = mat[:, 0]
+        stateIdxs = state_codec.encodeStates(*mat[:, 1:].T)
+        trainX = self.stateXs[stateIdxs]
+        trainY = rewards
+        weights = counts * np.where(rewards >= 0, 1, self.negRewardWeight)
+
+        self.model = self.trainModel(trainX, trainY, weights)
+        self.decisionCache.invalidate()
     
     def getAction(self, stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
         super().getAction(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
-        self.currentX = self.encode(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
-        self.expectedReward = self.getRewardLabel(self.model, self.currentX)
+        self.expectedReward = self.decisionCache.lookup(
+                stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
         return self.expectedReward > 0
+
+    def generateInitialModel(self):
+        self.decisionCache = DecisionCache(self._computeRewardTable)
+        self.stateXs = np.array([self.encode(*s) for s in state_codec.allStates()])
     
     def encode(self, stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
         return [
@@ -55,10 +87,24 @@ class BaseClassifierAgent(BaseAgent):
             1 if stateLastNotification == STATE_LAST_NOTIFICATION_LONG else 0,
         ]
 
-    def trainModel(self, dataX, dataY):
+    def trainModel(self, dataX, dataY, sampleWeight=None):
         sys.stderr.write("ERROR: Please implement trainModel()\n")
         exit(0)
 
     def getRewardLabel(self, model, dataXVec):
         sys.stderr.write("ERROR: Please implement getRewardLabel()\n")
         exit(0)
+
+    def getRewardLabels(self, model, dataX):
+        """
+        The batched version of `getRewardLabel()`. The subclass is encouraged to override it with
+        a single call to the model.
+        """
+        return np.array([self.getRewardLabel(model, x) for x in dataX])
+
+    def _computeRewardTable(self):
+        return self.getRewardLabels(self.model, self.stateXs)
+
+
+def _parseTrainingFile(filepath):
+    return {'data': np.loadtxt(filepath, delimiter=',', dtype=int, ndmin=2)}
@@ -14,7 +14,7 @@ class ClassifierDataCollectionAgent(BaseAgent):
         super().getAction(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
         state = (stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
         self.currentState = state
-        self.chosenAction = np.random.random() < kProbeRate
+        self.chosenAction = self._getRandom().random() < kProbeRate
         return self.chosenAction
     
     def feedReward(self, reward):
@@ -1,11 +1,16 @@
 import sys
+import threading
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
+
 from .base_agent import BaseAgent
+from .decision_cache import DecisionCache
+from .hyperparameter_search import FullGridSearch
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
 from constant import *
 
-from sklearn.model_selection import GridSearchCV
 from sklearn.svm import SVC
 from sklearn import preprocessing
 
@@ -30,21 +35,109 @@ class ContextualBanditSVMAgent(BaseAgent):
 
     The state is represented by 5-tuple. Since all the elements are discrete, we use one-hot
     encoding to represent the state and feed it to the SVM classifier.
+
+    The classifier is evaluated over all the states once after each training, and the decisions
+    are looked up from `self.decisionCache`.
+
+    With `backgroundTraining=True`, the classifier is trained by a worker thread on a snapshot of
+    the history, while `getAction()` keeps using the current classifier. The new classifier and
+    its decisions are swapped in together once the training finishes. The worker handles one
+    training at a time. If more trainings are requested meanwhile, `TRAINING_QUEUE` runs all of
+    them in order, whereas `TRAINING_COALESCE` only keeps the latest one. `close()` stops the
+    worker thread once the trainings finish, and a later training starts a new one.
     """
 
+    TRAINING_QUEUE = 0
+    TRAINING_COALESCE = 1
+
+    def __init__(self, operatingMode=None, backgroundTraining=False,
+            trainingQueueMode=None, waitForFreshModel=False, retrainIntervalFunc=None,
+            hyperparameterSearch=None):
+        """
+        Params:
+          backgroundTraining: Whether to train the classifier in a worker thread
+          trainingQueueMode: `TRAINING_COALESCE` (default) or `TRAINING_QUEUE`
+          waitForFreshModel: If true, a training request blocks until the classifier is
+                             retrained, which makes the background training deterministic
+          retrainIntervalFunc: A function which takes the amount of data and returns the number
+                               of new data points to collect before the next training. The
+                               default is the square root of the amount of data.
+          hyperparameterSearch: The strategy to search the SVM hyperparameters (see
+                                `hyperparameter_search`). The default searches the entire
+                                `kTunedParameters` grid on every retrain.
+        """
+        self.backgroundTraining = backgroundTraining
+        self.trainingQueueMode = (trainingQueueMode if trainingQueueMode is not None
+                else ContextualBanditSVMAgent.TRAINING_COALESCE)
+        self.waitForFreshModel = waitForFreshModel
+        self.retrainIntervalFunc = (retrainIntervalFunc if retrainIntervalFunc is not None
+                else defaultRetrainInterval)
+        self.hyperparameterSearch = (hyperparameterSearch if hyperparameterSearch is not None
+                else FullGridSearch(kTunedParameters, kFold))
+
+        # the lock guards the classifier, the decision table, and the training queue
+        self.trainingLock = threading.Lock()
+        self.executor = None
+        self.trainingFuture = None
+        super().__init__(operatingMode)
+
+    def __getstate__(self):
+        # the thread objects cannot be pickled, and the pickled model should be the latest one
+        self.close()
+        state = self.__dict__.copy()
+        for key in ['trainingLock', 'executor', 'trainingFuture']:
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        # objects pickled before the histories were kept as count tables have the one-hot
+        # encoded history in `xData` and `yData`, and they do not have the attributes of the
+        # background training, the hyperparameter search, or the decision cache
+        xData = state.pop('xData', None)
+        yData = state.pop('yData', None)
+        currentX = state.pop('currentX', None)
+        self.__dict__.update(state)
+        self.trainingLock = threading.Lock()
+        self.executor = None
+        self.trainingFuture = None
+        if 'dataCounts' in state:
+            return
+
+        self.backgroundTraining = False
+        self.trainingQueueMode = ContextualBanditSVMAgent.TRAINING_COALESCE
+        self.waitForFreshModel = False
+        self.retrainIntervalFunc = defaultRetrainInterval
+        self.hyperparameterSearch = FullGridSearch(kTunedParameters, kFold)
+        self.scaler = state.get('scaler')
+        self.clf = state.get('clf')
+        self.stateXs = np.array([self.encode(*s) for s in state_codec.allStates()])
+        self.decisionCache = DecisionCache(self._computeDecisionTable)
+        self.pendingSnapshots = []
+        self.isTraining = False
+
+        stateIdxOfX = {tuple(x): stateIdx for stateIdx, x in enumerate(self.stateXs.tolist())}
+        self.dataCounts = np.zeros((state_codec.NUM_STATES, 2), dtype=int)
+        if xData:
+            np.add.at(self.dataCounts, ([stateIdxOfX[tuple(x)] for x in xData], yData), 1)
+        if currentX is not None:
+            self.currentStateIdx = stateIdxOfX[tuple(currentX)]
+
     def getAction(self, stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
         super().getAction(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
-        self.currentX = self.encode(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+        self.currentStateIdx = state_codec.encodeState(
+                stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
 
         # the result should be based on the expected reward of two bandits (i.e., non-sending and
         # sending bandits) and choose whichever gives larger reward. Since non-sending bandit
         # always gives 0 reward, what matters is whether the reward from sending bandit is positive
         # or negative. On top of that, we encourage sending bandit to explore with a certain
         # probability regardless the outcome.
-        if np.random.uniform() < kEps:
+        if self._getRandom().uniform() < kEps:
             self.chosenAction = True
         else:
-            self.chosenAction = self.getTestLabel(self.currentX)
+            with self.trainingLock:
+                self.chosenAction = self.decisionCache.lookup(
+                        stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
 
         return self.chosenAction
     
@@ -52,8 +145,7 @@ class ContextualBanditSVMAgent(BaseAgent):
         super().feedReward(reward)
 
         if self.chosenAction:
-            self.xData.append(self.currentX)
-            self.yData.append(self._rewardToYLabel(reward))
+            self.dataCounts[self.currentStateIdx, self._rewardToYLabel(reward)] += 1
             
             if self.countDown <= 0:
                 self._trainModel()
@@ -62,20 +154,26 @@ class ContextualBanditSVMAgent(BaseAgent):
     def feedBatchRewards(self, history):
         super().feedBatchRewards(history)
 
-        states, rewards = zip(*[(self.encode(*s), r) for s, _, r in history])
+        states, _, rewards = zip(*history)
+        stateIdxs = state_codec.encodeStates(*np.array(states, dtype=int).T)
         yLabels = [self._rewardToYLabel(r) for r in rewards]
-        self.xData.extend(states)
-        self.yData.extend(yLabels)
+        np.add.at(self.dataCounts, (stateIdxs, yLabels), 1)
         self.countDown -= len(states)
         if self.countDown <= 0:
             self._trainModel()
 
     def generateInitialModel(self):
-        # the history of sending-notification bandit
-        self.xData = []
-        self.yData = []  # 1: positive reward, 0: negative reward
+        # the history of sending-notification bandit. Since the states are discrete, the history
+        # is kept as the number of times each state is observed with each label, indexed by
+        # [stateIdx (see `state_codec`), label (1: positive reward, 0: negative reward)]
+        self.dataCounts = np.zeros((state_codec.NUM_STATES, 2), dtype=int)
+        self.stateXs = np.array([self.encode(*s) for s in state_codec.allStates()])
+        self.scaler = None
         self.clf = None
         self.countDown = 0
+        self.decisionCache = DecisionCache(self._computeDecisionTable)
+        self.pendingSnapshots = []
+        self.isTraining = False
     
     def loadModel(self, filepath):
         sys.stderr.write("Warning: loadModel() does not support\n")        
@@ -103,33 +201,115 @@ class ContextualBanditSVMAgent(BaseAgent):
         ]
     
     def getTestLabel(self, testX):
+        return bool(self.getTestLabels([testX])[0])
+
+    def getTestLabels(self, testXs):
+        return self._predictLabels(self.scaler, self.clf, testXs)
+
+    def waitForTraining(self):
+        """
+        Block until all the requested background trainings finish.
+        """
+        future = self.trainingFuture
+        if future is not None:
+            future.result()
+
+    def close(self):
+        """
+        Wait for the background trainings and stop the worker thread.
+        """
+        self.waitForTraining()
+        with self.trainingLock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _predictLabels(self, scaler, clf, testXs):
         try:
-            scaledTestX = self.scaler.transform(np.array([testX]))
-            res = self.clf.predict(scaledTestX)
-            return (res[0] == 1)
+            scaledTestXs = scaler.transform(np.array(testXs))
+            res = clf.predict(scaledTestXs)
+            return (res == 1)
         except:
             # if we don't have enough data (insufficient history), we cannot make a prediction.
             # The best we can do is to encourage exploration
             #import traceback
             #exc_type, exc_value, exc_traceback = sys.exc_info()
             #print(exc_type, exc_value, exc_traceback)
-            return True
+            return np.full(len(testXs), True)
 
     def _trainModel(self):
-        # try to train the model if the amount of data is sufficient
+        if not self.backgroundTraining:
+            self.scaler, self.clf = self._fitModel(self.dataCounts)
+            if self.clf is not None:
+                self.countDown = self.retrainIntervalFunc(int(self.dataCounts.sum()))
+            self.decisionCache.invalidate()
+            return
+
+        # the countdown restarts when the training is requested, otherwise every step would
+        # request another training until the worker finishes
+        self.countDown = self.retrainIntervalFunc(int(self.dataCounts.sum()))
+        with self.trainingLock:
+            self.pendingSnapshots.append(self.dataCounts.copy())
+            if self.trainingQueueMode == ContextualBanditSVMAgent.TRAINING_COALESCE:
+                del self.pendingSnapshots[:-1]
+            if not self.isTraining:
+                self.isTraining = True
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=1)
+                self.trainingFuture = self.executor.submit(self._trainInBackground)
+        if self.waitForFreshModel:
+            self.waitForTraining()
+
+    def _trainInBackground(self):
+        while True:
+            with self.trainingLock:
+                if len(self.pendingSnapshots) == 0:
+                    self.isTraining = False
+                    return
+                dataCounts = self.pendingSnapshots.pop(0)
+
+            scaler, clf = self._fitModel(dataCounts)
+            table = self._predictLabels(scaler, clf, self.stateXs)
+            with self.trainingLock:
+                self.scaler, self.clf = scaler, clf
+                self.decisionCache.setTable(table)
+
+    def _fitModel(self, dataCounts):
+        """
+        Train the classifier on the distinct (state, label) pairs with their counts. The
+        hyperparameter search treats each pair as repeated by its count (see
+        `hyperparameter_search.CountGridSearchCV`), so the fit is bounded by the state space.
+
+        Returns:
+          (scaler, clf), or (None, None) if the classifier cannot be trained
+        """
+        # the cross validation needs at least one data point per fold, and the classifier needs
+        # both labels
+        if (int(dataCounts.sum()) < self.hyperparameterSearch.cv
+                or np.count_nonzero(dataCounts.sum(axis=0)) < 2):
+            return (None, None)
+
         try:
-            self.scaler = preprocessing.StandardScaler().fit(np.array(self.xData))
+            stateIdxs, yData = np.nonzero(dataCounts)
+            xData = self.stateXs[stateIdxs]
+            counts = dataCounts[stateIdxs, yData]
+            scaler = preprocessing.StandardScaler().fit(xData, sample_weight=counts)
 
-            self.clf = GridSearchCV(SVC(), kTunedParameters, cv=kFold, n_jobs=8)
-            xScaledData = self.scaler.transform(self.xData)
-            yDataNumpyFormat = np.array(self.yData)
-            self.clf.fit(xScaledData, yDataNumpyFormat)
-            self.countDown = max(1, int(len(self.xData) ** 0.5))
+            xScaledData = scaler.transform(xData)
+            clf = self.hyperparameterSearch.fit(SVC(), xScaledData, yData, counts=counts)
+            return (scaler, clf)
         except:
             import traceback
             exc_type, exc_value, exc_traceback = sys.exc_info()
             print(exc_type, exc_value, exc_traceback)
-            self.scaler, self.clf = None, None
+            return (None, None)
+
+    def _computeDecisionTable(self):
+        return self.getTestLabels(self.stateXs)
 
     def _rewardToYLabel(self, reward):
         return 1 if reward > 0 else 0
+
+
+def defaultRetrainInterval(numData):
+    return max(1, int(numData ** 0.5))
@@ -2,10 +2,12 @@ import sys
 import numpy
 
 from .base_agent import BaseAgent
+from .decision_cache import DecisionCache
+from .hyperparameter_search import FullGridSearch
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
 from constant import *
 
-from sklearn.model_selection import GridSearchCV
 from sklearn.svm import SVC
 from sklearn import preprocessing
 
@@ -30,21 +32,38 @@ class ContextualBanditSVMProbAgent(BaseAgent):
 
     The state is represented by 5-tuple. Since all the elements are discrete, we use one-hot
     encoding to represent the state and feed it to the SVM classifier.
+
+    The expected rewards of all the states are computed in one batched call whenever the scaler,
+    the classifier, or the negative reward changes, and the decisions are looked up from
+    `self.decisionCache`.
     """
 
+    def __init__(self, operatingMode=None, hyperparameterSearch=None):
+        """
+        Params:
+          hyperparameterSearch: The strategy to search the SVM hyperparameters (see
+                                `hyperparameter_search`). The default searches the entire
+                                `kTunedParameters` grid on every retrain.
+        """
+        self.hyperparameterSearch = (hyperparameterSearch if hyperparameterSearch is not None
+                else FullGridSearch(kTunedParameters, kFold))
+        super().__init__(operatingMode)
+
     def getAction(self, stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
         super().getAction(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
-        self.currentX = self.encode(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+        self.currentStateIdx = state_codec.encodeState(
+                stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
 
         # the result should be based on the expected reward of two bandits (i.e., non-sending and
         # sending bandits) and choose whichever gives larger reward. Since non-sending bandit
         # always gives 0 reward, what matters is whether the reward from sending bandit is positive
         # or negative. On top of that, we encourage sending bandit to explore with a certain
         # probability regardless the outcome.
-        if numpy.random.uniform() < kEps:
+        if self._getRandom().uniform() < kEps:
             self.chosenAction = True
         else:
-            self.chosenAction = self.getTestLabel(self.currentX)
+            self.chosenAction = self.decisionCache.lookup(
+                    stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
 
         return self.chosenAction
     
@@ -52,32 +71,55 @@ class ContextualBanditSVMProbAgent(BaseAgent):
         super().feedReward(reward)
 
         if self.chosenAction:
-            self.xData.append(self.currentX)
-            self.yData.append(1 if reward > 0 else 0)
-            self.scaler = preprocessing.StandardScaler().fit(numpy.array(self.xData))
-            xScaledData = self.scaler.transform(self.xData)
+            self.dataCounts[self.currentStateIdx, 1 if reward > 0 else 0] += 1
+
+            # train on the distinct (state, label) pairs with their counts. The hyperparameter
+            # search treats each pair as repeated by its count (see
+            # `hyperparameter_search.CountGridSearchCV`)
+            stateIdxs, yData = numpy.nonzero(self.dataCounts)
+            xData = self.stateXs[stateIdxs]
+            counts = self.dataCounts[stateIdxs, yData]
+            self.scaler = preprocessing.StandardScaler().fit(xData, sample_weight=counts)
+            xScaledData = self.scaler.transform(xData)
             
             if self.countDown <= 0:
-                # try to train the model if the amount of data is sufficient
-                try:
-                    svc = SVC(probability=True)
-                    self.clf = GridSearchCV(svc, kTunedParameters, cv=kFold, n_jobs=8)
-                    yDataNumpyFormat = numpy.array(self.yData)
-                    self.clf.fit(xScaledData, yDataNumpyFormat)
-                    self.countDown = max(1, int(len(self.xData) ** 0.5))
-                except:
-                    import traceback
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    print(exc_type, exc_value, exc_traceback)
+                # the cross validation needs at least one data point per fold, and the
+                # classifier needs both labels
+                numData = int(self.dataCounts.sum())
+                if (numData < self.hyperparameterSearch.cv
+                        or numpy.count_nonzero(self.dataCounts.sum(axis=0)) < 2):
                     self.clf = None
+                else:
+                    try:
+                        # the probability calibration draws from the random state of the agent
+                        svc = SVC(probability=True, random_state=self.randomState)
+                        self.clf = self.hyperparameterSearch.fit(
+                                svc, xScaledData, yData, counts=counts)
+                        self.countDown = max(1, int(numData ** 0.5))
+                    except:
+                        import traceback
+                        exc_type, exc_value, exc_traceback = sys.exc_info()
+                        print(exc_type, exc_value, exc_traceback)
+                        self.clf = None
             self.countDown -= 1
+
+            # the scaler is refit with every new data point, so the decisions may change even if
+            # the classifier is not retrained
+            self.decisionCache.invalidate()
+
+    def setNegativeReward(self, negativeReward):
+        super().setNegativeReward(negativeReward)
+        self.decisionCache.invalidate()
     
     def generateInitialModel(self):
-        # the history of sending-notification bandit
-        self.xData = []
-        self.yData = []  # 1: positive reward, 0: negative reward
+        # the history of sending-notification bandit, kept as the number of times each state is
+        # observed with each label, indexed by [stateIdx (see `state_codec`), label (1: positive
+        # reward, 0: negative reward)]
+        self.dataCounts = numpy.zeros((state_codec.NUM_STATES, 2), dtype=int)
+        self.stateXs = numpy.array([self.encode(*s) for s in state_codec.allStates()])
         self.clf = None
         self.countDown = 0
+        self.decisionCache = DecisionCache(self._computeDecisionTable)
     
     def loadModel(self, filepath):
         sys.stderr.write("Warning: loadModel() does not support\n")        
@@ -105,17 +147,25 @@ class ContextualBanditSVMProbAgent(BaseAgent):
         ]
     
     def getTestLabel(self, testX):
+        return bool(self.getTestLabels([testX])[0])
+
+    def getTestLabels(self, testXs):
+        if self.clf is None:
+            # without enough data (insufficient history) the classifier is not trained yet. The
+            # best we can do is to encourage exploration
+            return numpy.full(len(testXs), True)
         try:
-            scaledTestX = self.scaler.transform(numpy.array([testX]))
-            res = self.clf.predict_proba(scaledTestX)
-            res = res[0]  # get the first row and the only row
-            print(res)
-            expectedReward = res[0] * self._getNegativeReward() + res[1] * 1.
-            return (expectedReward > 0.)
+            scaledTestXs = self.scaler.transform(numpy.array(testXs))
+            res = self.clf.predict_proba(scaledTestXs)
+            expectedRewards = res[:, 0] * self._getNegativeReward() + res[:, 1] * 1.
+            return (expectedRewards > 0.)
         except:
             # if we don't have enough data (insufficient history), we cannot make a prediction.
             # The best we can do is to encourage exploration
             import traceback
             exc_type, exc_value, exc_traceback = sys.exc_info()
             print(exc_type, exc_value, exc_traceback)
-            return True
+            return numpy.full(len(testXs), True)
+
+    def _computeDecisionTable(self):
+        return self.getTestLabels(self.stateXs)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from human_modeling_utils import state_codec
+
+
+class DecisionCache:
+    """
+    `DecisionCache` keeps a lookup table which holds one value (e.g., a decision or an expected
+    reward) per state. Since the state space is small, an agent whose policy is a trained model
+    can evaluate the model over all the states in one batched call and serve every `getAction()`
+    from the table, instead of querying the model with a single row each time.
+
+    The table is built lazily by `computeTable()` at the first lookup after it is invalidated.
+    The agent should call `invalidate()` whenever the outcome of the model changes (e.g., after
+    retraining).
+    """
+
+    def __init__(self, computeTable):
+        """
+        Params:
+          computeTable: A function which takes no argument and returns an array of
+                        `state_codec.NUM_STATES` values, in the order of `state_codec.allStates()`
+        """
+        self.computeTable = computeTable
+        self.table = None
+        self.numHits = 0
+        self.numMisses = 0
+
+    def invalidate(self):
+        self.table = None
+
+    def setTable(self, table):
+        """
+        Install a table computed elsewhere (e.g., by a background training) in place of
+        `computeTable()`.
+        """
+        table = np.asarray(table)
+        if len(table) != state_codec.NUM_STATES:
+            raise Exception("Expect a table of %d values but got %d"
+                    % (state_codec.NUM_STATES, len(table)))
+        self.table = table
+
+    def lookup(self, stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
+        if self.table is None:
+            self.setTable(self.computeTable())
+            self.numMisses += 1
+        else:
+            self.numHits += 1
+        return self.table[state_codec.encodeState(
+                stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)].item()
+
+    def getCounters(self):
+        """
+        Returns:
+          A dictionary of `numHits` and `numMisses`. A miss is a lookup which (re)builds the table.
+        """
+        return {
+                'numHits': self.numHits,
+                'numMisses': self.numMisses,
+        }
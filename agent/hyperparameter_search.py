@@ -0,0 +1,232 @@
+import numpy as np
+
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import GridSearchCV, ParameterGrid
+
+
+class FullGridSearch:
+    """
+    A hyperparameter search strategy decides which hyperparameters to cross-validate every time
+    an agent retrains its classifier. `FullGridSearch` searches the entire grid on every
+    retrain.
+    """
+
+    def __init__(self, tunedParameters, cv=5, numJobs=8):
+        """
+        Params:
+          tunedParameters: The parameter grid, in the format of `GridSearchCV`'s `param_grid`
+          cv: The number of cross-validation folds
+          numJobs: The number of parallel jobs of the cross-validation
+        """
+        self.tunedParameters = tunedParameters
+        self.cv = cv
+        self.numJobs = numJobs
+
+    def fit(self, estimator, dataX, dataY, sampleWeight=None, counts=None):
+        """
+        Search the hyperparameters of `estimator` and fit it on the whole data.
+
+        Params:
+          sampleWeight: The weights passed to `estimator.fit()`. The folds and the validation
+                        scores ignore them.
+          counts: The number of times each row is observed. If given, the rows are treated as if
+                  each of them were repeated `counts` times (see `CountGridSearchCV`), and
+                  `sampleWeight` should not be given.
+
+        Returns:
+          The fitted classifier, which supports `predict()` (and `predict_proba()` if the
+          estimator does)
+        """
+        return self._search(estimator, self.tunedParameters, dataX, dataY, sampleWeight, counts)
+
+    def _search(self, estimator, paramGrid, dataX, dataY, sampleWeight, counts, numJobs=None):
+        numJobs = numJobs if numJobs is not None else self.numJobs
+        if counts is not None:
+            return CountGridSearchCV(estimator, paramGrid, cv=self.cv, n_jobs=numJobs).fit(
+                    dataX, dataY, counts)
+
+        clf = GridSearchCV(estimator, paramGrid, cv=self.cv, n_jobs=numJobs)
+        if sampleWeight is None:
+            clf.fit(dataX, dataY)
+        else:
+            clf.fit(dataX, dataY, sample_weight=sampleWeight)
+        return clf
+
+
+class IncrementalGridSearch(FullGridSearch):
+    """
+    `IncrementalGridSearch` assumes the best hyperparameters rarely move between two retrains.
+    It searches the entire grid at the first retrain and then reuses the previous winner, which
+    only costs one cross-validation. Every `neighbourhoodInterval`-th retrain, it searches the
+    winner and its adjacent values in the grid instead, so the winner can drift. The entire grid
+    is searched again every `fullSearchInterval`-th retrain, or as soon as the validation score
+    of the winner drops by more than `scoreDropTolerance` from the score it was chosen with.
+    """
+
+    def __init__(self, tunedParameters, cv=5, numJobs=8, neighbourhoodInterval=5,
+            fullSearchInterval=20, scoreDropTolerance=0.05):
+        super().__init__(tunedParameters, cv, numJobs)
+        self.neighbourhoodInterval = neighbourhoodInterval
+        self.fullSearchInterval = fullSearchInterval
+        self.scoreDropTolerance = scoreDropTolerance
+
+        self.bestParams = None
+        self.bestScore = None
+        self.numFits = 0
+
+    def fit(self, estimator, dataX, dataY, sampleWeight=None, counts=None):
+        # the scores are not finite when the cross validation cannot be done (e.g., too few data)
+        if (self.bestParams is None or not np.isfinite(self.bestScore)
+                or self.numFits % self.fullSearchInterval == 0):
+            paramGrid = self.tunedParameters
+        elif self.numFits % self.neighbourhoodInterval == 0:
+            paramGrid = self._getNeighbourhood(self.bestParams)
+        else:
+            paramGrid = None
+
+        if paramGrid is None:
+            # only validate the previous winner. The few fits are not worth the overhead of
+            # spawning parallel jobs
+            clf = self._search(estimator, [{k: [v] for k, v in self.bestParams.items()}],
+                    dataX, dataY, sampleWeight, counts, numJobs=1)
+            if clf.best_score_ < self.bestScore - self.scoreDropTolerance:
+                clf = self._search(estimator, self.tunedParameters, dataX, dataY, sampleWeight,
+                        counts)
+                self.bestScore = clf.best_score_
+        else:
+            clf = self._search(estimator, paramGrid, dataX, dataY, sampleWeight, counts)
+            self.bestScore = clf.best_score_
+
+        self.bestParams = clf.best_params_
+        self.numFits += 1
+        return clf
+
+    def _getNeighbourhood(self, params):
+        """
+        Returns a parameter grid of `params` and the values next to them in `tunedParameters`.
+        """
+        grids = (self.tunedParameters if type(self.tunedParameters) is list
+                else [self.tunedParameters])
+        for grid in grids:
+            if set(grid.keys()) != set(params.keys()):
+                continue
+            if any(params[k] not in grid[k] for k in grid):
+                continue
+            neighbourhood = {}
+            for k in grid:
+                idx = list(grid[k]).index(params[k])
+                neighbourhood[k] = list(grid[k])[max(0, idx - 1):idx + 2]
+            return [neighbourhood]
+        return [{k: [v] for k, v in params.items()}]
+
+
+class CountGridSearchCV:
+    """
+    `CountGridSearchCV` is the grid search of `GridSearchCV` over a data set given as distinct
+    rows and the number of times each row is observed. It selects the same way as a search over
+    the repeated rows does, but every fit only takes the distinct rows:
+      - The folds are drawn over the repeated rows. The copies of each class are dealt to the
+        folds in turn, so a row observed `c` times puts about `c / cv` copies in each fold.
+      - A fold is validated by the accuracy weighted by the copies in it, and trained on the
+        rest of the copies, which become the sample weights.
+      - The best candidate is refit on the whole data weighted by the counts. An estimator which
+        calibrates probabilities by an internal cross validation (e.g., `SVC(probability=True)`)
+        is refit on the repeated rows instead, because the calibration splits the rows.
+
+    As in `GridSearchCV`, a candidate scores NaN if any of its fits fails, and the first
+    candidate wins if none scores.
+    """
+
+    def __init__(self, estimator, paramGrid, cv=5, n_jobs=None):
+        self.estimator = estimator
+        self.paramGrid = paramGrid
+        self.cv = cv
+        self.n_jobs = n_jobs
+
+    def fit(self, dataX, dataY, counts):
+        dataX, dataY = np.asarray(dataX), np.asarray(dataY)
+        if np.any(np.asarray(counts) != np.round(counts)):
+            raise Exception("The counts should be integers")
+        counts = np.asarray(counts, dtype=int)
+        if np.sum(counts) < self.cv:
+            raise Exception("Cannot cross-validate %d data points with %d folds"
+                    % (np.sum(counts), self.cv))
+
+        testCounts = getCountFolds(dataY, counts, self.cv)
+        candidates = list(ParameterGrid(self.paramGrid))
+        scores = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fitAndScore)(clone(self.estimator).set_params(**params), dataX, dataY,
+                        counts - testCounts[:, f], testCounts[:, f])
+                for params in candidates for f in range(self.cv))
+        meanScores = np.mean(np.array(scores).reshape(len(candidates), self.cv), axis=1)
+
+        bestIdx = int(np.nanargmax(meanScores)) if np.any(np.isfinite(meanScores)) else 0
+        self.cv_results_ = {'params': candidates, 'mean_test_score': meanScores}
+        self.best_index_ = bestIdx
+        self.best_params_ = candidates[bestIdx]
+        self.best_score_ = meanScores[bestIdx]
+
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        if getattr(self.best_estimator_, 'probability', False):
+            self.best_estimator_.fit(
+                    np.repeat(dataX, counts, axis=0), np.repeat(dataY, counts))
+        else:
+            mask = counts > 0
+            self.best_estimator_.fit(dataX[mask], dataY[mask], sample_weight=counts[mask])
+        return self
+
+    def predict(self, dataX):
+        return self.best_estimator_.predict(dataX)
+
+    def predict_proba(self, dataX):
+        return self.best_estimator_.predict_proba(dataX)
+
+    def decision_function(self, dataX):
+        return self.best_estimator_.decision_function(dataX)
+
+
+def getCountFolds(dataY, counts, numFolds):
+    """
+    Allocate the copies of the rows to `numFolds` folds the way `StratifiedKFold` (without
+    shuffling) splits the rows repeated by their counts in the order of the class and then of
+    the row. The number of copies of each class in each fold comes from dealing all the copies,
+    sorted by class, to the folds in turn. Then each fold takes a contiguous block of the copies
+    of each class, the first fold taking the first block.
+
+    Returns:
+      A `(len(counts), numFolds)` int array of the number of copies of each row in each fold
+    """
+    order = np.argsort(dataY, kind='stable')
+    sortedY = np.asarray(dataY)[order]
+    ends = np.cumsum(counts[order])
+    starts = ends - counts[order]
+    folds = np.arange(numFolds)
+    testCounts = np.zeros((len(counts), numFolds), dtype=int)
+    for label in np.unique(sortedY).tolist():
+        mask = sortedY == label
+        classStart, classEnd = starts[mask][0], ends[mask][-1]
+        # the block of the copies of the class in each fold
+        foldSizes = _numDealt(classEnd, folds, numFolds) - _numDealt(classStart, folds, numFolds)
+        foldEnds = np.cumsum(foldSizes)[np.newaxis, :]
+        foldStarts = foldEnds - foldSizes
+        rowStarts = (starts[mask] - classStart)[:, np.newaxis]
+        rowEnds = (ends[mask] - classStart)[:, np.newaxis]
+        testCounts[order[mask]] = np.maximum(
+                np.minimum(rowEnds, foldEnds) - np.maximum(rowStarts, foldStarts), 0)
+    return testCounts
+
+
+def _numDealt(n, folds, numFolds):
+    # the number of the copies before the copy `n` which are dealt to each fold
+    return np.maximum(n - folds + numFolds - 1, 0) // numFolds
+
+
+def _fitAndScore(estimator, dataX, dataY, trainCounts, testCounts):
+    trainMask, testMask = trainCounts > 0, testCounts > 0
+    try:
+        estimator.fit(dataX[trainMask], dataY[trainMask], sample_weight=trainCounts[trainMask])
+        return estimator.score(dataX[testMask], dataY[testMask],
+                sample_weight=testCounts[testMask])
+    except Exception:
+        return np.nan
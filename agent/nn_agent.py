@@ -1,16 +1,25 @@
 import sys
 import numpy as np
 
-from keras.models import Sequential
-from keras.layers import Dense, Dropout
-from keras.utils.np_utils import to_categorical
-
 from .base_classifier_agent import BaseClassifierAgent
 
 
 class NNAgent(BaseClassifierAgent):
+    """
+    The network is trained with Keras, but its weights are then exported and the inference is
+    a plain NumPy forward pass. Hence Keras is only required by `trainModel()` (i.e.,
+    `loadModel()`), and a model restored by `loadWeights()` runs without it.
+    """
+
+    # merging the identical rows would reduce the number of gradient steps per epoch
+    DEDUPLICATE_TRAINING_DATA = False
+
+    def trainModel(self, dataX, dataY, sampleWeight=None):
+        # keras is imported here so that the inference does not depend on it
+        from keras.models import Sequential
+        from keras.layers import Dense, Dropout
+        from keras.utils.np_utils import to_categorical
 
-    def trainModel(self, dataX, dataY):
         print("Begin to train the model")
 
         encodedY = self._encodeDataY(dataY)
@@ -24,34 +33,57 @@ class NNAgent(BaseClassifierAgent):
         model.add(Dense(3, activation='softmax'))
         model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
 
-        model.fit(dataX, oneHopY, epochs=20, batch_size=16, verbose=0)
+        model.fit(dataX, oneHopY, sample_weight=sampleWeight, epochs=20, batch_size=16, verbose=0)
 
         print("Finish training the model")
 
-        return model
-    
+        # the dropout layers have no weights, so the list is [W1, b1, W2, b2, W3, b3]
+        return {
+                'weights': [np.array(w) for w in model.get_weights()],
+        }
+
+    def loadWeights(self, filepath):
+        """
+        Restore a model saved by `saveModel()`.
+        """
+        with np.load(filepath) as data:
+            numWeights = int(data['numWeights'])
+            self.model = {
+                    'weights': [data['weight%d' % i] for i in range(numWeights)],
+            }
+            self.rewardLabels = data['rewardLabels'].tolist()
+        self.decisionCache.invalidate()
+
     def saveModel(self, filepath):
-        sys.stderr.write("Warning: saveModel() does not support\n")
-    
+        weights = self.model['weights']
+        arrays = {'weight%d' % i: w for i, w in enumerate(weights)}
+        # pass a file object so that `np.savez()` does not append `.npz` to the path
+        with open(filepath, 'wb') as f:
+            np.savez(f, numWeights=len(weights), rewardLabels=np.array(self.rewardLabels),
+                    **arrays)
+
     def getRewardLabel(self, model, dataXVec):
-        resMat = model.predict(np.array([dataXVec]))
-        resIdx = np.argmax(resMat[0])
-        return self.rewardLabels[resIdx]
-
-    def _encodeDataYScalar(self, scalarY):
-        if scalarY > 0:
-            return 0
-        elif scalarY == 0:
-            return 1
-        else:
-            return 2
+        return self.getRewardLabels(model, [dataXVec])[0]
+
+    def getRewardLabels(self, model, dataX):
+        # softmax preserves the order, so the argmax of the output layer before the softmax is
+        # the same
+        resMat = self._forward(model, dataX)
+        resIdxs = np.argmax(resMat, axis=1)
+        return np.array(self.rewardLabels)[resIdxs]
+
+    def _forward(self, model, dataX):
+        w1, b1, w2, b2, w3, b3 = model['weights']
+        hidden = np.maximum(np.asarray(dataX, dtype=w1.dtype) @ w1 + b1, 0.)
+        hidden = np.maximum(hidden @ w2 + b2, 0.)
+        return hidden @ w3 + b3
 
     def _encodeDataY(self, dataY):
-        encodedDataY = np.array([self._encodeDataYScalar(v) for v in dataY])
+        dataY = np.asarray(dataY)
+        encodedDataY = np.where(dataY > 0, 0, np.where(dataY == 0, 1, 2))
         negativeReward = -10
-        negVals = [v for v in dataY if v < 0]
+        negVals = dataY[dataY < 0]
         if len(negVals) > 0:
             negativeReward = negVals[0]
         self.rewardLabels = [1, 0, negativeReward]
         return encodedDataY
-
@@ -3,6 +3,7 @@ import numpy
 
 from .base_agent import BaseAgent
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
 from constant import *
 
 kInitialLearningRate = 1.0
@@ -19,8 +20,9 @@ class QLearningAgent(BaseAgent):
         self.currentState = state
 
         eps = max(kMinEps, kInitEps * (0.85 ** (self.numSteps // 100)))
-        if numpy.random.random() < eps:
-            self.chosenAction = numpy.random.choice([a for a in self.qTable[state]])
+        random = self._getRandom()
+        if random.random() < eps:
+            self.chosenAction = random.choice([a for a in self.qTable[state]])
         else:
             self.chosenAction = utils.argmaxDict(self.qTable[state])
         return self.chosenAction
@@ -41,13 +43,8 @@ class QLearningAgent(BaseAgent):
     
     def generateInitialModel(self):
         self.qTable = {}
-        for sTime in utils.allTimeStates():
-            for sDay in utils.allDayStates():
-                for sLocation in utils.allLocationStates():
-                    for sActivity in utils.allActivityStates():
-                        for sNotification in utils.allLastNotificationStates():
-                            state = (sTime, sDay, sLocation, sActivity, sNotification)
-                            self.qTable[state] = {a: 0.0 for a in [True, False]}
+        for state in state_codec.allStates():
+            self.qTable[state] = {a: 0.0 for a in [True, False]}
         self.numSteps = 0
     
     def loadModel(self, filepath):
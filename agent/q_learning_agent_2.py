@@ -3,6 +3,7 @@ import numpy as np
 
 from .base_agent import BaseAgent
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
 from constant import *
 
 kInitialLearningRate = 1.0
@@ -28,8 +29,9 @@ class QLearningAgent2(BaseAgent):
                         self.lastState, self.lastAction, self.lastReward, self.currentState)
 
         eps = max(kMinEps, kInitEps * (0.85 ** (self.numSteps // 100)))
-        if np.random.random() < eps:
-            self.chosenAction = np.random.choice([a for a in self.qTable[state]])
+        random = self._getRandom()
+        if random.random() < eps:
+            self.chosenAction = random.choice([a for a in self.qTable[state]])
         else:
             self.chosenAction = utils.argmaxDict(self.qTable[state])
         return self.chosenAction
@@ -42,25 +44,38 @@ class QLearningAgent2(BaseAgent):
         self.lastReward = reward
         self.numSteps += 1
     
-    def feedBatchRewards(self, history):
+    def feedBatchRewards(self, history, numEpochs=1):
+        """
+        Learn the transitions between the consecutive steps of `history`. The history is
+        converted into index arrays once and the Q-table is swept as a flat list, which gives the
+        same Q-values as calling `_updateQTable()` on every transition.
+
+        Params:
+          - history: A list of (state, action, reward) tuples
+          - numEpochs: The number of times to replay the history
+        """
         super().feedBatchRewards(history)
+        if len(history) < 2:
+            return
+
+        allStates = state_codec.allStates()
+        qValues = []
+        for state in allStates:
+            qValues.extend([self.qTable[state][False], self.qTable[state][True]])
 
-        for i in range(len(history) - 1):
-            curState, curAction, reward = history[i]
-            nxtState, _, _ = history[i + 1]
-            self._updateQTable(curState, curAction, reward, nxtState)
-            self.numSteps += 1
+        stateIdxs, actions, rewards = encodeHistory(history)
+        self.numSteps = replayTransitions(
+                qValues, stateIdxs, actions, rewards, self.numSteps, numEpochs)
+
+        for i, state in enumerate(allStates):
+            self.qTable[state][False] = qValues[2 * i]
+            self.qTable[state][True] = qValues[2 * i + 1]
 
     def generateInitialModel(self):
         self.qTable = {}
-        for sTime in utils.allTimeStates():
-            for sDay in utils.allDayStates():
-                for sLocation in utils.allLocationStates():
-                    for sActivity in utils.allActivityStates():
-                        for sNotification in utils.allLastNotificationStates():
-                            state = (sTime, sDay, sLocation, sActivity, sNotification)
-                            #self.qTable[state] = {a: np.random.random() * 1e-3 for a in [True, False]}
-                            self.qTable[state] = {True: 1e-5, False: 0.}
+        for state in state_codec.allStates():
+            #self.qTable[state] = {a: np.random.random() * 1e-3 for a in [True, False]}
+            self.qTable[state] = {True: 1e-5, False: 0.}
         self.lastState = None
         self.lastAction = None
         self.lastReward = None
@@ -87,3 +102,58 @@ class QLearningAgent2(BaseAgent):
         maxNextQVal = utils.maxDictVal(self.qTable[nxtStt])
         self.qTable[curStt][curAct] = (self.qTable[curStt][curAct]
                 + eta * (reward + kGamma * maxNextQVal - self.qTable[curStt][curAct]))
+
+
+def encodeHistory(history):
+    """
+    Convert a list of (state, action, reward) tuples into arrays.
+
+    Returns:
+      (stateIdxs, actions, rewards) where the state is encoded by `state_codec`
+    """
+    states, actions, rewards = zip(*history)
+    stateIdxs = state_codec.encodeStates(*np.array(states, dtype=int).T)
+    return (stateIdxs, np.array(actions, dtype=bool), np.array(rewards, dtype=float))
+
+def replayTransitions(qValues, stateIdxs, actions, rewards, numSteps, numEpochs=1,
+        initialLearningRate=kInitialLearningRate, minLearningRate=kMinLearningRate,
+        gamma=kGamma):
+    """
+    Apply the TD update of `QLearningAgent2._updateQTable()` to every transition between two
+    consecutive steps, in order, `numEpochs` times. The arithmetic is the same as the dictionary
+    version, hence the Q-values are identical.
+
+    Params:
+      qValues: A flat list of Q-values, where the value of a state index `s` and an action `a` is
+               at `2 * s + int(a)`. It is updated in place.
+      stateIdxs, actions, rewards: Arrays of a step sequence (see `encodeHistory()`)
+      numSteps: The number of learned steps so far, which determines the learning rate
+
+    Returns:
+      The number of learned steps after the replay
+    """
+    numTransitions = len(stateIdxs) - 1
+    if numTransitions <= 0 or numEpochs <= 0:
+        return numSteps
+
+    # the pairs of indices to update and to take the max of next Q-values from
+    curIdxs = (2 * stateIdxs[:-1] + actions[:-1]).tolist()
+    nxtIdxs = (2 * stateIdxs[1:]).tolist()
+    rewards = rewards[:-1].tolist()
+
+    # the learning rate only changes every 100 steps, so compute it once per block
+    steps = numSteps + np.arange(numTransitions * numEpochs)
+    firstBlock, lastBlock = numSteps // 100, int(steps[-1]) // 100
+    blockEtas = np.array([max(minLearningRate, initialLearningRate * (0.85 ** b))
+            for b in range(firstBlock, lastBlock + 1)])
+    etas = blockEtas[steps // 100 - firstBlock].tolist()
+
+    etaIdx = 0
+    for _ in range(numEpochs):
+        for cur, nxt, reward in zip(curIdxs, nxtIdxs, rewards):
+            # the same tie-breaking as `utils.maxDictVal()`, which visits True first
+            qNotSend, qSend = qValues[nxt], qValues[nxt + 1]
+            maxNextQVal = qNotSend if qNotSend > qSend else qSend
+            qValues[cur] = qValues[cur] + etas[etaIdx] * (reward + gamma * maxNextQVal - qValues[cur])
+            etaIdx += 1
+    return numSteps + numTransitions * numEpochs
@@ -1,11 +1,11 @@
 import sys
 import numpy as np
 
-from sklearn.model_selection import GridSearchCV
 from sklearn.svm import SVC
 from sklearn import preprocessing
 
 from .base_classifier_agent import BaseClassifierAgent
+from .hyperparameter_search import FullGridSearch
 
 
 kTunedParameters = [{
@@ -18,13 +18,28 @@ kFold = 5
 
 class SVMAgent(BaseClassifierAgent):
 
-    def trainModel(self, dataX, dataY):
+    def __init__(self, negRewardWeight=3, hyperparameterSearch=None):
+        """
+        Params:
+          hyperparameterSearch: The strategy to search the SVM hyperparameters (see
+                                `hyperparameter_search`). The default searches the entire
+                                `kTunedParameters` grid every time the model is trained.
+        """
+        super().__init__(negRewardWeight)
+        self.hyperparameterSearch = (hyperparameterSearch if hyperparameterSearch is not None
+                else FullGridSearch(kTunedParameters, kFold))
+
+    def trainModel(self, dataX, dataY, sampleWeight=None):
         print("Begin to train the model")
-        dataX.astype(float)
-        scaler = preprocessing.StandardScaler().fit(dataX)
-        scaledDataX = scaler.transform(dataX.astype(float))
-        clf = GridSearchCV(SVC(), kTunedParameters, cv=kFold, n_jobs=8)
-        clf.fit(scaledDataX, dataY)
+        dataX = dataX.astype(float)
+        scaler = preprocessing.StandardScaler().fit(dataX, sample_weight=sampleWeight)
+        scaledDataX = scaler.transform(dataX)
+        if self.DEDUPLICATE_TRAINING_DATA and sampleWeight is not None:
+            # the weights of the merged rows are the numbers of repeated rows, which the
+            # cross validation has to draw its folds from
+            clf = self.hyperparameterSearch.fit(SVC(), scaledDataX, dataY, counts=sampleWeight)
+        else:
+            clf = self.hyperparameterSearch.fit(SVC(), scaledDataX, dataY, sampleWeight)
         print("Finish training the model")
         return {
                 'classifier': clf,
@@ -41,3 +56,11 @@ class SVMAgent(BaseClassifierAgent):
         scaledDataX = scaler.transform([dataXVec])
         res = clf.predict(scaledDataX)
         return res[0] > 0
+
+    def getRewardLabels(self, model, dataX):
+        clf = model['classifier']
+        scaler = model['scaler']
+
+        scaledDataX = scaler.transform(dataX)
+        res = clf.predict(scaledDataX)
+        return res > 0
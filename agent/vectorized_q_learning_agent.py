@@ -0,0 +1,234 @@
+import numpy as np
+
+from .base_agent import BaseAgent
+from . import q_learning_agent
+from . import q_learning_agent_2
+from human_modeling_utils import state_codec
+from constant import *
+
+
+class VectorizedQLearningAgent(BaseAgent):
+    """
+    The array-backed counterpart of `QLearningAgent`. The Q-values are kept in a float array
+    indexed by the dense state index (see `state_codec`) and the action (`int(action)`, i.e.,
+    column 0 is not sending and column 1 is sending a notification).
+
+    If `numUsers` is `None`, the agent learns a single `(NUM_STATES, 2)` table and serves one
+    run, like `QLearningAgent`. Otherwise, it learns `numUsers` independent tables at once in a
+    `(numUsers, NUM_STATES, 2)` array, and is driven through `getActionBatch()` and
+    `feedRewardBatch()` with one state per user (e.g., by `BatchController`). The epsilon-greedy
+    selection and the TD updates of all the users are then carried out with array operations.
+
+    The updates are numerically identical to `QLearningAgent`. With a single user, the random
+    numbers are also drawn in the same order, hence the decisions are identical under the same
+    seed. With many users, the exploration draws of all the users are made in one call, so the
+    decisions differ from running separate `QLearningAgent`s, but follow the same distribution.
+    With one random state per user (see `getActionBatch()`), every user makes the same decisions
+    as a `QLearningAgent` drawing from that random state.
+    """
+
+    INITIAL_LEARNING_RATE = q_learning_agent.kInitialLearningRate
+    MIN_LEARNING_RATE = q_learning_agent.kMinLearningRate
+    GAMMA = q_learning_agent.kGamma
+    INIT_EPS = q_learning_agent.kInitEps
+    MIN_EPS = q_learning_agent.kMinEps
+
+    # the initial Q-values of (not sending, sending)
+    INITIAL_Q_VALUES = (0.0, 0.0)
+
+    def __init__(self, numUsers=None, operatingMode=None):
+        self.numUsers = numUsers
+        super().__init__(operatingMode)
+
+    def getAction(self, stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
+        if self.numUsers is not None:
+            raise Exception("getAction() serves a single user. Use getActionBatch() instead")
+        super().getAction(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+        stateIdx = state_codec.encodeState(
+                stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+        return bool(self._chooseActions(np.array([stateIdx]))[0])
+
+    def feedReward(self, reward):
+        if self.numUsers is not None:
+            raise Exception("feedReward() serves a single user. Use feedRewardBatch() instead")
+        super().feedReward(reward)
+        self._learn(np.array([reward], dtype=float))
+
+    def getActionBatch(self, stateTimes, stateDays, stateLocations, stateActivities,
+            stateLastNotifications, randomStates=None):
+        """
+        Each argument is a 1-D array with one state element per user (a single element if
+        `numUsers` is `None`). If `randomStates` is given, user `i` draws from `randomStates[i]`
+        in the same order as `QLearningAgent.getAction()` draws.
+
+        Returns:
+          A bool array indicating whether to send the notification to each user
+        """
+        states = [np.asarray(a) for a in [stateTimes, stateDays, stateLocations, stateActivities,
+                stateLastNotifications]]
+        self._checkActionBatch(*states)
+        return self._chooseActions(state_codec.encodeStates(*states), randomStates)
+
+    def feedRewardBatch(self, rewards, randomStates=None):
+        self._checkRewardBatch()
+        self._learn(np.asarray(rewards, dtype=float))
+
+    def generateInitialModel(self):
+        if self.numUsers is None:
+            shape = (state_codec.NUM_STATES, 2)
+        else:
+            shape = (self.numUsers, state_codec.NUM_STATES, 2)
+        self.qTable = np.empty(shape)
+        self.qTable[...] = self.INITIAL_Q_VALUES
+        self.numSteps = 0
+        self.currentStates = None
+        self.chosenActions = None
+
+    def loadModel(self, filepath):
+        with np.load(filepath) as data:
+            if data['qTable'].shape != self.qTable.shape:
+                raise Exception("Expect a Q-table of shape %s but got %s"
+                        % (self.qTable.shape, data['qTable'].shape))
+            self.qTable = data['qTable']
+            self.numSteps = int(data['numSteps'])
+
+    def saveModel(self, filepath):
+        # pass a file object so that `np.savez()` does not append `.npz` to the path
+        with open(filepath, 'wb') as f:
+            np.savez(f, qTable=self.qTable, numSteps=self.numSteps)
+
+    def getQValues(self, stateTime, stateDay, stateLocation, stateActivity,
+            stateLastNotification):
+        """
+        Returns:
+          The Q-values of (not sending, sending) for the given state. The shape is `(2,)`, or
+          `(numUsers, 2)` if the agent learns for many users.
+        """
+        stateIdx = state_codec.encodeState(
+                stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+        return self.qTable[..., stateIdx, :]
+
+    def _getUserTables(self):
+        """
+        Returns a `(numUsers, NUM_STATES, 2)` view of the Q-table, with a single user if
+        `numUsers` is `None`.
+        """
+        return self.qTable.reshape(-1, state_codec.NUM_STATES, 2)
+
+    def _getEpsilon(self):
+        return max(self.MIN_EPS, self.INIT_EPS * (0.85 ** (self.numSteps // 100)))
+
+    def _getLearningRate(self):
+        return max(self.MIN_LEARNING_RATE,
+                self.INITIAL_LEARNING_RATE * (0.85 ** (self.numSteps // 100)))
+
+    def _chooseActions(self, stateIdxs, randomStates=None):
+        qTables = self._getUserTables()
+        if len(stateIdxs) != len(qTables):
+            raise Exception("Expect %d states but got %d" % (len(qTables), len(stateIdxs)))
+        self.currentStates = stateIdxs
+
+        # `utils.argmaxDict()` visits True first and keeps it on a tie
+        qValues = qTables[np.arange(len(qTables)), stateIdxs]
+        actions = qValues[:, 1] >= qValues[:, 0]
+
+        # `np.random.choice([True, False])` is the same draw as `np.random.randint(0, 2) == 0`
+        epsilon = self._getEpsilon()
+        if randomStates is None:
+            random = self._getRandom()
+            exploring = random.random_sample(len(stateIdxs)) < epsilon
+            numExploring = int(np.sum(exploring))
+            if numExploring > 0:
+                actions[exploring] = random.randint(0, 2, size=numExploring) == 0
+        else:
+            for i, randomState in enumerate(randomStates):
+                if randomState.random_sample() < epsilon:
+                    actions[i] = randomState.randint(0, 2) == 0
+
+        self.chosenActions = actions
+        return actions
+
+    def _learn(self, rewards):
+        qTables = self._getUserTables()
+        userIdxs = np.arange(len(qTables))
+        curStts, curActs = self.currentStates, self.chosenActions.astype(int)
+
+        # same as `QLearningAgent`, the target takes the max Q-value of the current state
+        eta = self._getLearningRate()
+        maxNextQVals = qTables[userIdxs, curStts].max(axis=1)
+        qVals = qTables[userIdxs, curStts, curActs]
+        qTables[userIdxs, curStts, curActs] = qVals + eta * (
+                rewards + self.GAMMA * maxNextQVals - qVals)
+
+        self.numSteps += 1
+
+
+class VectorizedQLearningAgent2(VectorizedQLearningAgent):
+    """
+    The array-backed counterpart of `QLearningAgent2`. See `VectorizedQLearningAgent` for the
+    layout of the Q-table and the multi-user mode.
+
+    In the iterative mode, the transition of the previous step is learned when the next state
+    is observed (i.e., in `getAction()`), the same as `QLearningAgent2`. The batch mode
+    (`feedBatchRewards()`) is only supported with a single user.
+    """
+
+    INITIAL_LEARNING_RATE = q_learning_agent_2.kInitialLearningRate
+    MIN_LEARNING_RATE = q_learning_agent_2.kMinLearningRate
+    GAMMA = q_learning_agent_2.kGamma
+    INIT_EPS = q_learning_agent_2.kInitEps
+    MIN_EPS = q_learning_agent_2.kMinEps
+
+    INITIAL_Q_VALUES = (0., 1e-5)
+
+    def feedBatchRewards(self, history, numEpochs=1):
+        """
+        See `QLearningAgent2.feedBatchRewards()`.
+        """
+        BaseAgent.feedBatchRewards(self, history)
+        if self.numUsers is not None:
+            raise Exception("feedBatchRewards() only supports a single user")
+        if len(history) < 2:
+            return
+
+        qValues = self.qTable.reshape(-1).tolist()
+        stateIdxs, actions, rewards = q_learning_agent_2.encodeHistory(history)
+        self.numSteps = q_learning_agent_2.replayTransitions(
+                qValues, stateIdxs, actions, rewards, self.numSteps, numEpochs,
+                self.INITIAL_LEARNING_RATE, self.MIN_LEARNING_RATE, self.GAMMA)
+        self.qTable = np.array(qValues).reshape(self.qTable.shape)
+
+    def generateInitialModel(self):
+        super().generateInitialModel()
+        self.lastStates = None
+        self.lastActions = None
+        self.lastRewards = None
+
+    def printQTable(self):
+        for stateIdx, state in enumerate(state_codec.allStates()):
+            print(state, self.qTable[..., stateIdx, :])
+
+    def _chooseActions(self, stateIdxs, randomStates=None):
+        if self.operatingMode == BaseAgent.MODE_ITERATIVE and self.numSteps > 0:
+            # now we get last state, last action, last reward, and current state, time to update
+            # Q-table
+            self._updateQTable(self.lastStates, self.lastActions, self.lastRewards, stateIdxs)
+        return super()._chooseActions(stateIdxs, randomStates)
+
+    def _learn(self, rewards):
+        self.lastStates = self.currentStates
+        self.lastActions = self.chosenActions.astype(int)
+        self.lastRewards = rewards
+        self.numSteps += 1
+
+    def _updateQTable(self, curStts, curActs, rewards, nxtStts):
+        """
+        Each argument is a 1-D array with one transition per user.
+        """
+        qTables = self._getUserTables()
+        userIdxs = np.arange(len(qTables))
+        eta = self._getLearningRate()
+        maxNextQVals = qTables[userIdxs, nxtStts].max(axis=1)
+        qVals = qTables[userIdxs, curStts, curActs]
+        qTables[userIdxs, curStts, curActs] = qVals + eta * (
+                rewards + self.GAMMA * maxNextQVals - qVals)
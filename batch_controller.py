@@ -0,0 +1,232 @@
+import numpy as np
+
+from constant import *
+from human_modeling_utils import utils
+from human_modeling_utils.chronometer import Chronometer
+from human_modeling_utils.simulation_log import SimulationLog, kColumnNames
+
+
+class BatchController:
+    """
+    `BatchController` advances `numRuns` independent simulations in lockstep. It behaves like
+    `Controller`, but the per-run state (last notification time, location, activity, reward,
+    etc.) is kept in NumPy arrays, and the agents, environments, and behaviors are consulted
+    once per step for all the runs through their array-shaped entry points
+    (`getActionBatch()`, `feedRewardBatch()`, `getResponseDistributionBatch()`, and
+    `getLocationActivityBatch()`).
+
+    Each of `agent`, `environment`, and `behavior` is either a single object which serves all
+    the runs, or a list of `numRuns` objects (one per run):
+
+      - A single object gets the arrays of all the runs at once. The vectorized objects (e.g.,
+        `VectorizedQLearningAgent` with `numUsers`, `MTurkSurveyUser`, `StubbornUser`, and
+        `RandomBehavior`) process them with array operations. The default entry points of the
+        base classes loop over the runs instead, and an agent without its own batch
+        implementation only serves a single run, because the runs would share its learning
+        state.
+      - A list is consulted object by object through the scalar methods. It is the choice for
+        stateful objects which are not vectorized, such as `QLearningAgent`, but it costs as
+        much as running the simulations one after another.
+
+    All the runs share the same decision time points, so a single chronometer drives them.
+
+    By default, all the runs draw from the global `np.random` generator, in the order of the
+    runs within each step. The runs are therefore coupled: the random numbers of a run depend on
+    the other runs, and only `numRuns=1` reproduces `Controller` under the same seed. With
+    `seeds`, every run draws from its own `np.random.RandomState` instead, which is handed to the
+    objects of the run (see `setRandomState()` of the base classes), and run `i` gives the same
+    results as `Controller` with the same objects after `np.random.seed(seeds[i])`.
+    """
+
+    def __init__(self, agent, environment, behavior, numRuns=None,
+            simulationWeek=10, negativeReward=-10, verbose=True, seeds=None):
+        """
+        Params:
+          numRuns: The number of runs. It defaults to the length of the lists of objects, or 1 if
+                   only single objects are given.
+          seeds: One random seed per run, to give each run its own random state
+        """
+        self.rewardCriteria = {
+                ANSWER_NOTIFICATION_ACCEPT: 1,
+                ANSWER_NOTIFICATION_IGNORE: 0,
+                ANSWER_NOTIFICATION_DISMISS: negativeReward,
+        }
+
+        if numRuns is None:
+            numRuns = next((len(o) for o in [agent, environment, behavior] if type(o) is list), 1)
+        for o in [agent, environment, behavior]:
+            if type(o) is list and len(o) != numRuns:
+                raise Exception("Expect %d objects per list but got %d" % (numRuns, len(o)))
+        self.numRuns = numRuns
+
+        self.verbose = verbose
+
+        # set chronometer which automatically skips 10pm to 8am because it's usually when people
+        # sleep
+        self.chronometer = Chronometer(skipIntervals=[(22 * 60, 8 * 60)])
+
+        self.stepWidthMinutes = 10
+        self.simulationWeek = simulationWeek
+
+        # the time of the last notification of each run, in minutes since the simulation starts
+        self.lastNotificationTimestamps = np.zeros(numRuns, dtype=int)
+
+        # the runs share the global random generator unless they are seeded one by one
+        self.randomStates = None
+        if seeds is not None:
+            if len(seeds) != numRuns:
+                raise Exception("Expect %d seeds but got %d" % (numRuns, len(seeds)))
+            self.randomStates = [np.random.RandomState(seed) for seed in seeds]
+
+        self.agent = agent if type(agent) is not list else _AgentGroup(agent)
+        self.environment = (environment if type(environment) is not list
+                else _EnvironmentGroup(environment))
+        self.behavior = behavior if type(behavior) is not list else _BehaviorGroup(behavior)
+
+        self.simulationResults = [SimulationLog() for _ in range(numRuns)]
+
+        for a in (agent if type(agent) is list else [agent]):
+            a.setNegativeReward(negativeReward)
+
+    def execute(self):
+        """
+        Returns:
+          A list of `numRuns` `SimulationLog` objects, one per run.
+        """
+        numRuns = self.numRuns
+        # the reward of each reaction, in the order of the response distributions
+        reactionRewards = np.array([self.rewardCriteria[r] for r in [ANSWER_NOTIFICATION_ACCEPT,
+                ANSWER_NOTIFICATION_IGNORE, ANSWER_NOTIFICATION_DISMISS]], dtype=float)
+
+        # all the decision time points are known in advance, so materialize them at once
+        timeline = self.chronometer.compileTimeline(
+                self.stepWidthMinutes, self.simulationWeek * 7)
+
+        # the step records of all the runs, one (numRuns,) array per step and column
+        stepColumns = {name: [] for name in kColumnNames}
+
+        for numDaysPassed, currentHour, currentMinute, currentDay in zip(
+                *[a.tolist() for a in timeline]):
+            if self.verbose:
+                print("Day %d %d:%02d" % (numDaysPassed, currentHour, currentMinute))
+
+            hours = np.full(numRuns, currentHour)
+            minutes = np.full(numRuns, currentMinute)
+            days = np.full(numRuns, currentDay)
+
+            # get environment info (user context)
+            currentTimestamp = utils.getDeltaMinutes(numDaysPassed, currentHour, currentMinute,
+                    0, 0, 0)
+            lastNotificationTimes = currentTimestamp - self.lastNotificationTimestamps
+            stateLastNotifications = utils.getLastNotificationStates(lastNotificationTimes)
+            stateLocations, stateActivities = self.behavior.getLocationActivityBatch(
+                    hours, minutes, days, randomStates=self.randomStates)
+            probs = np.asarray(self.environment.getResponseDistributionBatch(
+                    hours, minutes, days, stateLocations, stateActivities, lastNotificationTimes,
+                    randomStates=self.randomStates,
+            ), dtype=float)
+            probs = probs / (probs[:, 0] + probs[:, 1] + probs[:, 2])[:, np.newaxis]
+
+            # prepare observables and get action
+            stateTimes = np.full(numRuns, utils.getTimeState(currentHour, currentMinute))
+            stateDays = np.full(numRuns, utils.getDayState(currentDay))
+            sendNotifications = np.asarray(self.agent.getActionBatch(
+                    stateTimes, stateDays, stateLocations, stateActivities, stateLastNotifications,
+                    randomStates=self.randomStates,
+            ), dtype=bool)
+
+            # calculate reward. The reactions are drawn like `np.random.choice()` (see
+            # `utils.drawIndices()`), so that a single run reproduces `Controller`.
+            rewards = np.zeros(numRuns)
+            sendingIdxs = np.flatnonzero(sendNotifications)
+            if len(sendingIdxs) > 0:
+                uniformSamples = utils.drawUniformSamples(np.random, len(sendingIdxs),
+                        None if self.randomStates is None
+                        else [self.randomStates[i] for i in sendingIdxs.tolist()])
+                rewards[sendingIdxs] = reactionRewards[
+                        utils.drawIndices(probs[sendingIdxs], uniformSamples)]
+            self.lastNotificationTimestamps[sendingIdxs] = currentTimestamp
+            self.agent.feedRewardBatch(rewards, randomStates=self.randomStates)
+
+            # log this session
+            for name, values in [
+                    ('numDaysPassed', np.full(numRuns, numDaysPassed)), ('hour', hours),
+                    ('minute', minutes), ('day', days), ('location', stateLocations),
+                    ('activity', stateActivities), ('lastNotification', lastNotificationTimes),
+                    ('probOfAnswering', probs[:, 0]), ('probOfIgnoring', probs[:, 1]),
+                    ('probOfDismissing', probs[:, 2]), ('decision', sendNotifications),
+                    ('reward', rewards)]:
+                stepColumns[name].append(values)
+
+        # hand over the records to the per-run logs at once
+        stepColumns = {name: np.stack(values, axis=1) if len(values) > 0
+                else np.zeros((numRuns, 0)) for name, values in stepColumns.items()}
+        for i, log in enumerate(self.simulationResults):
+            log.extend({name: values[i] for name, values in stepColumns.items()})
+
+        return self.simulationResults
+
+
+class _AgentGroup:
+    """
+    Exposes a list of per-run agents through the array-shaped agent entry points. Each agent
+    draws from the random state of its run, if the runs have their own.
+    """
+
+    def __init__(self, agents):
+        self.agents = agents
+
+    def getActionBatch(self, stateTimes, stateDays, stateLocations, stateActivities,
+            stateLastNotifications, randomStates=None):
+        states = zip(stateTimes.tolist(), stateDays.tolist(), stateLocations.tolist(),
+                stateActivities.tolist(), stateLastNotifications.tolist())
+        return np.array([utils.callWithObjectRandomState(a, randomState, a.getAction, *s)
+                for a, randomState, s in zip(self.agents, _perRun(randomStates, self.agents),
+                    states)], dtype=bool)
+
+    def feedRewardBatch(self, rewards, randomStates=None):
+        for a, randomState, r in zip(self.agents, _perRun(randomStates, self.agents),
+                np.asarray(rewards).tolist()):
+            utils.callWithObjectRandomState(a, randomState, a.feedReward, r)
+
+
+class _EnvironmentGroup:
+    """
+    Exposes a list of per-run environments through the array-shaped environment entry point.
+    """
+
+    def __init__(self, environments):
+        self.environments = environments
+
+    def getResponseDistributionBatch(self, hours, minutes, days,
+            stateLocations, stateActivities, lastNotificationTimes, randomStates=None):
+        contexts = zip(hours.tolist(), minutes.tolist(), days.tolist(), stateLocations.tolist(),
+                stateActivities.tolist(), lastNotificationTimes.tolist())
+        return np.array([utils.callWithObjectRandomState(
+                e, randomState, e.getResponseDistribution, *c)
+                for e, randomState, c in zip(self.environments,
+                    _perRun(randomStates, self.environments), contexts)], dtype=float)
+
+
+class _BehaviorGroup:
+    """
+    Exposes a list of per-run behavior models through the array-shaped behavior entry point.
+    """
+
+    def __init__(self, behaviors):
+        self.behaviors = behaviors
+
+    def getLocationActivityBatch(self, hours, minutes, days, randomStates=None):
+        times = zip(hours.tolist(), minutes.tolist(), days.tolist())
+        results = [utils.callWithObjectRandomState(b, randomState, b.getLocationActivity, *t)
+                for b, randomState, t in zip(self.behaviors,
+                    _perRun(randomStates, self.behaviors), times)]
+        stateLocations, stateActivities = zip(*results)
+        return (np.array(stateLocations, dtype=int), np.array(stateActivities, dtype=int))
+
+
+def _perRun(randomStates, objects):
+    """
+    Returns the random state of each run, which is `None` if the runs have none.
+    """
+    return randomStates if randomStates is not None else [None] * len(objects)
@@ -1,2 +1,3 @@
 from .random_behavior import RandomBehavior 
 from .extra_sensory_behavior import ExtraSensoryBehavior
+from .trace_store import TraceStore, writeTraceStore
@@ -1,5 +1,28 @@
+import numpy as np
+
+from human_modeling_utils import utils
+
+
 class BaseBehaviorModel:
-    
+
+    # the random generator of the behavior model (see `setRandomState()`). `None` stands for the
+    # global `np.random` generator.
+    randomState = None
+
+    def setRandomState(self, randomState):
+        """
+        Let the behavior model draw its random numbers from `randomState`, a
+        `np.random.RandomState`, instead of the global `np.random` generator. `None` restores the
+        global generator.
+        """
+        self.randomState = randomState
+
+    def _getRandom(self):
+        """
+        Returns either the random state of the behavior model or the `np.random` module.
+        """
+        return self.randomState if self.randomState is not None else np.random
+
     def getLocationActivity(self, hour, minute, day):
         """
         Get location state and activity state based on the timestamp.
@@ -8,3 +31,24 @@ class BaseBehaviorModel:
           (stateLocation, stateActivity)
         """
         pass
+
+    def getLocationActivityBatch(self, hours, minutes, days, randomStates=None):
+        """
+        The array-shaped counterpart of `getLocationActivity()`. Each argument is a 1-D array
+        with one element per simulation run. If `randomStates` is given, it holds one
+        `np.random.RandomState` per run, and the random numbers of run `i` are drawn from
+        `randomStates[i]`. The default implementation queries the runs one by one.
+
+        Returns:
+          (stateLocations, stateActivities) as two int arrays
+        """
+        times = list(zip(np.asarray(hours).tolist(), np.asarray(minutes).tolist(),
+                np.asarray(days).tolist()))
+        if len(times) == 0:
+            return (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+        if randomStates is None:
+            randomStates = [None] * len(times)
+        results = [utils.callWithObjectRandomState(self, randomState, self.getLocationActivity, *t)
+                for randomState, t in zip(randomStates, times)]
+        stateLocations, stateActivities = zip(*results)
+        return (np.array(stateLocations, dtype=int), np.array(stateActivities, dtype=int))
@@ -1,17 +1,55 @@
+import bisect
 import numpy as np
-import itertools
 
 from .base_behavior_model import BaseBehaviorModel
+from .trace_store import TraceStore
 from constant import *
+from human_modeling_utils import utils
 from collections import Counter
 
 
+kNumMinutesPerDay = 24 * 60
+
+
 class ExtraSensoryBehavior(BaseBehaviorModel):
+    """
+    Each routing (i.e., source file) is stored as a sorted int32 array of the minute of the
+    week, `day * 1440 + hour * 60 + minute`, with the parallel arrays of the location and
+    activity states. A query is answered by the first record at or after the queried time, which
+    is found by a binary search, so the queries can come in any order. The single queries
+    search `memoryview`s of the arrays with `bisect`, which is much faster than
+    `np.searchsorted()` on a scalar.
+
+    The routings can also be opened from a trace store (see `trace_store`), which maps a packed
+    binary file into memory instead of parsing the text files. A store is compiled by
+    `main_compile_trace_store.py`.
+
+    `getLocationActivity()` replays one routing per simulated week: a query earlier than the
+    previous one starts a new week, which is served by the next routing. A query beyond the last
+    record of a routing continues with the first record of the next routing.
+    `lookupLocationActivity()` and `getLocationActivityBatch()` with `routingIdxs` are stateless,
+    hence multiple simulations can share one object.
+
+    The records of every day of every routing are also indexed (see `_buildDayIndex()`). With
+    `daySampling` other than `DAY_SAMPLING_OFF`, `getLocationActivity()` draws a whole recorded
+    day, uniformly from all the days or from the days of the same type (weekday/weekend) or of
+    the same day of the week, whenever the queried day changes, and answers the queries of that
+    day from it. A query beyond the last record of a sampled day gets the last record of the day.
+    `sampleDays()` and `lookupDayLocationActivity()` draw and replay day sequences in bulk.
+    """
+
+    DAY_SAMPLING_OFF = 0
+    DAY_SAMPLING_ANY_DAY = 1
+    DAY_SAMPLING_SAME_DAY_TYPE = 2
+    DAY_SAMPLING_SAME_DAY_OF_WEEK = 3
     
-    def __init__(self, sourceFiles):
+    def __init__(self, sourceFiles=None, traceStorePath=None, routingIdxs=None, daySampling=None):
         """
         The `sourceFiles` is either one string indicating the path of a source file, or a `list`
-        of strings that represent multiple paths.
+        of strings that represent multiple paths. Alternatively, `traceStorePath` is the path of
+        a trace store, and `routingIdxs` is the list of the routings to use in the store (all the
+        routings by default). `daySampling` is one of the `DAY_SAMPLING_*` constants
+        (`DAY_SAMPLING_OFF` by default).
 
         The file format is the following elements separated by tabs:
             <motion>
@@ -26,40 +64,303 @@ class ExtraSensoryBehavior(BaseBehaviorModel):
             stationary  home    60  0   0   1
         """
 
+        self.traceStorePath = traceStorePath
+        self.storeRoutingIdxs = routingIdxs
+        if traceStorePath is not None:
+            self._openTraceStore()
+        elif sourceFiles is not None:
+            self._loadSourceFiles(sourceFiles)
+        else:
+            raise Exception("ERROR: Either `sourceFiles` or `traceStorePath` has to be given")
+        self._buildRoutingViews()
+
+        self.daySampling = (daySampling if daySampling is not None
+                else ExtraSensoryBehavior.DAY_SAMPLING_OFF)
+        self._buildDayIndex()
+
+        self.srcIdx = 0
+        self.lastQueryTime = -1
+        self.dayIdx = None
+        self.dayRecords = None
+
+    def __getstate__(self):
+        # memory views cannot be pickled, and a trace store is reopened rather than copied
+        state = self.__dict__.copy()
+        for key in ['routingTimeViews', 'routingLocationViews', 'routingActivityViews']:
+            del state[key]
+        if self.traceStorePath is not None:
+            for key in ['routingTimes', 'routingLocations', 'routingActivities']:
+                del state[key]
+        return state
+
+    def __setstate__(self, state):
+        # objects pickled before the routings were indexed by the minute of the week keep the
+        # parsed records in `routings`, and the ones pickled before the trace store or the day
+        # sampling were introduced do not have their attributes
+        state.setdefault('traceStorePath', None)
+        state.setdefault('storeRoutingIdxs', None)
+        state.setdefault('daySampling', ExtraSensoryBehavior.DAY_SAMPLING_OFF)
+        state.setdefault('dayIdx', None)
+        state.setdefault('dayRecords', None)
+        for key in ['routingTimeLists', 'routingStateLists']:
+            state.pop(key, None)
+        routings = state.pop('routings', None)
+        recordIdx = state.pop('recordIdx', None)
+        self.__dict__.update(state)
+
+        if routings is not None:
+            self.routingTimes = []
+            self.routingLocations = []
+            self.routingActivities = []
+            for routing in routings:
+                self._appendRouting(routing)
+            # keep the position in the routing: the last query is taken as the earliest time
+            # which the record `recordIdx` answers
+            self.lastQueryTime = -1
+            if recordIdx:
+                hour, minute, day = routings[self.srcIdx][recordIdx - 1][:3]
+                self.lastQueryTime = day * kNumMinutesPerDay + hour * 60 + minute + 1
+        elif self.traceStorePath is not None:
+            self._openTraceStore()
+        self._buildRoutingViews()
+        if 'dayRoutingIdxs' not in state:
+            self._buildDayIndex()
+
+    def _loadSourceFiles(self, sourceFiles):
         if type(sourceFiles) is not list:
             sourceFiles = [sourceFiles]
 
         self.numActivityNan = 0
         self.numLocationNan = 0
-        self.routings = []
+        self.routingTimes = []
+        self.routingLocations = []
+        self.routingActivities = []
         for src in sourceFiles:
             print(src)
             with open(src) as f:
                 routing = [self._parseLine(l) for l in f.readlines()]
                 if len(routing) == 0:
                     raise Exception("ERROR: No routing can be extracted. ('%s')" % src)
-                self.routings.append(routing)
+                self._appendRouting(routing)
 
-        self.srcIdx = 0
-        self.recordIdx = 0
+    def _appendRouting(self, routing):
+        """
+        Sort the parsed records of a routing (see `_parseLine()`) by the minute of the week and
+        append them as arrays.
+        """
+        hours, minutes, days, stateLocations, stateActivities = (
+                np.array(column, dtype=np.int32) for column in zip(*routing))
+        times = _getMinuteOfWeek(hours, minutes, days)
+        order = np.argsort(times, kind='stable')
+        self.routingTimes.append(times[order])
+        self.routingLocations.append(stateLocations[order])
+        self.routingActivities.append(stateActivities[order])
+
+    def _openTraceStore(self):
+        print(self.traceStorePath)
+        store = TraceStore(self.traceStorePath)
+        routingIdxs = (self.storeRoutingIdxs if self.storeRoutingIdxs is not None
+                else range(store.numRoutings))
+
+        self.numActivityNan = store.numActivityNan
+        self.numLocationNan = store.numLocationNan
+        self.routingTimes = []
+        self.routingLocations = []
+        self.routingActivities = []
+        for routingIdx in routingIdxs:
+            times, stateLocations, stateActivities = store.getRouting(routingIdx)
+            if len(times) == 0:
+                raise Exception("ERROR: No routing can be extracted. ('%s', routing %d)"
+                        % (self.traceStorePath, routingIdx))
+            self.routingTimes.append(times)
+            self.routingLocations.append(stateLocations)
+            self.routingActivities.append(stateActivities)
+        if len(self.routingTimes) == 0:
+            raise Exception("ERROR: No routing can be extracted. ('%s')" % self.traceStorePath)
+
+    def _buildRoutingViews(self):
+        # indexing a memory view returns a Python int, which `bisect` compares quickly
+        self.routingTimeViews = [memoryview(a) for a in self.routingTimes]
+        self.routingLocationViews = [memoryview(a) for a in self.routingLocations]
+        self.routingActivityViews = [memoryview(a) for a in self.routingActivities]
 
     def getLocationActivity(self, hour, minute, day):
-        # handle the rewind case
-        targetTime = (day, minute, hour)
-        if self._getRecordTime(self.srcIdx, self.recordIdx) > targetTime:
-            self.srcIdx = (self.srcIdx + 1) % len(self.routings)
-            self.recordIdx = 0
-            
-        while self.recordIdx < len(self.routings[self.srcIdx]):
-            if self._getRecordTime(self.srcIdx, self.recordIdx) >= targetTime:
-                #print(self.recordIdx, self._getRecordLocationActivity(self.recordIdx))
-                return self._getRecordLocationActivity(self.srcIdx, self.recordIdx)
-            self.recordIdx += 1
-
-        # the end of the routing so have to reset
-        self.srcIdx = (self.srcIdx + 1) % len(self.routings)
-        self.recordIdx = 0
-        return self._getRecordLocationActivity(self.srcIdx, self.recordIdx)
+        if self.daySampling != ExtraSensoryBehavior.DAY_SAMPLING_OFF:
+            return self._getSampledDayLocationActivity(hour, minute, day)
+
+        targetTime = hour * 60 + minute + day * kNumMinutesPerDay
+
+        # handle the rewind case, i.e., a new week
+        if targetTime < self.lastQueryTime:
+            self.srcIdx = (self.srcIdx + 1) % len(self.routingTimes)
+        self.lastQueryTime = targetTime
+
+        times = self.routingTimeViews[self.srcIdx]
+        recordIdx = bisect.bisect_left(times, targetTime)
+        if recordIdx == len(times):
+            # the end of the routing so have to reset
+            self.srcIdx = (self.srcIdx + 1) % len(self.routingTimes)
+            self.lastQueryTime = -1
+            recordIdx = 0
+        return self._getRecordLocationActivity(self.srcIdx, recordIdx)
+
+    def lookupLocationActivity(self, routingIdx, hour, minute, day):
+        """
+        Get the location and activity of routing `routingIdx` at the given time, without
+        changing the state of the object. A query beyond the last record gets the first record
+        of the routing.
+
+        Returns:
+          (stateLocation, stateActivity)
+        """
+        times = self.routingTimeViews[routingIdx]
+        recordIdx = bisect.bisect_left(times, hour * 60 + minute + day * kNumMinutesPerDay)
+        if recordIdx == len(times):
+            recordIdx = 0
+        return self._getRecordLocationActivity(routingIdx, recordIdx)
+
+    def getLocationActivityBatch(self, hours, minutes, days, routingIdxs=None, randomStates=None):
+        """
+        Params:
+          routingIdxs: The routing of each query. If it is `None`, the first query goes through
+                       `getLocationActivity()` and all the queries use the resulting routing.
+          randomStates: One random state per query (see `BaseBehaviorModel`). If it is given
+                        without `routingIdxs`, every query goes through `getLocationActivity()`
+                        with its own random state, one after another.
+
+        Returns:
+          (stateLocations, stateActivities) as two int arrays
+        """
+        hours, minutes, days = np.asarray(hours), np.asarray(minutes), np.asarray(days)
+        targetTimes = _getMinuteOfWeek(hours, minutes, days)
+        if routingIdxs is None and randomStates is not None:
+            return super().getLocationActivityBatch(hours, minutes, days, randomStates)
+        if routingIdxs is None:
+            if len(targetTimes) == 0:
+                return (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+            self.getLocationActivity(int(hours[0]), int(minutes[0]), int(days[0]))
+            if self.daySampling != ExtraSensoryBehavior.DAY_SAMPLING_OFF:
+                return self.lookupDayLocationActivity(
+                        np.full(len(targetTimes), self.dayIdx), hours, minutes)
+            routingIdxs = np.full(len(targetTimes), self.srcIdx)
+        routingIdxs = np.asarray(routingIdxs)
+
+        stateLocations = np.empty(len(targetTimes), dtype=int)
+        stateActivities = np.empty(len(targetTimes), dtype=int)
+        for routingIdx in np.unique(routingIdxs).tolist():
+            mask = routingIdxs == routingIdx
+            times = self.routingTimes[routingIdx]
+            recordIdxs = np.searchsorted(times, targetTimes[mask], side='left')
+            recordIdxs[recordIdxs == len(times)] = 0
+            stateLocations[mask] = self.routingLocations[routingIdx][recordIdxs]
+            stateActivities[mask] = self.routingActivities[routingIdx][recordIdxs]
+        return (stateLocations, stateActivities)
+
+    def sampleDays(self, days, daySampling=None):
+        """
+        Draw a recorded day for each of `days` (the days of the week), independently and
+        uniformly from the days allowed by `daySampling` (`self.daySampling` by default).
+
+        Returns:
+          An int array of the indices of the drawn days in the day index
+        """
+        daySampling = daySampling if daySampling is not None else self.daySampling
+        poolKeys = self._getDayPoolKeys(np.asarray(days, dtype=int), daySampling)
+        dayIdxs = np.empty(len(poolKeys), dtype=int)
+        for poolKey in np.unique(poolKeys).tolist():
+            mask = poolKeys == poolKey
+            pool = self._getDayPool(poolKey, daySampling)
+            dayIdxs[mask] = pool[self._getRandom().randint(len(pool), size=int(np.sum(mask)))]
+        return dayIdxs
+
+    def lookupDayLocationActivity(self, dayIdxs, hours, minutes):
+        """
+        Get the location and activity of each of the indexed days `dayIdxs` at the given time of
+        the day. This does not change the state of the object.
+
+        Returns:
+          (stateLocations, stateActivities) as two int arrays
+        """
+        dayIdxs = np.asarray(dayIdxs, dtype=int)
+        targetTimes = (self.dayOfWeeks[dayIdxs] * kNumMinutesPerDay
+                + np.asarray(hours) * 60 + np.asarray(minutes))
+        dayRoutingIdxs = self.dayRoutingIdxs[dayIdxs]
+
+        stateLocations = np.empty(len(dayIdxs), dtype=int)
+        stateActivities = np.empty(len(dayIdxs), dtype=int)
+        for routingIdx in np.unique(dayRoutingIdxs).tolist():
+            mask = dayRoutingIdxs == routingIdx
+            recordIdxs = np.searchsorted(self.routingTimes[routingIdx], targetTimes[mask],
+                    side='left')
+            recordIdxs = np.minimum(recordIdxs, self.dayEnds[dayIdxs[mask]] - 1)
+            stateLocations[mask] = self.routingLocations[routingIdx][recordIdxs]
+            stateActivities[mask] = self.routingActivities[routingIdx][recordIdxs]
+        return (stateLocations, stateActivities)
+
+    def _getSampledDayLocationActivity(self, hour, minute, day):
+        targetTime = hour * 60 + minute + day * kNumMinutesPerDay
+
+        # draw a new day when the day changes, including a new week starting on the same day
+        if (self.dayIdx is None or day != self.lastQueryTime // kNumMinutesPerDay
+                or targetTime < self.lastQueryTime):
+            pool = self._getDayPool(int(self._getDayPoolKeys(np.array([day]),
+                    self.daySampling)[0]), self.daySampling)
+            self.dayIdx = int(pool[self._getRandom().randint(len(pool))])
+            self.dayRecords = (int(self.dayRoutingIdxs[self.dayIdx]),
+                    int(self.dayOfWeeks[self.dayIdx]) * kNumMinutesPerDay,
+                    int(self.dayStarts[self.dayIdx]), int(self.dayEnds[self.dayIdx]))
+        self.lastQueryTime = targetTime
+
+        routingIdx, dayOffset, dayStart, dayEnd = self.dayRecords
+        recordIdx = bisect.bisect_left(self.routingTimeViews[routingIdx],
+                dayOffset + hour * 60 + minute, dayStart, dayEnd)
+        return self._getRecordLocationActivity(routingIdx, min(recordIdx, dayEnd - 1))
+
+    def _buildDayIndex(self):
+        """
+        Index the records of each day which has any record in each routing. The `i`-th day is
+        the records `dayStarts[i]` to `dayEnds[i] - 1` of routing `dayRoutingIdxs[i]`, recorded
+        on day of the week `dayOfWeeks[i]`. The days are grouped into pools by the key of
+        `_getDayPoolKeys()` for each day sampling mode.
+        """
+        dayBoundaries = np.arange(8) * kNumMinutesPerDay
+        dayRoutingIdxs, dayOfWeeks, dayStarts, dayEnds = [], [], [], []
+        for routingIdx, times in enumerate(self.routingTimes):
+            bounds = np.searchsorted(times, dayBoundaries, side='left')
+            for day in range(7):
+                if bounds[day] < bounds[day + 1]:
+                    dayRoutingIdxs.append(routingIdx)
+                    dayOfWeeks.append(day)
+                    dayStarts.append(bounds[day])
+                    dayEnds.append(bounds[day + 1])
+        self.dayRoutingIdxs = np.array(dayRoutingIdxs, dtype=int)
+        self.dayOfWeeks = np.array(dayOfWeeks, dtype=int)
+        self.dayStarts = np.array(dayStarts, dtype=int)
+        self.dayEnds = np.array(dayEnds, dtype=int)
+
+        self.dayPools = {}
+        for daySampling in [ExtraSensoryBehavior.DAY_SAMPLING_ANY_DAY,
+                ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_TYPE,
+                ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_OF_WEEK]:
+            poolKeys = self._getDayPoolKeys(self.dayOfWeeks, daySampling)
+            for poolKey in np.unique(poolKeys).tolist():
+                self.dayPools[(daySampling, poolKey)] = np.flatnonzero(poolKeys == poolKey)
+
+    def _getDayPoolKeys(self, days, daySampling):
+        if daySampling == ExtraSensoryBehavior.DAY_SAMPLING_ANY_DAY:
+            return np.zeros(len(days), dtype=int)
+        elif daySampling == ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_TYPE:
+            return np.array([utils.getDayState(d) for d in days.tolist()], dtype=int)
+        elif daySampling == ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_OF_WEEK:
+            return days.copy()
+        raise Exception("ERROR: Unknown day sampling mode %s" % str(daySampling))
+
+    def _getDayPool(self, poolKey, daySampling):
+        pool = self.dayPools.get((daySampling, poolKey))
+        if pool is None:
+            raise Exception("ERROR: No recorded day matches the day sampling (mode %d, key %d)"
+                    % (daySampling, poolKey))
+        return pool
 
     def _parseLine(self, line):
         """
@@ -102,37 +403,33 @@ class ExtraSensoryBehavior(BaseBehaviorModel):
         )
 
     def printSummary(self):
-        allRoutingRecords = list(itertools.chain(*self.routings))
-        print("# of total records: %d" % len(allRoutingRecords))
+        allLocations = np.concatenate(self.routingLocations)
+        allActivities = np.concatenate(self.routingActivities)
+        print("# of total records: %d" % len(allLocations))
         print("# of `nan` in location: %d" % self.numLocationNan)
         print("# of `nan` in Activity: %d" % self.numActivityNan)
         
-        locCnts = Counter([r[3] for r in allRoutingRecords])
+        locCnts = Counter(allLocations.tolist())
         print("Location:")
         print("    home: %d" % locCnts[STATE_LOCATION_HOME])
         print("    work: %d" % locCnts[STATE_LOCATION_WORK])
         print("  others: %d" % locCnts[STATE_LOCATION_OTHER])
 
-        actCnts = Counter([r[4] for r in allRoutingRecords])
+        actCnts = Counter(allActivities.tolist())
         print("Activity:")
         print("  stationary: %d" % actCnts[STATE_ACTIVITY_STATIONARY])
         print("     walking: %d" % actCnts[STATE_ACTIVITY_WALKING])
         print("     running: %d" % actCnts[STATE_ACTIVITY_RUNNING])
         print("     driving: %d" % actCnts[STATE_ACTIVITY_DRIVING])
         print("   commuting: %d" % actCnts[STATE_ACTIVITY_COMMUTE])
-        
-    def _getRecordTime(self, srcIdx, recordIdx):
-        """
-        Returns:
-          (day, hour, minute)
-        """
-        r = self.routings[srcIdx][recordIdx]
-        return (r[2], r[0], r[1])
 
     def _getRecordLocationActivity(self, srcIdx, recordIdx):
         """
         Returns:
           (stateLocation, stateActivity)
         """
-        r = self.routings[srcIdx][recordIdx]
-        return (r[3], r[4])
+        return (self.routingLocationViews[srcIdx][recordIdx],
+                self.routingActivityViews[srcIdx][recordIdx])
+
+def _getMinuteOfWeek(hours, minutes, days):
+    return (days * kNumMinutesPerDay + hours * 60 + minutes).astype(np.int32)
@@ -2,17 +2,36 @@ import numpy as np
 
 from .base_behavior_model import BaseBehaviorModel
 from constant import *
+from human_modeling_utils import utils
+
+
+kLocations = [STATE_LOCATION_HOME, STATE_LOCATION_WORK, STATE_LOCATION_OTHER]
+kLocationProbs = [0.5, 0.4, 0.1]
+
+kActivities = [STATE_ACTIVITY_STATIONARY, STATE_ACTIVITY_WALKING, STATE_ACTIVITY_RUNNING,
+        STATE_ACTIVITY_DRIVING]
+kActivityProbs = [0.7, 0.1, 0.1, 0.1]
 
 
 class RandomBehavior(BaseBehaviorModel):
     
     def getLocationActivity(self, hour, minute, day):
-        stateLocation = np.random.choice(
-            a=[STATE_LOCATION_HOME, STATE_LOCATION_WORK, STATE_LOCATION_OTHER],
-            p=[0.5, 0.4, 0.1],
-        )
-        stateActivity = np.random.choice(
-            a=[STATE_ACTIVITY_STATIONARY, STATE_ACTIVITY_WALKING, STATE_ACTIVITY_RUNNING, STATE_ACTIVITY_DRIVING],
-            p=[0.7, 0.1, 0.1, 0.1],
-        )
+        random = self._getRandom()
+        stateLocation = random.choice(a=kLocations, p=kLocationProbs)
+        stateActivity = random.choice(a=kActivities, p=kActivityProbs)
         return (stateLocation, stateActivity)
+
+    def getLocationActivityBatch(self, hours, minutes, days, randomStates=None):
+        # each run draws the location and then the activity, with one uniform random number
+        # each, the same as `np.random.choice()` in `getLocationActivity()`
+        numRuns = len(hours)
+        if randomStates is None:
+            uniformSamples = self._getRandom().random_sample((numRuns, 2))
+        else:
+            uniformSamples = np.array([randomState.random_sample(2)
+                    for randomState in randomStates]).reshape(numRuns, 2)
+        locationIdxs = utils.drawIndices(np.tile(kLocationProbs, (numRuns, 1)),
+                uniformSamples[:, 0])
+        activityIdxs = utils.drawIndices(np.tile(kActivityProbs, (numRuns, 1)),
+                uniformSamples[:, 1])
+        return (np.array(kLocations)[locationIdxs], np.array(kActivities)[activityIdxs])
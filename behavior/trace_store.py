@@ -0,0 +1,100 @@
+import os
+import numpy as np
+
+
+kTraceStoreMagic = b'ESTRACE1'
+
+kTraceStoreHeaderDtype = np.dtype([
+        ('magic', 'S8'),
+        ('numRoutings', '<u8'),
+        ('numRecords', '<u8'),
+        ('numActivityNan', '<u8'),
+        ('numLocationNan', '<u8'),
+])
+
+
+def writeTraceStore(filepath, routingTimes, routingLocations, routingActivities,
+        numActivityNan=0, numLocationNan=0):
+    """
+    Pack the routings of `ExtraSensoryBehavior` into one binary file which `TraceStore` opens.
+
+    The file consists of the header (see `kTraceStoreHeaderDtype`), the offsets of the routings
+    (`numRoutings + 1` uint64), and then three columns over the records of all the routings: the
+    minute of the week (uint16), the location state (uint8), and the activity state (uint8).
+    Each record takes 4 bytes.
+
+    Params:
+      routingTimes: A list of the sorted minute-of-week arrays, one per routing
+      routingLocations: A list of the location state arrays, one per routing
+      routingActivities: A list of the activity state arrays, one per routing
+    """
+    lengths = [len(times) for times in routingTimes]
+    offsets = np.zeros(len(lengths) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum(lengths)
+
+    allTimes = np.concatenate(routingTimes) if len(lengths) > 0 else np.zeros(0)
+    if len(allTimes) > 0 and (np.min(allTimes) < 0 or np.max(allTimes) > np.iinfo(np.uint16).max):
+        raise Exception("ERROR: The minute of the week is out of range")
+
+    header = np.zeros(1, dtype=kTraceStoreHeaderDtype)
+    header['magic'] = kTraceStoreMagic
+    header['numRoutings'] = len(lengths)
+    header['numRecords'] = offsets[-1]
+    header['numActivityNan'] = numActivityNan
+    header['numLocationNan'] = numLocationNan
+
+    # write to a temporary file first so that a reader never sees a partial store
+    tmpPath = filepath + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        header.tofile(f)
+        offsets.tofile(f)
+        allTimes.astype('<u2').tofile(f)
+        for columns in (routingLocations, routingActivities):
+            (np.concatenate(columns) if len(lengths) > 0 else np.zeros(0)).astype(np.uint8).tofile(f)
+    os.replace(tmpPath, filepath)
+
+
+class TraceStore:
+    """
+    A read-only view of a file written by `writeTraceStore()`. The file is mapped into memory,
+    so opening it does not read the records, and processes opening the same file share the pages
+    through the page cache.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.data = np.memmap(filepath, dtype=np.uint8, mode='r')
+
+        headerSize = kTraceStoreHeaderDtype.itemsize
+        if len(self.data) < headerSize:
+            raise Exception("ERROR: '%s' is not a trace store" % filepath)
+        header = self.data[:headerSize].view(kTraceStoreHeaderDtype)[0]
+        if header['magic'] != kTraceStoreMagic:
+            raise Exception("ERROR: '%s' is not a trace store" % filepath)
+
+        self.numRoutings = int(header['numRoutings'])
+        self.numActivityNan = int(header['numActivityNan'])
+        self.numLocationNan = int(header['numLocationNan'])
+        numRecords = int(header['numRecords'])
+
+        offsetsStart = headerSize
+        timesStart = offsetsStart + (self.numRoutings + 1) * 8
+        locationsStart = timesStart + numRecords * 2
+        activitiesStart = locationsStart + numRecords
+        if len(self.data) != activitiesStart + numRecords:
+            raise Exception("ERROR: The trace store '%s' is truncated" % filepath)
+
+        self.offsets = self.data[offsetsStart:timesStart].view('<u8')
+        self.times = self.data[timesStart:locationsStart].view('<u2')
+        self.locations = self.data[locationsStart:activitiesStart]
+        self.activities = self.data[activitiesStart:]
+
+    def getRouting(self, routingIdx):
+        """
+        Returns:
+          (times, stateLocations, stateActivities) as three read-only arrays backed by the file
+        """
+        if routingIdx < 0 or routingIdx >= self.numRoutings:
+            raise Exception("ERROR: The trace store has no routing %d" % routingIdx)
+        start, end = int(self.offsets[routingIdx]), int(self.offsets[routingIdx + 1])
+        return (self.times[start:end], self.locations[start:end], self.activities[start:end])
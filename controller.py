@@ -4,12 +4,18 @@ import numpy as np
 from constant import *
 from human_modeling_utils import utils
 from human_modeling_utils.chronometer import Chronometer
+from human_modeling_utils.simulation_log import SimulationLog
 
 
 class Controller:
 
     def __init__(self, agent, environment, behavior,
-            simulationWeek=10, negativeReward=-10, verbose=True):
+            simulationWeek=10, negativeReward=-10, verbose=True, resultSink=None):
+        """
+        If `resultSink` is provided (see `human_modeling_utils.result_sink`), the step records are
+        flushed to the sink chunk by chunk while the simulation proceeds, so the memory usage
+        does not grow with `simulationWeek`.
+        """
         self.rewardCriteria = {
                 ANSWER_NOTIFICATION_ACCEPT: 1,
                 ANSWER_NOTIFICATION_IGNORE: 0,
@@ -20,7 +26,7 @@ class Controller:
 
         # set chronometer which automatically skips 10pm to 8am because it's usually when people
         # sleep
-        self.chronometer = Chronometer(skipFunc=(lambda hour, _m, _d: hour < 8 or hour >= 22))
+        self.chronometer = Chronometer(skipIntervals=[(22 * 60, 8 * 60)])
 
         self.stepWidthMinutes = 10
         self.simulationWeek = simulationWeek
@@ -33,15 +39,23 @@ class Controller:
         self.environment = environment
         self.behavior = behavior
 
-        self.simulationResults = []
+        self.resultSink = resultSink
+        self.simulationResults = SimulationLog(sink=resultSink)
 
         self.agent.setNegativeReward(negativeReward)
 
     def execute(self):
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
-                self.stepWidthMinutes)
-
-        while numDaysPassed < self.simulationWeek * 7:
+        """
+        Returns:
+          A `SimulationLog` of all the decision points, or the reader of the result sink if the
+          controller is created with a sink.
+        """
+        # all the decision time points are known in advance, so materialize them at once
+        timeline = self.chronometer.compileTimeline(
+                self.stepWidthMinutes, self.simulationWeek * 7)
+
+        for numDaysPassed, currentHour, currentMinute, currentDay in zip(
+                *[a.tolist() for a in timeline]):
             if self.verbose:
                 print("Day %d %d:%02d" % (numDaysPassed, currentHour, currentMinute))
 
@@ -82,25 +96,14 @@ class Controller:
             self.agent.feedReward(reward)
 
             # log this session
-            self.simulationResults.append({
-                    'context': {
-                        'numDaysPassed': numDaysPassed,
-                        'hour': currentHour,
-                        'minute': currentMinute,
-                        'day': currentDay,
-                        'location': stateLocation,
-                        'activity': stateActivity,
-                        'lastNotification': lastNotificationTime,
-                    },
-                    'probOfAnswering': probAnsweringNotification,
-                    'probOfIgnoring': probIgnoringNotification,
-                    'probOfDismissing': probDismissingNotification,
-                    'decision': sendNotification,
-                    'reward': reward,
-            })
-
-            # get the next decision time point
-            numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
-                    self.stepWidthMinutes)
+            self.simulationResults.append(
+                    numDaysPassed, currentHour, currentMinute, currentDay,
+                    stateLocation, stateActivity, lastNotificationTime,
+                    probAnsweringNotification, probIgnoringNotification, probDismissingNotification,
+                    sendNotification, reward,
+            )
 
+        if self.resultSink is not None:
+            self.simulationResults.flush()
+            return self.resultSink.getReader()
         return self.simulationResults
@@ -12,3 +12,7 @@ class AlwaysSayOKUser(BaseEnvironment):
                 0.0,  # probIgnoringNotification
                 0.0,  # probDismissingNotification
         )
+
+    def getResponseDistributionBatch(self, hours, minutes, days,
+            stateLocations, stateActivities, lastNotificationTimes, randomStates=None):
+        return numpy.tile([1.0, 0.0, 0.0], (len(hours), 1))
@@ -1,5 +1,28 @@
+import numpy as np
+
+from human_modeling_utils import utils
+
+
 class BaseEnvironment:
-    
+
+    # the random generator of the environment (see `setRandomState()`). `None` stands for the
+    # global `np.random` generator.
+    randomState = None
+
+    def setRandomState(self, randomState):
+        """
+        Let the environment draw its random numbers from `randomState`, a
+        `np.random.RandomState`, instead of the global `np.random` generator. `None` restores the
+        global generator.
+        """
+        self.randomState = randomState
+
+    def _getRandom(self):
+        """
+        Returns either the random state of the environment or the `np.random` module.
+        """
+        return self.randomState if self.randomState is not None else np.random
+
     def getResponseDistribution(self, hour, minute, day,
             stateLocation, stateActivity, lastNotificationTime):
         """
@@ -16,3 +39,25 @@ class BaseEnvironment:
           `probDismissingNotification` is expected to be 1.0.
         """
         pass
+
+    def getResponseDistributionBatch(self, hours, minutes, days,
+            stateLocations, stateActivities, lastNotificationTimes, randomStates=None):
+        """
+        The array-shaped counterpart of `getResponseDistribution()`. Each argument is a 1-D
+        array with one element per simulation run. If `randomStates` is given, it holds one
+        `np.random.RandomState` per run, and the random numbers of run `i` are drawn from
+        `randomStates[i]`. The default implementation queries the runs one by one, which
+        assumes that a query does not change the environment.
+
+        Returns:
+          A (numRuns, 3) float array. The columns are `probAnsweringNotification`,
+          `probIgnoringNotification`, and `probDismissingNotification`.
+        """
+        contexts = list(zip(np.asarray(hours).tolist(), np.asarray(minutes).tolist(),
+                np.asarray(days).tolist(), np.asarray(stateLocations).tolist(),
+                np.asarray(stateActivities).tolist(), np.asarray(lastNotificationTimes).tolist()))
+        if randomStates is None:
+            randomStates = [None] * len(contexts)
+        return np.array([utils.callWithObjectRandomState(
+                self, randomState, self.getResponseDistribution, *c)
+                for randomState, c in zip(randomStates, contexts)], dtype=float).reshape(-1, 3)
@@ -1,8 +1,9 @@
 import random
-import numpy
+import numpy as np
 
 from constant import *
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
 from .base_environment import BaseEnvironment
 
 class LessStubbornUser(BaseEnvironment):
@@ -13,25 +14,38 @@ class LessStubbornUser(BaseEnvironment):
     """
 
     def __init__(self, deviationProb=0.1):
-        self.behavior = {}
-        for sTime in utils.allTimeStates():
-            for sDay in utils.allDayStates():
-                for sLocation in utils.allLocationStates():
-                    for sActivity in utils.allActivityStates():
-                        for sNotification in utils.allLastNotificationStates():
-                            state = (sTime, sDay, sLocation, sActivity, sNotification)
-                            self.behavior[state] = (random.random() < 0.5)
+        # self.behavior is indexed by the dense state index (see `state_codec`)
+        self.behavior = np.array([random.random() < 0.5 for _ in range(state_codec.NUM_STATES)])
         self.probTake = 1. - deviationProb
         self.probNotTake = deviationProb
 
+    def __setstate__(self, state):
+        # objects pickled before the dense state index was introduced keep the behavior in a
+        # dictionary keyed by the state tuples
+        self.__dict__.update(state)
+        if isinstance(self.behavior, dict):
+            self.behavior = state_codec.encodeStateTable(self.behavior)
+
     def getResponseDistribution(self, hour, minute, day,
             stateLocation, stateActivity, lastNotificationTime):
         stateTime = utils.getTimeState(hour, minute)
         stateDay = utils.getDayState(day)
         stateNotification = utils.getLastNotificationState(lastNotificationTime)
-        state = (stateTime, stateDay, stateLocation, stateActivity, stateNotification)
+        state = state_codec.encodeState(
+                stateTime, stateDay, stateLocation, stateActivity, stateNotification)
 
         probAnswerNotification = (self.probTake if self.behavior[state] else self.probNotTake)
         probDismissNotification = 1.0 - probAnswerNotification
         probIgnoreNotification = 0.0
         return (probAnswerNotification, probIgnoreNotification, probDismissNotification)
+
+    def getResponseDistributionBatch(self, hours, minutes, days,
+            stateLocations, stateActivities, lastNotificationTimes, randomStates=None):
+        states = state_codec.encodeStates(utils.getTimeStates(np.asarray(hours)),
+                utils.getDayStates(np.asarray(days)), stateLocations, stateActivities,
+                utils.getLastNotificationStates(np.asarray(lastNotificationTimes)))
+        takes = self.behavior[states]
+
+        probAnswerNotifications = np.where(takes, self.probTake, self.probNotTake)
+        return np.stack([probAnswerNotifications, np.zeros(len(states)),
+                1.0 - probAnswerNotifications], axis=1)
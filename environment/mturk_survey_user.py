@@ -5,7 +5,35 @@ from collections import Counter
 
 from constant import *
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
+from human_modeling_utils import binary_cache
 from .base_environment import BaseEnvironment
+from .response_table import ResponseTable, sampleResponse
+from .response_table import kResponseAnswer, kResponseIgnore, kResponseDismiss
+
+
+# the response distribution (answer, ignore, dismiss) of a record, keyed by its response
+kResponseDistributions = {
+        ANSWER_NOTIFICATION_ACCEPT: (1.0, 0.0, 0.0),
+        ANSWER_NOTIFICATION_IGNORE: (0.0, 1.0, 0.0),
+        ANSWER_NOTIFICATION_DISMISS: (0.0, 0.0, 1.0),
+}
+
+# the index of a response in a distribution, keyed by the response
+kResponseIndices = {
+        ANSWER_NOTIFICATION_ACCEPT: kResponseAnswer,
+        ANSWER_NOTIFICATION_IGNORE: kResponseIgnore,
+        ANSWER_NOTIFICATION_DISMISS: kResponseDismiss,
+}
+
+# the response distribution of a state without any record
+kNoDataDistribution = (0.1, 0.8, 0.1)
+
+kSurveyFileCacheTag = 'mturk-survey-results-v1'
+
+# the keys of a record, which are also the columns of a parsed file
+kRecordKeys = ['rawHour', 'rawMinute', 'rawWorkerID', 'rawWorkingTimeSec', 'stateDay',
+        'stateLocation', 'stateActivity', 'stateNotification', 'answerNotification']
 
 
 class MTurkSurveyUser(BaseEnvironment):
@@ -14,36 +42,67 @@ class MTurkSurveyUser(BaseEnvironment):
     determined based on the following strategy: Given the location, activity, weekday or weekend,
     and last notification response time, we filter out the relevant records. We assign a weight
     for each record based on the inverse of the time delta.
+
+    With `useResponseTable=True`, the probability of each response is tabulated per state and
+    minute of the day (see `ResponseTable`), and a response is drawn from the table instead of
+    weighting the records at every call. The responses follow the same distribution, but the
+    random numbers are used differently, hence the results under a seed are not the same as
+    without the table.
+
+    The parsed CSV files are cached as column arrays in binary files next to them (see
+    `binary_cache`), so that only the first construction parses the CSV files. The records are
+    kept as the column arrays, and `self.records` is a view of them as dictionaries (see
+    `SurveyRecords`).
+
+    There are two response modes. `RESPONSE_MODE_SAMPLE` (default) picks one record and returns
+    its response as a degenerate distribution. `RESPONSE_MODE_EXPECTED` returns the
+    kernel-weighted marginal distribution over the records instead, which does not draw any
+    random number and gives lower-variance rewards.
     """
 
-    def __init__(self, filePaths, filterFunc=None, dismissWarningMsg=False):
-        # self.behavior is a dictionary of lists. The key is the state excluding time. The values
-        # are the relavent records
-        self.behavior = {}
-        for sDay in utils.allDayStates():
-            for sLocation in utils.allLocationStates():
-                for sActivity in utils.allActivityStates():
-                    for sNotification in utils.allLastNotificationStates():
-                        state = (sDay, sLocation, sActivity, sNotification)
-                        self.behavior[state] = []
-
-        self.records = []
-        for filePath in filePaths:
-            self.records.extend(self._parseFile(filePath))
-
-        # apply the filter
+    RESPONSE_MODE_SAMPLE = 0
+    RESPONSE_MODE_EXPECTED = 1
+
+    def __init__(self, filePaths, filterFunc=None, dismissWarningMsg=False,
+            useResponseTable=False, responseTableCachePath=None, responseMode=None,
+            useCache=True):
+        """
+        Params:
+          useResponseTable: Whether to precompute the response distributions
+          responseTableCachePath: The file to cache the response table. It implies
+                                  `useResponseTable=True`.
+          responseMode: `RESPONSE_MODE_SAMPLE` (default) or `RESPONSE_MODE_EXPECTED`
+          useCache: Whether to load the parsed CSV files from the binary cache
+        """
+        self.responseMode = (responseMode if responseMode is not None
+                else MTurkSurveyUser.RESPONSE_MODE_SAMPLE)
+
+        # the records are kept as column arrays (see `kRecordKeys`). The cached columns of a
+        # single file are memory-mapped as they are
+        fileColumns = [self._parseFile(filePath, useCache) for filePath in filePaths]
+        if len(fileColumns) == 1:
+            columns = fileColumns[0]
+        else:
+            columns = {k: np.concatenate([c[k] for c in fileColumns]) for k in kRecordKeys}
+
+        # apply the filter. The filter function takes a record dictionary, hence only this step
+        # visits the records one by one
         if filterFunc:
-            self.records = list(filter(filterFunc, self.records))
+            mask = np.array([bool(filterFunc(r)) for r in SurveyRecords(columns)], dtype=bool)
+            columns = {k: columns[k][mask] for k in kRecordKeys}
 
-        # arrange the records to the correct category in self.behavior
-        for r in self.records:
-            state = (r['stateDay'], r['stateLocation'], r['stateActivity'], r['stateNotification'])
-            self.behavior[state].append(r)
+        self.records = SurveyRecords(columns)
+        self._buildBucketArrays(columns)
+
+        self.responseTable = None
+        if useResponseTable or responseTableCachePath is not None:
+            self.responseTable = ResponseTable(self.bucketMinutes, self.bucketResponses,
+                    kNoDataDistribution, responseTableCachePath)
 
         self.numNoDataStates = 0
-        for state in self.behavior:
-            if len(self.behavior[state]) == 0:
-                sDay, sLocation, sActivity, sNotification = state
+        for bucket, recordMinutes in enumerate(self.bucketMinutes):
+            if len(recordMinutes) == 0:
+                sDay, sLocation, sActivity, sNotification = state_codec.decodeBucket(bucket)
                 if not dismissWarningMsg:
                     sys.stderr.write("No record for day=%d, location=%d, activity=%d, notification=%d\n"
                             % (sDay, sLocation, sActivity, sNotification))
@@ -55,36 +114,146 @@ class MTurkSurveyUser(BaseEnvironment):
                 sys.stderr.write("WARNING: No records for %d states. The behavior will be random.\n"
                         % self.numNoDataStates)
 
+    def __setstate__(self, state):
+        # objects pickled before the bucket arrays were introduced have to build them from the
+        # record dictionaries
+        self.__dict__.update(state)
+        if 'bucketResponses' not in state:
+            self._buildBucketArrays({k: np.array([r[k] for r in self.records], dtype=int)
+                    for k in kRecordKeys if k != 'rawWorkerID'})
+        for name in ['behavior', 'bucketDeltaBuffers', 'bucketProbBuffers']:
+            self.__dict__.pop(name, None)
+        if 'responseTable' not in state:
+            self.responseTable = None
+        if 'responseMode' not in state:
+            self.responseMode = MTurkSurveyUser.RESPONSE_MODE_SAMPLE
+
     def getResponseDistribution(self, hour, minute, day,
             stateLocation, stateActivity, lastNotificationTime):
+        return self._getResponseDistribution(self.responseMode, hour, minute, day,
+                stateLocation, stateActivity, lastNotificationTime)
+
+    def _getResponseDistribution(self, responseMode, hour, minute, day,
+            stateLocation, stateActivity, lastNotificationTime):
+        """
+        `getResponseDistribution()` in the given response mode. It does not change any state of
+        the object, so it can be called concurrently.
+        """
         stateDay = utils.getDayState(day)
         stateNotification = utils.getLastNotificationState(lastNotificationTime)
-        state = (stateDay, stateLocation, stateActivity, stateNotification)
+        bucket = state_codec.encodeBucket(stateDay, stateLocation, stateActivity, stateNotification)
 
-        records = self.behavior[state]
+        recordMinutes = self.bucketMinutes[bucket]
         
-        if len(records) == 0:
-            probAnswerNotification = 0.1
-            probIgnoreNotification = 0.8
-            probDismissNotification = 0.1
-        else:
-            timeDiffs = [abs(utils.getDeltaMinutes(0, hour, minute, 0, r['rawHour'], r['rawMinute']))
-                    for r in records]
-            weights = np.array([(1. / (t + 5.)) ** 1 for t in timeDiffs])
-            weightSum = np.sum(weights)
-            probs = weights / weightSum
+        if len(recordMinutes) == 0:
+            return kNoDataDistribution
+
+        if self.responseTable is not None:
+            distribution = self.responseTable.getDistribution(bucket, hour * 60 + minute)
+            if responseMode == MTurkSurveyUser.RESPONSE_MODE_EXPECTED:
+                return distribution
+            return sampleResponse(distribution, self._getRandom().random_sample())
 
-            chosenRecord = np.random.choice(a=records, p=probs)
+        # weight each record by the inverse of the time delta. The arrays are allocated per
+        # call, so that concurrent calls do not share them, and the arithmetic follows the
+        # previous list-based implementation
+        probs = 1. / (np.abs(hour * 60 + minute - recordMinutes) + 5.)
+        probs /= np.sum(probs)
 
-            probAnswerNotification, probIgnoreNotification, probDismissNotification = 0.0, 0.0, 0.0
-            if chosenRecord['answerNotification'] == ANSWER_NOTIFICATION_ACCEPT:
-                probAnswerNotification = 1.0
-            elif chosenRecord['answerNotification'] == ANSWER_NOTIFICATION_IGNORE:
-                probIgnoreNotification = 1.0
-            elif chosenRecord['answerNotification'] == ANSWER_NOTIFICATION_DISMISS:
-                probDismissNotification = 1.0
+        if responseMode == MTurkSurveyUser.RESPONSE_MODE_EXPECTED:
+            distribution = np.bincount(self.bucketResponses[bucket], weights=probs, minlength=3)
+            return tuple(distribution.tolist())
 
-        return (probAnswerNotification, probIgnoreNotification, probDismissNotification)
+        # draw a record the same way as `np.random.choice(a=records, p=probs)` does, so that the
+        # random number stream is unchanged
+        cdf = np.cumsum(probs)
+        cdf /= cdf[-1]
+        recordIdx = cdf.searchsorted(self._getRandom().random_sample(), side='right')
+
+        return kResponseDistributions[self.bucketOutcomes[bucket][recordIdx]]
+
+    def getResponseDistributionBatch(self, hours, minutes, days,
+            stateLocations, stateActivities, lastNotificationTimes, randomStates=None):
+        """
+        The vectorized version of `getResponseDistribution()`. The runs which fall in the same
+        state bucket are weighted and sampled together. One uniform random number is drawn per
+        run which has records, in the order of the runs, and the arithmetic follows
+        `getResponseDistribution()`, so a loop over the runs gives the same results.
+        """
+        minutesOfDay = np.asarray(hours) * 60 + np.asarray(minutes)
+        buckets = state_codec.encodeBucket(utils.getDayStates(np.asarray(days)),
+                np.asarray(stateLocations), np.asarray(stateActivities),
+                utils.getLastNotificationStates(np.asarray(lastNotificationTimes)))
+
+        distributions = np.empty((len(buckets), 3))
+        distributions[:] = kNoDataDistribution
+        bucketSizes = np.array([len(m) for m in self.bucketMinutes])
+        runIdxs = np.flatnonzero(bucketSizes[buckets] > 0)
+        isSampling = self.responseMode == MTurkSurveyUser.RESPONSE_MODE_SAMPLE
+        if isSampling:
+            uniformSamples = np.zeros(len(buckets))
+            uniformSamples[runIdxs] = utils.drawUniformSamples(self._getRandom(), len(runIdxs),
+                    None if randomStates is None else [randomStates[i] for i in runIdxs.tolist()])
+
+        for bucket in np.unique(buckets[runIdxs]).tolist():
+            idxs = runIdxs[buckets[runIdxs] == bucket]
+            if self.responseTable is not None:
+                bucketDistributions = self.responseTable.getDistributions(bucket, minutesOfDay[idxs])
+                if isSampling:
+                    bucketDistributions = np.eye(3)[utils.drawIndices(
+                            bucketDistributions, uniformSamples[idxs])]
+                distributions[idxs] = bucketDistributions
+                continue
+
+            # probs[i, r] is the weight of record r for run idxs[i]
+            recordMinutes = self.bucketMinutes[bucket]
+            probs = 1. / (np.abs(minutesOfDay[idxs, np.newaxis] - recordMinutes) + 5.)
+            probs /= np.sum(probs, axis=1, keepdims=True)
+            responses = self.bucketResponses[bucket]
+            if isSampling:
+                recordIdxs = utils.drawIndices(probs, uniformSamples[idxs])
+                distributions[idxs] = np.eye(3)[responses[recordIdxs]]
+            else:
+                # accumulate the weights in the order of the records like `np.bincount()`
+                for response in range(3):
+                    distributions[idxs, response] = np.cumsum(
+                            np.where(responses == response, probs, 0.), axis=1)[:, -1]
+        return distributions
+
+    def _buildBucketArrays(self, columns):
+        """
+        Group the records by the state excluding time, i.e., the state bucket (see
+        `state_codec`), and build the per-bucket arrays of the record minute of the day and the
+        response (i.e., `answerNotification`), in the order of the records.
+        """
+        buckets = state_codec.encodeBucket(np.asarray(columns['stateDay'], dtype=int),
+                np.asarray(columns['stateLocation'], dtype=int),
+                np.asarray(columns['stateActivity'], dtype=int),
+                np.asarray(columns['stateNotification'], dtype=int))
+        order = np.argsort(buckets, kind='stable')
+        splits = np.searchsorted(buckets[order], np.arange(1, state_codec.NUM_STATE_BUCKETS))
+
+        minutes = (np.asarray(columns['rawHour'], dtype=int) * 60
+                + np.asarray(columns['rawMinute'], dtype=int))
+        outcomes = np.asarray(columns['answerNotification'], dtype=int)
+        responseIndices = np.zeros(max(kResponseIndices) + 1, dtype=int)
+        responseIndices[list(kResponseIndices)] = list(kResponseIndices.values())
+
+        self.bucketMinutes = np.split(minutes[order], splits)
+        self.bucketOutcomes = np.split(outcomes[order], splits)
+        self.bucketResponses = np.split(responseIndices[outcomes[order]], splits)
+
+    def getExpectedReward(self, hour, minute, day, stateLocation, stateActivity,
+            lastNotificationTime, negativeReward):
+        """
+        Returns the expected reward of sending a notification in the given context, with the
+        reward 1 for answering, 0 for ignoring, and `negativeReward` for dismissing. The
+        distribution is the marginal one regardless of the response mode.
+        """
+        probAnswer, _, probDismiss = self._getResponseDistribution(
+                MTurkSurveyUser.RESPONSE_MODE_EXPECTED, hour, minute, day,
+                stateLocation, stateActivity, lastNotificationTime)
+        return probAnswer * 1. + probDismiss * negativeReward
 
     def getNumTotalRecords(self):
         return len(self.records)
@@ -136,24 +305,38 @@ class MTurkSurveyUser(BaseEnvironment):
         workingDuration = [r['rawWorkingTimeSec'] for r in self.records]
         return np.mean(workingDuration), np.std(workingDuration)
 
-    def _parseFile(self, filename):
+    def _parseFile(self, filename, useCache=True):
         """
-        This function receives a csv file obtained from mTurk and convert it to a list of
-        dictionary objects. Please see `_parseLine()` for the format of the dictionary object.
+        This function receives a csv file obtained from mTurk and returns a dictionary which
+        maps each key of `kRecordKeys` to an array of the valid records (see `_parseCsvRow()`).
+        The arrays are memory-mapped from the binary cache if `useCache` is true.
+        """
+        if useCache:
+            return binary_cache.loadWithCache(
+                    filename, self._parseFileColumns, kSurveyFileCacheTag, mmap=True)
+        return self._parseFileColumns(filename)
+
+    def _parseFileColumns(self, filename):
+        """
+        Parse a csv file into a dictionary which maps each key of `kRecordKeys` to an array of
+        the valid records.
         """
         with open(filename) as f:
             reader = csv.DictReader(f)
             records = [self._parseCsvRow(row) for row in reader]
-        
-        return [r for r in records if r is not None]
+        records = [r for r in records if r is not None]
+
+        columns = {k: np.array([r[k] for r in records], dtype=int) for k in kRecordKeys
+                if k != 'rawWorkerID'}
+        columns['rawWorkerID'] = np.array([r['rawWorkerID'] for r in records], dtype=str)
+        return columns
 
     def _parseCsvRow(self, row):
         """
         This function receives a line from the input file and convert it to a dictionary with
         the following keys:
 
-            parsedRow, rawHour, rawMinute,
-            rawWorkerID, rawWorkingTimeSec,
+            rawHour, rawMinute, rawWorkerID, rawWorkingTimeSec,
             stateDay, stateLocation, stateActivity, stateNotification,
             answerNotification
 
@@ -206,7 +389,6 @@ class MTurkSurveyUser(BaseEnvironment):
         }
 
         return {
-            'parsedRow': row,
             'rawHour': hour,
             'rawMinute': minute,
             'rawWorkerID': workerID,
@@ -217,3 +399,25 @@ class MTurkSurveyUser(BaseEnvironment):
             'stateNotification': utils.getLastNotificationState(lastSeenNotificationTime),
             'answerNotification': answerNotification,
         }
+
+
+class SurveyRecords:
+    """
+    A read-only view of the column arrays of the survey records as a list of dictionaries (see
+    `MTurkSurveyUser._parseCsvRow()` for the format). A dictionary is created only when a record
+    is accessed.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[kRecordKeys[0]])
+
+    def __getitem__(self, idx):
+        return {k: self.columns[k][idx].item() for k in kRecordKeys}
+
+    def __iter__(self):
+        columnValues = [self.columns[k].tolist() for k in kRecordKeys]
+        for values in zip(*columnValues):
+            yield dict(zip(kRecordKeys, values))
@@ -0,0 +1,135 @@
+import os
+import hashlib
+import numpy as np
+
+from human_modeling_utils import state_codec
+from human_modeling_utils import utils
+
+
+kNumMinutesPerDay = 60 * 24
+
+# the order of the responses in a distribution
+kResponseAnswer = 0
+kResponseIgnore = 1
+kResponseDismiss = 2
+
+# the degenerate distribution of each response
+kSampledResponses = [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)]
+
+
+class ResponseTable:
+    """
+    `ResponseTable` precomputes the response distribution of the survey-driven environments.
+    Given a state bucket (see `state_codec`), the environments weight each record of the bucket
+    by the inverse of the time delta, `1 / (|delta minutes| + 5)`, and pick one record. Since the
+    weights only depend on the bucket and the minute of the day, the probability of each
+    response, i.e., the kernel-weighted marginal over the records, can be tabulated in a
+    `(NUM_STATE_BUCKETS, 1440, 3)` array. The last axis is (answer, ignore, dismiss).
+
+    The table is filled lazily, one bucket at a time. If `cachePath` is given, the whole table is
+    computed at once and stored in that file, and later tables built from the same records load
+    it instead (the records are identified by a fingerprint).
+    """
+
+    def __init__(self, bucketMinutes, bucketResponses, emptyDistribution, cachePath=None):
+        """
+        Params:
+          bucketMinutes: A list of `NUM_STATE_BUCKETS` int arrays. Each holds the minute of the
+                         day of the records in the bucket.
+          bucketResponses: A list of `NUM_STATE_BUCKETS` int arrays. Each holds the response of
+                           the records in the bucket, which is one of `kResponseAnswer`,
+                           `kResponseIgnore`, or `kResponseDismiss`.
+          emptyDistribution: The distribution of a bucket without records
+          cachePath: The path of the `.npz` file to store the table
+        """
+        self.bucketMinutes = bucketMinutes
+        self.bucketResponses = bucketResponses
+        self.emptyDistribution = emptyDistribution
+        self.fingerprint = self._computeFingerprint()
+
+        self.table = np.zeros((state_codec.NUM_STATE_BUCKETS, kNumMinutesPerDay, 3))
+        self.isBucketReady = np.zeros(state_codec.NUM_STATE_BUCKETS, dtype=bool)
+
+        if cachePath is not None:
+            if not self._loadFile(cachePath):
+                self.computeAll()
+                self.saveFile(cachePath)
+
+    def getDistribution(self, bucket, minuteOfDay):
+        """
+        Returns:
+          (probAnswer, probIgnore, probDismiss)
+        """
+        if not self.isBucketReady[bucket]:
+            self._computeBucket(bucket)
+        return tuple(self.table[bucket, minuteOfDay].tolist())
+
+    def getDistributions(self, bucket, minutesOfDay):
+        """
+        The vectorized version of `getDistribution()` for many minutes of the day of a bucket.
+
+        Returns:
+          A (len(minutesOfDay), 3) float array
+        """
+        if not self.isBucketReady[bucket]:
+            self._computeBucket(bucket)
+        return self.table[bucket, minutesOfDay]
+
+    def computeAll(self):
+        for bucket in range(state_codec.NUM_STATE_BUCKETS):
+            if not self.isBucketReady[bucket]:
+                self._computeBucket(bucket)
+
+    def saveFile(self, filepath):
+        self.computeAll()
+        tmpPath = filepath + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            np.savez(f, fingerprint=np.array(self.fingerprint), table=self.table)
+        os.replace(tmpPath, filepath)
+
+    def _loadFile(self, filepath):
+        """
+        Returns:
+          Whether the table is loaded. A file built from other records is ignored.
+        """
+        if not os.path.exists(filepath):
+            return False
+        with np.load(filepath, allow_pickle=False) as data:
+            if str(data['fingerprint']) != self.fingerprint:
+                return False
+            if data['table'].shape != self.table.shape:
+                return False
+            self.table = data['table']
+        self.isBucketReady[:] = True
+        return True
+
+    def _computeBucket(self, bucket):
+        minutes, responses = self.bucketMinutes[bucket], self.bucketResponses[bucket]
+        if len(minutes) == 0:
+            self.table[bucket] = self.emptyDistribution
+        else:
+            # weights[m, r] is the weight of record r at minute m
+            deltas = np.abs(np.arange(kNumMinutesPerDay)[:, np.newaxis] - minutes[np.newaxis, :])
+            weights = 1. / (deltas + 5.)
+            weights /= np.sum(weights, axis=1, keepdims=True)
+            responseMat = np.zeros((len(responses), 3))
+            responseMat[np.arange(len(responses)), responses] = 1.
+            self.table[bucket] = weights @ responseMat
+        self.isBucketReady[bucket] = True
+
+    def _computeFingerprint(self):
+        digest = hashlib.sha1()
+        digest.update(np.asarray(self.emptyDistribution, dtype=float).tobytes())
+        for minutes, responses in zip(self.bucketMinutes, self.bucketResponses):
+            digest.update(np.array([len(minutes)], dtype=np.int64).tobytes())
+            digest.update(np.asarray(minutes, dtype=np.int64).tobytes())
+            digest.update(np.asarray(responses, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+
+def sampleResponse(distribution, uniformSample=None):
+    """
+    Draw a response from `distribution` with one uniform random number (see `utils.drawIndex()`),
+    and return the degenerate distribution of the drawn response.
+    """
+    return kSampledResponses[utils.drawIndex(distribution, uniformSample)]
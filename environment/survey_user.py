@@ -2,7 +2,10 @@ import numpy
 
 from constant import *
 from human_modeling_utils import utils
+from human_modeling_utils import state_codec
 from .base_environment import BaseEnvironment
+from .response_table import ResponseTable, sampleResponse
+from .response_table import kResponseAnswer, kResponseDismiss
 
 
 class SurveyUser(BaseEnvironment):
@@ -11,41 +14,67 @@ class SurveyUser(BaseEnvironment):
     user's mental status is determined based on the following strategy: Given the location,
     activity, weekday or weekend, and last notification response time, we filter out the relevant
     records. We assign a weight for each record based on the inverse of the time delta.
+
+    With `useResponseTable=True`, the probability of answering is tabulated per state and
+    minute of the day (see `ResponseTable`). See `MTurkSurveyUser` for the implications.
     """
 
-    def __init__(self, filePath):
+    def __init__(self, filePath, useResponseTable=False, responseTableCachePath=None):
+        """
+        Params:
+          useResponseTable: Whether to precompute the response distributions
+          responseTableCachePath: The file to cache the response table. It implies
+                                  `useResponseTable=True`.
+        """
         with open(filePath) as f:
             lines = f.readlines()
 
         records = [self.parse(l) for l in lines]
         records = [r for r in records if r is not None]
 
-        # self.behavior is a dictionary of lists. The key is the state excluding time. The values
-        # are the relavent records
-        self.behavior = {}
-        for sDay in utils.allDayStates():
-            for sLocation in utils.allLocationStates():
-                for sActivity in utils.allActivityStates():
-                    for sNotification in utils.allLastNotificationStates():
-                        state = (sDay, sLocation, sActivity, sNotification)
-                        self.behavior[state] = []
+        # self.behavior is a list of lists. It is indexed by the state excluding time, i.e., the
+        # state bucket (see `state_codec`). The values are the relavent records
+        self.behavior = [[] for _ in range(state_codec.NUM_STATE_BUCKETS)]
 
         # arrange the records to the correct category in self.behavior
         for r in records:
-            state = (r['stateDay'], r['stateLocation'], r['stateActivity'], r['stateNotification'])
-            self.behavior[state].append(r)
+            bucket = state_codec.encodeBucket(r['stateDay'], r['stateLocation'],
+                    r['stateActivity'], r['stateNotification'])
+            self.behavior[bucket].append(r)
+
+        self.responseTable = None
+        if useResponseTable or responseTableCachePath is not None:
+            bucketMinutes = [numpy.array([r['rawHour'] * 60 + r['rawMinute'] for r in records],
+                    dtype=int) for records in self.behavior]
+            bucketResponses = [numpy.array([kResponseAnswer if r['answerNotification']
+                    else kResponseDismiss for r in records], dtype=int)
+                    for records in self.behavior]
+            self.responseTable = ResponseTable(bucketMinutes, bucketResponses, (0.1, 0.0, 0.9),
+                    responseTableCachePath)
+
+    def __setstate__(self, state):
+        # objects pickled before the state buckets were introduced keep the records in a
+        # dictionary keyed by the bucket tuples, and the ones pickled before the response table
+        # was introduced do not have it
+        state.setdefault('responseTable', None)
+        self.__dict__.update(state)
+        if isinstance(self.behavior, dict):
+            self.behavior = [self.behavior[bucket] for bucket in state_codec.allBuckets()]
 
     def getResponseDistribution(self, hour, minute, day,
             stateLocation, stateActivity, lastNotificationTime):
 
         stateDay = utils.getDayState(day)
         stateNotification = utils.getLastNotificationState(lastNotificationTime)
-        state = (stateDay, stateLocation, stateActivity, stateNotification)
+        bucket = state_codec.encodeBucket(stateDay, stateLocation, stateActivity, stateNotification)
 
-        records = self.behavior[state]
+        records = self.behavior[bucket]
         
         if len(records) == 0:
             probAnswerNotification = 0.1
+        elif self.responseTable is not None:
+            return sampleResponse(self.responseTable.getDistribution(bucket, hour * 60 + minute),
+                    self._getRandom().random_sample())
         else:
             timeDiffs = [abs(utils.getDeltaMinutes(0, hour, minute, 0, r['rawHour'], r['rawMinute']))
                     for r in records]
@@ -53,7 +82,7 @@ class SurveyUser(BaseEnvironment):
             weightSum = numpy.sum(weights)
             probs = weights / weightSum
 
-            chosenRecord = numpy.random.choice(a=records, p=probs)
+            chosenRecord = self._getRandom().choice(a=records, p=probs)
             probAnswerNotification = (1.0 if chosenRecord['answerNotification'] else 0.0)
 
         probDismissNotification = 1.0 - probAnswerNotification
@@ -0,0 +1,190 @@
+import itertools
+import random
+import time
+import traceback
+import numpy as np
+import dill
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from controller import Controller
+
+
+kGridKeys = ['agent', 'environment', 'behavior', 'negativeReward', 'simulationWeek', 'seed']
+
+# the default of `Controller`
+kDefaultNegativeReward = -10.
+
+
+def expandGrid(grid):
+    """
+    Expand a declarative experiment grid into a list of run configurations (the cartesian
+    product of all the grid values).
+
+    The grid is a dictionary with the following keys:
+      - agent: A list of agent specs
+      - environment: A list of environment specs
+      - behavior: A list of behavior specs
+      - negativeReward: A list of floats (optional, default [-10.] as `Controller`)
+      - simulationWeek: A list of ints (optional, default [10])
+      - seed: A list of ints (optional, default [0])
+
+    A spec is either a callable which returns the object (e.g., a class), or a tuple of
+    `(callable, kwargs)`. For example:
+
+        grid = {
+            'agent': [QLearningAgent2, (NNAgent, {'negRewardWeight': 5})],
+            'environment': [(MTurkSurveyUser, {
+                'filePaths': [...],
+                'filterFunc': (lambda r: ord(r['rawWorkerID'][-1]) % 3 == 2),
+            })],
+            'behavior': [(ExtraSensoryBehavior, {'sourceFiles': ['behavior/data/2.txt']})],
+            'negativeReward': [-5.],
+            'simulationWeek': [20],
+            'seed': range(50),
+        }
+
+    Returns:
+      A list of dictionaries. Each has the keys in `kGridKeys`, plus `runIdx` and the indices of
+      the chosen specs (`agentIdx`, `environmentIdx`, `behaviorIdx`).
+    """
+    for key in grid:
+        if key not in kGridKeys:
+            raise Exception("Unknown grid key \"%s\"" % key)
+    for key in ['agent', 'environment', 'behavior']:
+        if key not in grid:
+            raise Exception("The grid has to specify \"%s\"" % key)
+
+    values = [
+            list(enumerate(grid['agent'])),
+            list(enumerate(grid['environment'])),
+            list(enumerate(grid['behavior'])),
+            list(grid.get('negativeReward', [kDefaultNegativeReward])),
+            list(grid.get('simulationWeek', [10])),
+            list(grid.get('seed', [0])),
+    ]
+
+    configs = []
+    for runIdx, combination in enumerate(itertools.product(*values)):
+        (agentIdx, agent), (envIdx, environment), (behaviorIdx, behavior), negativeReward, \
+                simulationWeek, seed = combination
+        configs.append({
+                'runIdx': runIdx,
+                'agentIdx': agentIdx,
+                'agent': agent,
+                'environmentIdx': envIdx,
+                'environment': environment,
+                'behaviorIdx': behaviorIdx,
+                'behavior': behavior,
+                'negativeReward': negativeReward,
+                'simulationWeek': simulationWeek,
+                'seed': seed,
+        })
+    return configs
+
+
+def runSweep(grid, numWorkers=None):
+    """
+    Run every configuration of the grid (see `expandGrid()`) with `Controller` in a process
+    pool. This function is a generator which yields the summary of each run as soon as the run
+    finishes, hence the order of the summaries is not deterministic. Use the `runIdx` field to
+    match a summary with its configuration.
+
+    A run which fails does not stop the sweep. Its summary only has the fields of the
+    configuration and `error`, the traceback of the failure.
+
+    The configurations are serialized with `dill`, so the specs can be lambdas or closures.
+
+    Params:
+      grid: The experiment grid
+      numWorkers: The number of worker processes. `None` uses all the cores.
+    """
+    configs = expandGrid(grid)
+    with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+        futureToConfig = {executor.submit(_runConfig, dill.dumps(c)): c for c in configs}
+        for future in as_completed(futureToConfig):
+            try:
+                yield future.result()
+            except Exception:
+                # e.g., the worker died or the configuration could not be serialized
+                summary = _summarizeConfig(futureToConfig[future])
+                summary['error'] = traceback.format_exc()
+                yield summary
+
+
+def summarizeResults(results, simulationWeek):
+    """
+    Condense the `SimulationLog` returned by `Controller.execute()` into a dictionary of
+    statistics.
+    """
+    decisions = results.getColumn('decision')
+    rewards = results.getColumn('reward').astype(float)
+    weekNums = results.getColumn('numDaysPassed') // 7
+    inRange = weekNums < simulationWeek
+    weeklyRewards = np.bincount(weekNums[inRange], weights=rewards[inRange],
+            minlength=simulationWeek)
+
+    return {
+            'numDecisionPoints': len(results),
+            'numNotifications': int(np.sum(decisions)),
+            'numAccepted': int(np.sum(decisions & (rewards > 0))),
+            'numDismissed': int(np.sum(decisions & (rewards < 0))),
+            'totalReward': float(np.sum(weeklyRewards)),
+            'weeklyRewards': weeklyRewards.tolist(),
+            'expectedNumDeliveredNotifications': float(np.sum(results.getColumn('probOfAnswering'))),
+    }
+
+
+def _runConfig(payload):
+    config = dill.loads(payload)
+    startTime = time.time()
+    summary = _summarizeConfig(config)
+
+    try:
+        # seed before the objects are built because some of them draw random numbers in the
+        # constructor (e.g., `StubbornUser`)
+        random.seed(config['seed'])
+        np.random.seed(config['seed'])
+
+        agent = _build(config['agent'])
+        environment = _build(config['environment'])
+        behavior = _build(config['behavior'])
+
+        controller = Controller(agent, environment, behavior,
+                simulationWeek=config['simulationWeek'], negativeReward=config['negativeReward'],
+                verbose=False)
+        results = controller.execute()
+    except Exception:
+        summary['error'] = traceback.format_exc()
+        return summary
+
+    summary.update(summarizeResults(results, config['simulationWeek']))
+    summary['elapsedSec'] = time.time() - startTime
+    return summary
+
+
+def _summarizeConfig(config):
+    return {
+            'runIdx': config['runIdx'],
+            'agent': _getSpecName(config['agent']),
+            'agentIdx': config['agentIdx'],
+            'environment': _getSpecName(config['environment']),
+            'environmentIdx': config['environmentIdx'],
+            'behavior': _getSpecName(config['behavior']),
+            'behaviorIdx': config['behaviorIdx'],
+            'negativeReward': config['negativeReward'],
+            'simulationWeek': config['simulationWeek'],
+            'seed': config['seed'],
+    }
+
+
+def _build(spec):
+    if type(spec) is tuple:
+        func, kwargs = spec
+        return func(**kwargs)
+    return spec()
+
+
+def _getSpecName(spec):
+    func = spec[0] if type(spec) is tuple else spec
+    return getattr(func, '__name__', repr(func))
@@ -0,0 +1,92 @@
+import os
+import shutil
+import numpy as np
+
+
+def loadWithCache(sourcePath, parseFunc, cacheTag, cachePath=None, mmap=False):
+    """
+    Parse a text file into NumPy arrays, and keep the arrays in a binary `.npz` file next to the
+    source so that the next load skips the parsing. The cache is used only if it was built from a
+    source file of the same size and modification time, and with the same `cacheTag`.
+
+    Params:
+      sourcePath: The path of the text file
+      parseFunc: A function which takes the source path and returns a dictionary which maps
+                 names to arrays. The names should not start with an underscore.
+      cacheTag: A string which identifies the parser (e.g., "classifier-data-v1"). Change it
+                whenever the output of `parseFunc` changes.
+      cachePath: The path of the cache file. The default is `<sourcePath>.cache.npz`, or
+                 `<sourcePath>.cache` with `mmap=True`.
+      mmap: Whether to memory-map the cached arrays instead of reading them. The arrays in a
+            `.npz` file cannot be mapped, so the cache is a folder of `.npy` files in this case.
+
+    Returns:
+      A dictionary which maps names to arrays
+    """
+    if mmap:
+        return _loadWithFolderCache(sourcePath, parseFunc, cacheTag,
+                cachePath if cachePath is not None else sourcePath + '.cache')
+
+    if cachePath is None:
+        cachePath = sourcePath + '.cache.npz'
+
+    key = _getSourceKey(sourcePath)
+    if os.path.exists(cachePath):
+        try:
+            with np.load(cachePath, allow_pickle=False) as data:
+                if (str(data['_tag']) == cacheTag and np.array_equal(data['_key'], key)):
+                    return {k: data[k] for k in data.files if not k.startswith('_')}
+        except (OSError, ValueError, KeyError):
+            # a broken cache is simply rebuilt
+            pass
+
+    arrays = parseFunc(sourcePath)
+    try:
+        # write to a temporary file first so that a reader never sees a partial cache
+        tmpPath = cachePath + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            np.savez(f, _tag=np.array(cacheTag), _key=key, **arrays)
+        os.replace(tmpPath, cachePath)
+    except OSError:
+        # the cache is optional, e.g., the folder may be read-only
+        pass
+    return arrays
+
+
+def _loadWithFolderCache(sourcePath, parseFunc, cacheTag, cachePath):
+    key = _getSourceKey(sourcePath)
+
+    if os.path.isdir(cachePath):
+        try:
+            tag = np.load(os.path.join(cachePath, '_tag.npy'), allow_pickle=False)
+            cachedKey = np.load(os.path.join(cachePath, '_key.npy'), allow_pickle=False)
+            if str(tag) == cacheTag and np.array_equal(cachedKey, key):
+                names = [f[:-len('.npy')] for f in os.listdir(cachePath)
+                        if f.endswith('.npy') and not f.startswith('_')]
+                return {name: np.load(os.path.join(cachePath, name + '.npy'),
+                        mmap_mode='r', allow_pickle=False) for name in names}
+        except (OSError, ValueError):
+            # a broken cache is simply rebuilt
+            pass
+
+    arrays = parseFunc(sourcePath)
+    try:
+        # write to a temporary folder first so that a reader never sees a partial cache. The
+        # tag and the key are written last, hence a folder without them is never used.
+        tmpPath = cachePath + '.tmp'
+        shutil.rmtree(tmpPath, ignore_errors=True)
+        os.makedirs(tmpPath)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmpPath, name + '.npy'), array, allow_pickle=False)
+        np.save(os.path.join(tmpPath, '_key.npy'), key)
+        np.save(os.path.join(tmpPath, '_tag.npy'), np.array(cacheTag))
+        shutil.rmtree(cachePath, ignore_errors=True)
+        os.replace(tmpPath, cachePath)
+    except OSError:
+        # the cache is optional, e.g., the folder may be read-only
+        pass
+    return arrays
+
+def _getSourceKey(sourcePath):
+    stat = os.stat(sourcePath)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
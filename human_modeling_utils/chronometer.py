@@ -1,6 +1,10 @@
+import numpy as np
+
+
 class Chronometer:
 
-    def __init__(self, startNumDaysPassed=0, startHour=0, startMinute=0, refDay=0, skipFunc=None):
+    def __init__(self, startNumDaysPassed=0, startHour=0, startMinute=0, refDay=0, skipFunc=None,
+            skipIntervals=None):
         """
         Params:
           startNumDaysPassed: An int to present the number of days passed
@@ -11,6 +15,12 @@ class Chronometer:
           skipFunc: A function which takes (dayOfTheWeek, hour, minute) as arguments and returns a
                     boolean. The function returns true when the notification presenting at the given
                     time should be skipped.
+          skipIntervals: Quiet hours to be skipped, declared as (startMinuteOfDay, endMinuteOfDay)
+                    tuples (see `buildWeeklySkipMask()`). It is either a list of intervals which
+                    applies to every day, or a dictionary which maps a day of the week to a list of
+                    intervals. Unlike `skipFunc`, `forward()` jumps over these intervals
+                    arithmetically instead of checking every tick. Both arguments can be given, in
+                    which case a time is skipped if either of them says so.
         """
         self.setTime(startNumDaysPassed, startHour, startMinute)
 
@@ -18,6 +28,16 @@ class Chronometer:
         self.referenceDay = refDay
 
         self.skipFunc = skipFunc
+        self.skipIntervals = skipIntervals
+        self.dailySkipIntervals = _splitSkipIntervalsByDay(skipIntervals)
+        self.weeklySkipMask = None
+
+    def __setstate__(self, state):
+        # chronometers pickled before `skipIntervals` was introduced do not have these attributes
+        state.setdefault('skipIntervals', None)
+        state.setdefault('dailySkipIntervals', _splitSkipIntervalsByDay(None))
+        state.setdefault('weeklySkipMask', None)
+        self.__dict__.update(state)
 
     def setTime(self, numDaysPassed, hour, minute):
         assert numDaysPassed >= 0, "`numDaysPassed` should not be a negative value"
@@ -29,24 +49,72 @@ class Chronometer:
     def forward(self, timeDeltaMinutes):
         """
         The chronometer ticks its time every `timeDeltaMinutes`. This function may forward more
-        than one step if the current time has to be skipped by `skipFunc()`. It returns the next
-        valid time.
+        than one step if the current time has to be skipped by `skipIntervals` or `skipFunc()`.
+        A skip interval is passed over in a single jump, while `skipFunc()` is checked tick by
+        tick. It returns the next valid time.
 
         Returns:
           (curNumDaysPassed, curHour, curMinute, curDay)
         """
+        timestamp = self.curTimestamp + timeDeltaMinutes
         while True:
-            self.curTimestamp += timeDeltaMinutes
-            curNumDaysPassed, curHour, curMinute, curDay = self._extrateTimeFromTimestamp(
-                    self.curTimestamp)
+            curNumDaysPassed, minuteOfDay = divmod(timestamp, 60 * 24)
+            curDay = (self.referenceDay + curNumDaysPassed) % 7
+
+            # if the time falls in a skip interval, jump to the first tick after the interval
+            intervalEnd = None
+            for start, end in self.dailySkipIntervals[curDay]:
+                if start <= minuteOfDay < end:
+                    intervalEnd = end
+                    break
+            if intervalEnd is not None:
+                numTicks = -((minuteOfDay - intervalEnd) // timeDeltaMinutes)
+                timestamp += numTicks * timeDeltaMinutes
+                continue
 
             # if the time is invalid, we should skip and search for next time
+            curHour, curMinute = divmod(minuteOfDay, 60)
             if self.skipFunc is not None and self.skipFunc(curHour, curMinute, curDay):
+                timestamp += timeDeltaMinutes
                 continue
 
             # return the current time
+            self.curTimestamp = timestamp
             return (curNumDaysPassed, curHour, curMinute, curDay)
 
+    def compileTimeline(self, timeDeltaMinutes, endNumDaysPassed):
+        """
+        Materialize all the time points which successive `forward(timeDeltaMinutes)` calls would
+        return, starting from the current time and stopping before `numDaysPassed` reaches
+        `endNumDaysPassed`. The current time of the chronometer is not changed.
+
+        The skip function is evaluated once per minute of the week (see `getWeeklySkipMask()`)
+        instead of once per tick.
+
+        Returns:
+          (numDaysPassedArr, hourArr, minuteArr, dayArr), four 1-D int arrays of the same length
+        """
+        endTimestamp = self._convertTimeToTimestamp(endNumDaysPassed, 0, 0)
+        numTicks = max(0, (endTimestamp - 1 - self.curTimestamp) // timeDeltaMinutes)
+        timestamps = self.curTimestamp + timeDeltaMinutes * np.arange(1, numTicks + 1)
+
+        numDaysPassedArr, minuteOfDayArr = np.divmod(timestamps, 60 * 24)
+        dayArr = (self.referenceDay + numDaysPassedArr) % 7
+        valid = ~self.getWeeklySkipMask()[dayArr, minuteOfDayArr]
+
+        hourArr, minuteArr = np.divmod(minuteOfDayArr[valid], 60)
+        return (numDaysPassedArr[valid], hourArr, minuteArr, dayArr[valid])
+
+    def getWeeklySkipMask(self):
+        """
+        Returns:
+          A (7, 1440) bool array. The element [day, hour * 60 + minute] is true if the time
+          should be skipped.
+        """
+        if self.weeklySkipMask is None:
+            self.weeklySkipMask = buildWeeklySkipMask(self.skipFunc, self.skipIntervals)
+        return self.weeklySkipMask
+
     def getCurrentTime(self):
         """
         Returns:
@@ -62,3 +130,55 @@ class Chronometer:
         numDaysPassed, hour = divmod(tmp, 24)
         curDay = (self.referenceDay + numDaysPassed) % 7
         return (numDaysPassed, hour, minute, curDay)
+
+
+def buildWeeklySkipMask(skipFunc=None, skipIntervals=None):
+    """
+    Build a (7, 1440) bool array which marks the minutes of the week to be skipped.
+
+    Params:
+      skipFunc: A function with the same signature as the `skipFunc` of `Chronometer`
+      skipIntervals: A list of (startMinuteOfDay, endMinuteOfDay) tuples, or a dictionary which
+                     maps a day of the week to such a list. The interval includes the start and
+                     excludes the end. An interval whose end is smaller than its start wraps
+                     around midnight within the same day of the week, e.g., (22 * 60, 8 * 60)
+                     covers 0am to 8am and 10pm to 12am.
+    """
+    mask = np.zeros((7, 60 * 24), dtype=bool)
+    for day, intervals in enumerate(_splitSkipIntervalsByDay(skipIntervals)):
+        for start, end in intervals:
+            mask[day, start:end] = True
+    if skipFunc is not None:
+        for day in range(7):
+            for hour in range(24):
+                for minute in range(60):
+                    if skipFunc(hour, minute, day):
+                        mask[day, hour * 60 + minute] = True
+    return mask
+
+
+def _splitSkipIntervalsByDay(skipIntervals):
+    """
+    Normalize `skipIntervals` (see `buildWeeklySkipMask()`) into a list of 7 lists, one per day
+    of the week, of non-wrapping (start, end) intervals sorted by the start.
+    """
+    if skipIntervals is None:
+        skipIntervals = []
+    if type(skipIntervals) is dict:
+        intervalsByDay = [skipIntervals.get(day, []) for day in range(7)]
+    else:
+        intervalsByDay = [skipIntervals] * 7
+
+    results = []
+    for intervals in intervalsByDay:
+        dayIntervals = []
+        for start, end in intervals:
+            assert 0 <= start <= 60 * 24 and 0 <= end <= 60 * 24, \
+                    "Skip intervals should be within 0 to 1440 minutes"
+            if start <= end:
+                dayIntervals.append((start, end))
+            else:
+                dayIntervals.append((start, 60 * 24))
+                dayIntervals.append((0, end))
+        results.append(sorted([i for i in dayIntervals if i[0] < i[1]]))
+    return results
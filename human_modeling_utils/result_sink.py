@@ -0,0 +1,131 @@
+import os
+import re
+import shutil
+import numpy as np
+
+from .simulation_log import kColumnDtypes, kColumnNames, _makeRow
+
+
+class BaseResultSink:
+    """
+    A result sink persists the step records of a simulation chunk by chunk, so the records do
+    not have to stay in memory until the simulation ends.
+    """
+
+    def write(self, columns):
+        """
+        Persist one chunk of records.
+
+        Params:
+          columns: A dictionary which maps every column name in `kColumnNames` to a 1-D array.
+                   All the arrays have the same length.
+        """
+        pass
+
+    def getReader(self):
+        """
+        Returns an object which reads the persisted records back. It provides the same read
+        interface as `SimulationLog` (i.e., `getColumn()`, `len()`, indexing, and iteration).
+        """
+        pass
+
+
+class NpyChunkResultSink(BaseResultSink):
+    """
+    `NpyChunkResultSink` stores each chunk as one `.npy` file per column in a folder. The file
+    names follow the format `chunk<dddddd>.<column>.npy`, e.g., `chunk000003.reward.npy`. Plain
+    `.npy` files are used (rather than `.npz`) so that the reader can memory-map them.
+    """
+
+    def __init__(self, folderPath, overWrite=False):
+        if os.path.exists(folderPath) and len(os.listdir(folderPath)) > 0:
+            if overWrite:
+                shutil.rmtree(folderPath)
+            else:
+                raise Exception("Folder \"%s\" is not empty" % folderPath)
+        if not os.path.exists(folderPath):
+            os.makedirs(folderPath)
+
+        self.folderPath = folderPath
+        self.numChunks = 0
+
+    def write(self, columns):
+        for name, dtype in kColumnDtypes:
+            np.save(_getChunkFilePath(self.folderPath, self.numChunks, name),
+                    np.asarray(columns[name], dtype=dtype))
+        self.numChunks += 1
+
+    def getReader(self, mmap=True):
+        return NpyChunkResultReader(self.folderPath, mmap)
+
+
+class NpyChunkResultReader:
+    """
+    Reads the chunks written by `NpyChunkResultSink`. With `mmap=True`, the column files are
+    memory-mapped instead of loaded, hence iterating over the chunks keeps the memory usage
+    flat regardless of the simulation length.
+    """
+
+    def __init__(self, folderPath, mmap=True):
+        self.folderPath = folderPath
+        self.mmapMode = 'r' if mmap else None
+
+        pattern = re.compile(r'^chunk(\d{6})\.reward\.npy$')
+        chunkIdxs = [int(m.group(1)) for m in map(pattern.match, os.listdir(folderPath)) if m]
+        self.numChunks = len(chunkIdxs)
+        if sorted(chunkIdxs) != list(range(self.numChunks)):
+            raise Exception("Chunk files in \"%s\" are not consecutive" % folderPath)
+
+        self.chunkLengths = [len(self._loadChunkColumn(i, 'reward'))
+                for i in range(self.numChunks)]
+        self.chunkOffsets = np.cumsum([0] + self.chunkLengths)
+
+    def iterChunks(self):
+        """
+        Yields a dictionary of column arrays for each chunk, in the order they were written.
+        """
+        for i in range(self.numChunks):
+            yield {name: self._loadChunkColumn(i, name) for name in kColumnNames}
+
+    def getColumn(self, name):
+        """
+        Returns a 1-D array of the given column over all the records. Unlike `iterChunks()`,
+        the entire column is loaded into memory.
+        """
+        if self.numChunks == 0:
+            return np.zeros(0, dtype=dict(kColumnDtypes)[name])
+        return np.concatenate([self._loadChunkColumn(i, name) for i in range(self.numChunks)])
+
+    def getColumns(self):
+        return {name: self.getColumn(name) for name in kColumnNames}
+
+    def getRow(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("NpyChunkResultReader index out of range")
+        chunkIdx = np.searchsorted(self.chunkOffsets, idx, side='right') - 1
+        rowIdx = idx - self.chunkOffsets[chunkIdx]
+        return _makeRow({name: self._loadChunkColumn(chunkIdx, name)[rowIdx]
+                for name in kColumnNames})
+
+    def __len__(self):
+        return int(self.chunkOffsets[-1])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.getRow(i) for i in range(*idx.indices(len(self)))]
+        return self.getRow(idx)
+
+    def __iter__(self):
+        for chunk in self.iterChunks():
+            for i in range(len(chunk['reward'])):
+                yield _makeRow({name: chunk[name][i] for name in kColumnNames})
+
+    def _loadChunkColumn(self, chunkIdx, name):
+        return np.load(_getChunkFilePath(self.folderPath, chunkIdx, name),
+                mmap_mode=self.mmapMode)
+
+
+def _getChunkFilePath(folderPath, chunkIdx, name):
+    return os.path.join(folderPath, "chunk%06d.%s.npy" % (chunkIdx, name))
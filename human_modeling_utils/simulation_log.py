@@ -0,0 +1,177 @@
+import numpy as np
+
+
+# the columns of a simulation log and their types. The probabilities and the reward are kept in
+# float64, so the row view gives back exactly the values which were logged
+kColumnDtypes = [
+        ('numDaysPassed', np.int16),
+        ('hour', np.int16),
+        ('minute', np.int16),
+        ('day', np.int16),
+        ('location', np.int8),
+        ('activity', np.int8),
+        ('lastNotification', np.int32),
+        ('probOfAnswering', np.float64),
+        ('probOfIgnoring', np.float64),
+        ('probOfDismissing', np.float64),
+        ('decision', np.bool_),
+        ('reward', np.float64),
+]
+
+kContextColumns = ['numDaysPassed', 'hour', 'minute', 'day', 'location', 'activity',
+        'lastNotification']
+
+kColumnNames = [name for name, _ in kColumnDtypes]
+
+
+class SimulationLog:
+    """
+    `SimulationLog` stores the step records of a simulation as a struct of arrays. Each column
+    (see `kColumnDtypes`) is kept in fixed-size chunks, so appending a record never copies the
+    existing ones.
+
+    For backward compatibility, the log behaves like the list of dictionaries which the
+    controller used to return: `len()`, indexing, and iteration give a row view in the following
+    format:
+
+        {
+            'context': {
+                'numDaysPassed', 'hour', 'minute', 'day', 'location', 'activity',
+                'lastNotification',
+            },
+            'probOfAnswering', 'probOfIgnoring', 'probOfDismissing', 'decision', 'reward',
+        }
+
+    New code should prefer `getColumn()`, which returns a NumPy array and allows vectorized
+    post-processing.
+
+    If a result sink (see `human_modeling_utils.result_sink`) is given, every chunk is handed
+    over to the sink as soon as it is full and then dropped from memory. In this case the log
+    only holds the records which are not flushed yet, and the complete results have to be read
+    back through the sink.
+    """
+
+    def __init__(self, chunkSize=4096, sink=None):
+        self.chunkSize = chunkSize
+        self.sink = sink
+        self.chunks = []
+        self.numRecords = 0
+        self.numFlushedRecords = 0
+        # the columns concatenated by `getColumn()`, which are valid for `cachedKey`
+        self.cachedColumns = {}
+        self.cachedKey = None
+
+    def append(self, numDaysPassed, hour, minute, day, location, activity, lastNotification,
+            probOfAnswering, probOfIgnoring, probOfDismissing, decision, reward):
+        chunkIdx, rowIdx = divmod(self.numRecords, self.chunkSize)
+        if chunkIdx == len(self.chunks) and self.sink is not None and chunkIdx > 0:
+            self.flush()
+            chunkIdx = 0
+        if chunkIdx == len(self.chunks):
+            self.chunks.append(
+                    {name: np.zeros(self.chunkSize, dtype=dtype) for name, dtype in kColumnDtypes})
+        chunk = self.chunks[chunkIdx]
+        chunk['numDaysPassed'][rowIdx] = numDaysPassed
+        chunk['hour'][rowIdx] = hour
+        chunk['minute'][rowIdx] = minute
+        chunk['day'][rowIdx] = day
+        chunk['location'][rowIdx] = location
+        chunk['activity'][rowIdx] = activity
+        chunk['lastNotification'][rowIdx] = lastNotification
+        chunk['probOfAnswering'][rowIdx] = probOfAnswering
+        chunk['probOfIgnoring'][rowIdx] = probOfIgnoring
+        chunk['probOfDismissing'][rowIdx] = probOfDismissing
+        chunk['decision'][rowIdx] = decision
+        chunk['reward'][rowIdx] = reward
+        self.numRecords += 1
+
+    def extend(self, columns):
+        """
+        Append multiple records at once. `columns` maps every column name to a 1-D array, and
+        all the arrays have the same length.
+        """
+        numNewRecords = len(columns[kColumnNames[0]])
+        offset = 0
+        while offset < numNewRecords:
+            chunkIdx, rowIdx = divmod(self.numRecords, self.chunkSize)
+            if chunkIdx == len(self.chunks) and self.sink is not None and chunkIdx > 0:
+                self.flush()
+                chunkIdx = 0
+            if chunkIdx == len(self.chunks):
+                self.chunks.append(
+                        {name: np.zeros(self.chunkSize, dtype=dtype) for name, dtype in kColumnDtypes})
+            chunk = self.chunks[chunkIdx]
+            numRows = min(self.chunkSize - rowIdx, numNewRecords - offset)
+            for name in kColumnNames:
+                chunk[name][rowIdx:rowIdx + numRows] = columns[name][offset:offset + numRows]
+            self.numRecords += numRows
+            offset += numRows
+
+    def flush(self):
+        """
+        Hand over all the records in memory to the sink, including the last partially filled
+        chunk, and drop them from memory. This has no effect if there is no sink.
+        """
+        if self.sink is None:
+            return
+        for i, chunk in enumerate(self.chunks):
+            numRows = min(self.chunkSize, self.numRecords - i * self.chunkSize)
+            if numRows > 0:
+                self.sink.write({name: chunk[name][:numRows] for name in kColumnNames})
+        self.numFlushedRecords += self.numRecords
+        self.chunks = []
+        self.numRecords = 0
+
+    def getColumn(self, name):
+        """
+        Returns a 1-D array of the given column over all the records. The returned array should
+        be treated as read-only.
+        """
+        # the records in memory only grow between flushes, so the pair identifies them
+        key = (self.numFlushedRecords, self.numRecords)
+        if self.cachedKey != key:
+            self.cachedColumns = {}
+            self.cachedKey = key
+        if name not in self.cachedColumns:
+            if len(self.chunks) == 0:
+                column = np.zeros(0, dtype=dict(kColumnDtypes)[name])
+            else:
+                column = np.concatenate([c[name] for c in self.chunks])[:self.numRecords]
+            self.cachedColumns[name] = column
+        return self.cachedColumns[name]
+
+    def getColumns(self):
+        """
+        Returns a dictionary which maps every column name to its array (see `getColumn()`).
+        """
+        return {name: self.getColumn(name) for name in kColumnNames}
+
+    def getRow(self, idx):
+        if idx < 0:
+            idx += self.numRecords
+        if idx < 0 or idx >= self.numRecords:
+            raise IndexError("SimulationLog index out of range")
+        chunkIdx, rowIdx = divmod(idx, self.chunkSize)
+        chunk = self.chunks[chunkIdx]
+        return _makeRow({name: chunk[name][rowIdx] for name in kColumnNames})
+
+    def __len__(self):
+        return self.numRecords
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.getRow(i) for i in range(*idx.indices(self.numRecords))]
+        return self.getRow(idx)
+
+    def __iter__(self):
+        for i in range(self.numRecords):
+            yield self.getRow(i)
+
+
+def _makeRow(values):
+    """
+    Convert a dictionary of column values into the nested row format.
+    """
+    row = {name: values[name].item() for name in kColumnNames if name not in kContextColumns}
+    row['context'] = {name: values[name].item() for name in kContextColumns}
+    return row
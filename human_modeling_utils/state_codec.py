@@ -0,0 +1,97 @@
+"""
+A dense integer index of the discrete states. A state is the 5-tuple
+
+    (stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+
+and it is mapped to an int in [0, NUM_STATES) in mixed radix, the time being the most
+significant element. The index order is the same as iterating the elements with nested loops
+over `utils.allTimeStates()`, `utils.allDayStates()`, and so on.
+
+The survey-driven environments ignore the time and group their records by the 4-tuple
+
+    (stateDay, stateLocation, stateActivity, stateLastNotification)
+
+which is called a state bucket here and is indexed in [0, NUM_STATE_BUCKETS) the same way.
+
+All the encoding and decoding functions accept either scalars or NumPy arrays.
+"""
+
+import numpy as np
+
+from . import utils
+
+
+NUM_TIME_STATES = len(utils.allTimeStates())
+NUM_DAY_STATES = len(utils.allDayStates())
+NUM_LOCATION_STATES = len(utils.allLocationStates())
+NUM_ACTIVITY_STATES = len(utils.allActivityStates())
+NUM_LAST_NOTIFICATION_STATES = len(utils.allLastNotificationStates())
+
+NUM_STATE_BUCKETS = (NUM_DAY_STATES * NUM_LOCATION_STATES * NUM_ACTIVITY_STATES
+        * NUM_LAST_NOTIFICATION_STATES)
+NUM_STATES = NUM_TIME_STATES * NUM_STATE_BUCKETS
+
+# the codec relies on the state values being 0 to n-1
+for _states in [utils.allTimeStates(), utils.allDayStates(), utils.allLocationStates(),
+        utils.allActivityStates(), utils.allLastNotificationStates()]:
+    assert sorted(_states) == list(range(len(_states))), "State values should be 0 to n-1"
+
+
+def encodeState(stateTime, stateDay, stateLocation, stateActivity, stateLastNotification):
+    return stateTime * NUM_STATE_BUCKETS + encodeBucket(
+            stateDay, stateLocation, stateActivity, stateLastNotification)
+
+def decodeState(stateIdx):
+    """
+    Returns:
+      (stateTime, stateDay, stateLocation, stateActivity, stateLastNotification)
+    """
+    stateTime, bucketIdx = divmod(stateIdx, NUM_STATE_BUCKETS)
+    return (stateTime,) + decodeBucket(bucketIdx)
+
+def encodeBucket(stateDay, stateLocation, stateActivity, stateLastNotification):
+    return (((stateDay * NUM_LOCATION_STATES + stateLocation) * NUM_ACTIVITY_STATES
+            + stateActivity) * NUM_LAST_NOTIFICATION_STATES + stateLastNotification)
+
+def decodeBucket(bucketIdx):
+    """
+    Returns:
+      (stateDay, stateLocation, stateActivity, stateLastNotification)
+    """
+    tmp, stateLastNotification = divmod(bucketIdx, NUM_LAST_NOTIFICATION_STATES)
+    tmp, stateActivity = divmod(tmp, NUM_ACTIVITY_STATES)
+    stateDay, stateLocation = divmod(tmp, NUM_LOCATION_STATES)
+    return (stateDay, stateLocation, stateActivity, stateLastNotification)
+
+def encodeStates(stateTimes, stateDays, stateLocations, stateActivities, stateLastNotifications):
+    """
+    The vectorized version of `encodeState()`. Returns an int array.
+    """
+    return encodeState(np.asarray(stateTimes), np.asarray(stateDays),
+            np.asarray(stateLocations), np.asarray(stateActivities),
+            np.asarray(stateLastNotifications))
+
+def decodeStates(stateIdxs):
+    """
+    The vectorized version of `decodeState()`. Returns a tuple of 5 int arrays.
+    """
+    return decodeState(np.asarray(stateIdxs))
+
+def allStates():
+    """
+    Returns a list of all the 5-tuple states, in the order of their indices.
+    """
+    return [decodeState(i) for i in range(NUM_STATES)]
+
+def allBuckets():
+    """
+    Returns a list of all the 4-tuple state buckets, in the order of their indices.
+    """
+    return [decodeBucket(i) for i in range(NUM_STATE_BUCKETS)]
+
+def encodeStateTable(table):
+    """
+    Convert `table`, a dictionary keyed by the 5-tuple states, into an array indexed by the state
+    indices. Every state has to be in `table`.
+    """
+    return np.array([table[state] for state in allStates()])
@@ -1,3 +1,6 @@
+import itertools
+import numpy as np
+
 from constant import *
 
 def getTimeState(hour, minute):
@@ -22,6 +25,26 @@ def getLastNotificationState(last_notification_time):
     else:
         return STATE_LAST_NOTIFICATION_LONG
 
+def getTimeStates(hours):
+    """
+    The vectorized version of `getTimeState()`. Returns an int array.
+    """
+    return np.select([hours < 8, hours < 12, hours < 18],
+            [STATE_TIME_SLEEPING, STATE_TIME_MORNING, STATE_TIME_AFTERNOON], STATE_TIME_EVENING)
+
+def getDayStates(days):
+    """
+    The vectorized version of `getDayState()`. Returns an int array.
+    """
+    return np.where((days == 0) | (days == 6), STATE_DAY_WEEKEND, STATE_DAY_WEEKDAY)
+
+def getLastNotificationStates(lastNotificationTimes):
+    """
+    The vectorized version of `getLastNotificationState()`. Returns an int array.
+    """
+    return np.where(lastNotificationTimes <= 60,
+            STATE_LAST_NOTIFICATION_WITHIN_1HR, STATE_LAST_NOTIFICATION_LONG)
+
 def getDeltaMinutes(day1, hour1, minute1, day2, hour2, minute2):
     return (day1 - day2) * 24 * 60 + (hour1 - hour2) * 60 + (minute1 - minute2)
 
@@ -50,6 +73,70 @@ def normalize(*args):
     valSum = sum(args)
     return [v / valSum for v in args]
 
+def drawIndex(probs, uniformSample=None):
+    """
+    Draw an index with the probabilities `probs`, which do not have to sum to 1.
+
+    The draw is the one of `np.random.choice(len(probs), p=probs)`, i.e., one uniform random
+    number is searched in the cumulative sum normalized by its last element. The arithmetic is
+    the same, so replacing `np.random.choice()` with this keeps the results under a seed.
+
+    Params:
+      uniformSample: The uniform random number in [0, 1). It is drawn from `np.random` if not
+                     given.
+    """
+    if uniformSample is None:
+        uniformSample = np.random.random_sample()
+    cdf = list(itertools.accumulate(probs))
+    cdfTotal = cdf[-1]
+    for idx, cdfValue in enumerate(cdf):
+        if cdfValue / cdfTotal > uniformSample:
+            return idx
+    return len(cdf) - 1
+
+def drawIndices(probs, uniformSamples):
+    """
+    The row-wise version of `drawIndex()`. `probs` is a 2-D array with one distribution per
+    row, and `uniformSamples` has one uniform random number per row. The arithmetic is the same
+    as `drawIndex()`, so row `i` gives `drawIndex(probs[i], uniformSamples[i])`.
+
+    Returns:
+      An int array of the drawn index of each row
+    """
+    cdf = np.cumsum(probs, axis=1)
+    cdf /= cdf[:, -1:]
+    drawnIdxs = np.sum(cdf <= np.asarray(uniformSamples)[:, np.newaxis], axis=1)
+    return np.minimum(drawnIdxs, cdf.shape[1] - 1)
+
+def drawUniformSamples(random, numSamples, randomStates=None):
+    """
+    Draw `numSamples` uniform random numbers in [0, 1), either all from `random` (a
+    `np.random.RandomState` or the `np.random` module), or one from each of `randomStates`, a
+    list of `numSamples` `np.random.RandomState`s.
+
+    Returns:
+      A float array of the random numbers
+    """
+    if randomStates is None:
+        return random.random_sample(numSamples)
+    return np.array([randomState.random_sample() for randomState in randomStates], dtype=float)
+
+def callWithObjectRandomState(obj, randomState, func, *args):
+    """
+    Call `func(*args)` while `obj`, an agent, an environment, or a behavior model, draws its
+    random numbers from `randomState` (a `np.random.RandomState`, see `setRandomState()` of the
+    base classes). Nothing is changed if `randomState` is `None`. Only an attribute is swapped,
+    so this is cheap enough to wrap every call to a per-run object.
+    """
+    if randomState is None:
+        return func(*args)
+    outerRandomState = obj.randomState
+    obj.randomState = randomState
+    try:
+        return func(*args)
+    finally:
+        obj.randomState = outerRandomState
+
 def argmaxDict(d):
     idx = None
     val = -1e100
@@ -0,0 +1,19 @@
+import argparse
+
+from behavior import ExtraSensoryBehavior, writeTraceStore
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Compile ExtraSensory routing files into a trace store")
+    parser.add_argument('output', type=str, help="The path of the trace store")
+    parser.add_argument('sources', type=str, nargs='+', help="The routing files")
+
+    args = parser.parse_args()
+
+    behavior = ExtraSensoryBehavior(args.sources)
+    writeTraceStore(args.output, behavior.routingTimes, behavior.routingLocations,
+            behavior.routingActivities, behavior.numActivityNan, behavior.numLocationNan)
+    print("%d routings are written to %s" % (len(behavior.routingTimes), args.output))
+
+if __name__ == '__main__':
+    main()
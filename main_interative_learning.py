@@ -1,3 +1,5 @@
+import numpy as np
+
 from agent import *
 from environment import *
 from behavior import *
@@ -47,7 +49,7 @@ def main():
     answerRate = numAcceptedNotis / numNotifications
     dismissRate = numDismissedNotis / numNotifications
 
-    expectedNumDeliveredNotifications = sum([r['probOfAnswering'] for r in results])
+    expectedNumDeliveredNotifications = np.sum(results.getColumn('probOfAnswering'))
 
     print("%d decision points" % len(results))
     print("%d notifications are sent:" % numNotifications)
@@ -58,10 +60,11 @@ def main():
     # weekly performance
     print("======")
     print("Weekly performance:")
+    weekNums = results.getColumn('numDaysPassed') // 7
     for iWeekNum in range(simulationWeek):
-        weekResults = _filterByWeek(results, iWeekNum)
-        weekTotalReward = sum([r['reward'] for r in weekResults])
-        numNotiTotal, numNotiAccepted, numNotiDismissed = _getResponseRates(weekResults)
+        weekMask = (weekNums == iWeekNum)
+        weekTotalReward = np.sum(results.getColumn('reward')[weekMask])
+        numNotiTotal, numNotiAccepted, numNotiDismissed = _getResponseRates(results, weekMask)
         answerRate = numNotiAccepted / numNotiTotal
         dismissRate = numNotiDismissed / numNotiTotal
 
@@ -70,22 +73,19 @@ def main():
 
     #agent.printQTable()
 
-def _getResponseRates(results):
+def _getResponseRates(results, mask=None):
     """
     Returns: (# Total events, # accepts, # dismisses)
     """
-    notificationEvents = [r for r in results if r['decision']]
-    numNotifications = len(notificationEvents)
-    numAcceptedNotifications = len([r for r in notificationEvents if r['reward'] > 0])
-    numDismissedNotifications = len([r for r in notificationEvents if r['reward'] < 0])
+    decisions = results.getColumn('decision')
+    rewards = results.getColumn('reward')
+    if mask is not None:
+        decisions, rewards = decisions[mask], rewards[mask]
+    numNotifications = int(np.sum(decisions))
+    numAcceptedNotifications = int(np.sum(decisions & (rewards > 0)))
+    numDismissedNotifications = int(np.sum(decisions & (rewards < 0)))
     return (numNotifications, numAcceptedNotifications, numDismissedNotifications)
 
-def _filterByWeek(results, week):
-    startDay = week * 7
-    endDay = startDay + 7
-    return [r for r in results
-            if startDay <= r['context']['numDaysPassed'] and r['context']['numDaysPassed'] < endDay]
-
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,53 @@
+from agent import *
+from environment import *
+from behavior import *
+from experiment_sweep import expandGrid, runSweep
+
+def main():
+    mturkFiles = [
+            'survey/ver2_mturk/results/01_1st_Batch_3137574_batch_results.csv',
+            'survey/ver2_mturk/results/02_Batch_3148398_batch_results.csv',
+            'survey/ver2_mturk/results/03_Batch_3149214_batch_results.csv',
+    ]
+
+    grid = {
+            'agent': [
+                AlwaysSendNotificationAgent,
+                QLearningAgent,
+                QLearningAgent2,
+                ContextualBanditSVMAgent,
+            ],
+            'environment': [
+                (MTurkSurveyUser, {
+                    'filePaths': mturkFiles,
+                    'filterFunc': (lambda r: ord(r['rawWorkerID'][-1]) % 3 == 2),
+                    'dismissWarningMsg': True,
+                }),
+            ],
+            'behavior': [
+                (ExtraSensoryBehavior, {'sourceFiles': [
+                    'behavior/data/2.txt',
+                    'behavior/data/4.txt',
+                    'behavior/data/5.txt',
+                    'behavior/data/6.txt',
+                ]}),
+            ],
+            'negativeReward': [-5.],
+            'simulationWeek': [20],
+            'seed': list(range(10)),
+    }
+
+    numRuns = len(expandGrid(grid))
+    for i, s in enumerate(runSweep(grid)):
+        if 'error' in s:
+            print("[%d/%d] run %d: %s seed=%d failed\n%s" % (i + 1, numRuns, s['runIdx'],
+                    s['agent'], s['seed'], s['error']))
+            continue
+        print("[%d/%d] run %d: %s seed=%d, total reward %.1f (%d notifications, %d accepted, "
+                "%d dismissed), %.1f sec" % (i + 1, numRuns, s['runIdx'], s['agent'], s['seed'],
+                s['totalReward'], s['numNotifications'], s['numAccepted'], s['numDismissed'],
+                s['elapsedSec']))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,14 +16,52 @@ from environment import *
 from behavior import *
 from human_modeling_utils import utils
 from human_modeling_utils.chronometer import Chronometer
+from human_modeling_utils.simulation_log import SimulationLog
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'Nurture', 'server', 'notification'))
 from nurture.learning.state import State
 
 
+# the number of uniform random numbers drawn at once in `STEP_MODE_FAST`
+kUniformBlockSize = 4096
+
+kReactions = [ANSWER_NOTIFICATION_ACCEPT, ANSWER_NOTIFICATION_IGNORE, ANSWER_NOTIFICATION_DISMISS]
+
+kActivityToMotion = {
+    STATE_ACTIVITY_STATIONARY: State.MOTION_STATIONARY,
+    STATE_ACTIVITY_WALKING: State.MOTION_WALKING,
+    STATE_ACTIVITY_RUNNING: State.MOTION_RUNNING,
+    STATE_ACTIVITY_DRIVING: State.MOTION_DRIVING,
+    STATE_ACTIVITY_COMMUTE: State.MOTION_DRIVING,
+}
+
+
 class AdvancedEngagementGymBase(gym.Env):
     """Example of a custom env in which you have to walk down a corridor.
-    You can configure the length of the corridor via the env config."""
+    You can configure the length of the corridor via the env config.
+
+    The config key `stepMode` picks how `step()` runs:
+      - `STEP_MODE_COMPAT` (default): Every random number is drawn when it is needed, so the
+        trajectories are identical to the ones of the earlier versions under the same seed.
+      - `STEP_MODE_FAST`: The uniform random numbers of the ringer mode, the screen status, and
+        the user reaction are drawn in blocks, and the observation is written into one
+        preallocated float32 array without building a `State`. The returned observation is
+        overwritten by the next `reset()` or `step()`, so copy it to keep it. The trajectories
+        differ from the ones of `STEP_MODE_COMPAT` because the random numbers are consumed in
+        another order.
+
+    The fast mode only speeds up the work of the gym itself. The behavior model, the user
+    environment, and the step log cost the same in both modes and take most of a step, so the
+    fast mode is about 1.2-1.3 times as fast as the compatible mode. Vectorize the gyms (see
+    `BasicEngagementGymVector` and `SubprocessEngagementGymVector`) for larger gains.
+    """
+
+    STEP_MODE_COMPAT = 0
+    STEP_MODE_FAST = 1
+
+    # the random generator of the gym (see `setRandomState()`). `None` stands for the global
+    # `np.random` generator.
+    randomState = None
 
     def __init__(self, config=None):
 
@@ -36,10 +74,24 @@ class AdvancedEngagementGymBase(gym.Env):
         self.verbose = config['verbose']
         self.episodeLengthDay = config['episodeLengthDay']
         self.stepSizeMinute = config['stepSizeMinute']
+        self.resultSink = config.get('resultSink')
         self.screenStatusProb = config['screenStatusProb']
         self.ringerModeProb = config['ringerModeProb']
         self.responseAdjustmentScreen = config['responseAdjustmentScreen']
         self.responseAdjustmentRinger = config['responseAdjustmentRinger']
+        # in `STEP_MODE_FAST`, every returned observation is `self.observationBuffer` itself
+        self.stepMode = config.get('stepMode', AdvancedEngagementGymBase.STEP_MODE_COMPAT)
+        if self.stepMode not in (AdvancedEngagementGymBase.STEP_MODE_COMPAT,
+                AdvancedEngagementGymBase.STEP_MODE_FAST):
+            raise Exception("Unknown step mode %s" % self.stepMode)
+
+        # the values and the probabilities of the ringer mode and the screen status
+        self.ringerModes = list(self.ringerModeProb.keys())
+        self.ringerModeProbs = list(self.ringerModeProb.values())
+        self.screenStatuses = list(self.screenStatusProb.keys())
+        self.screenStatusProbs = list(self.screenStatusProb.values())
+        self.uniformBlock = []
+        self.uniformIdx = 0
 
         self.action_space = Discrete(2)
         self.observation_space = self.get_observation_space()
@@ -47,6 +99,9 @@ class AdvancedEngagementGymBase(gym.Env):
 
         self.masterNumDayPassed = 0
 
+        if self.stepMode == AdvancedEngagementGymBase.STEP_MODE_FAST:
+            self.observationBuffer = np.zeros(self.observation_space.shape, dtype=np.float32)
+
 
     @abc.abstractmethod
     def get_observation_space(self):
@@ -60,42 +115,80 @@ class AdvancedEngagementGymBase(gym.Env):
         Interface the default state format to the agent understanable format
         """
 
+    def write_observation(self, observation, timeOfDay, dayOfWeek, motion, location,
+            notificationTimeElapsed, ringerMode, screenStatus):
+        """
+        Write the observation of the given state fields into `observation` in place. It is used
+        by `STEP_MODE_FAST`. By default a `State` is built and passed to `intepret_state()`, and
+        subclasses can override it to skip the `State`.
+
+        Returns:
+          observation
+        """
+        observation[:] = self.intepret_state(State(
+            timeOfDay=timeOfDay,
+            dayOfWeek=dayOfWeek,
+            motion=motion,
+            location=location,
+            notificationTimeElapsed=notificationTimeElapsed,
+            ringerMode=ringerMode,
+            screenStatus=screenStatus,
+        ))
+        return observation
+
     def reset(self):
         # set chronometer which automatically skips 10pm to 8am because it's usually when people
         # sleep
         self.chronometer = Chronometer(
                 refDay=self.masterNumDayPassed % 7,
-                skipFunc=(lambda hour, _m, _d: hour < 8 or hour >= 22),
+                skipIntervals=[(22 * 60, 8 * 60)],
         )
 
         self.lastNotificationMinute = 0
         self.lastNotificationHour = 0
         self.lastNotificationNumDays = 0
 
-        # statistics
-        self.simulationResults = []
+        # statistics. The step records are handed over to the result sink chunk by chunk while
+        # the episode proceeds, so the report at the end of the episode is kept as running totals
+        self.simulationResults = SimulationLog(sink=self.resultSink)
         self.totalReward = 0.
         self.numSteps = 0
+        self.numNotifications = 0
+        self.numAcceptedNotis = 0
+        self.numDismissedNotis = 0
+        self.expectedNumDeliveredNotifications = 0.
+        self.firstNumDaysPassed = None
+        self.secondLastNumDaysPassed = None
+        self.lastNumDaysPassed = None
         
+        # materialize the time points of this episode at once. The episode ends at the first time
+        # point after `episodeLengthDay` days, so one more day is compiled.
+        self.timeline = list(zip(*[a.tolist() for a in self.chronometer.compileTimeline(
+                self.stepSizeMinute, self.episodeLengthDay + 2)]))
+        self.timelineIdx = 0
+
         # fast forward a little bit to the next available time
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
-                self.stepSizeMinute)
+        numDaysPassed, currentHour, currentMinute, currentDay = self._forward_time()
 
-        return self.intepret_state(self._generate_state())
+        return self._generate_observation()
 
     def step(self, action):
+        """
+        Returns:
+          (observation, reward, done, info). In `STEP_MODE_FAST`, the observation is the
+          preallocated `self.observationBuffer`, which the next `reset()` or `step()` overwrites.
+        """
 
         assert action in [0, 1]  # 0: silent, 1: send notification
 
         reward = self._generate_reward(action)
         
         # prepare for the next state
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
-                self.stepSizeMinute)
+        numDaysPassed, currentHour, currentMinute, currentDay = self._forward_time()
         if self.verbose:
             print("Day %d %d:%02d" % (numDaysPassed, currentHour, currentMinute))
 
-        gymState = self.intepret_state(self._generate_state())
+        gymState = self._generate_observation()
 
         self.totalReward += reward
         self.numSteps += 1
@@ -107,14 +200,76 @@ class AdvancedEngagementGymBase(gym.Env):
             # print some intermediate results
             print()
             print("===== end of episode, %d days passed in total ====" % self.masterNumDayPassed)
-            self._printResults(self.simulationResults)
+            self._printResults(
+                    self.numSteps, self.totalReward, self.numNotifications,
+                    self.numAcceptedNotis, self.numDismissedNotis,
+                    self.expectedNumDeliveredNotifications,
+                    self.secondLastNumDaysPassed - self.firstNumDaysPassed + 1,
+            )
+
+            # persist the rest of the log of this episode. A new log is created in the next
+            # `reset()`.
+            self.simulationResults.flush()
 
         return gymState, reward, done, {}
 
+    def _forward_time(self):
+        """
+        Move the chronometer to the next time point of the precompiled timeline, or tick it if
+        the timeline is used up.
+        """
+        if self.timelineIdx >= len(self.timeline):
+            self.currentTime = self.chronometer.forward(self.stepSizeMinute)
+            return self.currentTime
+
+        curTime = self.timeline[self.timelineIdx]
+        self.timelineIdx += 1
+        numDaysPassed, currentHour, currentMinute, _ = curTime
+        self.chronometer.setTime(numDaysPassed, currentHour, currentMinute)
+        self.currentTime = curTime
+        return curTime
+
+    def _generate_observation(self):
+        """
+        Returns:
+          The observation of a new state, which is built by `intepret_state()` in
+          `STEP_MODE_COMPAT`, or written into the observation buffer in `STEP_MODE_FAST`
+        """
+        if self.stepMode == AdvancedEngagementGymBase.STEP_MODE_COMPAT:
+            return self.intepret_state(self._generate_state())
+
+        self._generate_context()
+        numDaysPassed, currentHour, currentMinute, currentDay = self.currentTime
+        self.state = None
+        return self.write_observation(
+                self.observationBuffer,
+                self._get_time_of_day(currentHour, currentMinute),
+                self._get_day_of_week(currentDay, currentHour, currentMinute),
+                kActivityToMotion[self.stateActivity],
+                self.stateLocation,
+                self.lastNotificationTime,
+                self.stateRingerMode,
+                self.stateScreenStatus,
+        )
+
     def _generate_state(self):
+        self._generate_context()
+        numDaysPassed, currentHour, currentMinute, currentDay = self.currentTime
+        self.state = State(
+            timeOfDay=self._get_time_of_day(currentHour, currentMinute),
+            dayOfWeek=self._get_day_of_week(currentDay, currentHour, currentMinute),
+            motion=self._get_motion(self.stateActivity),
+            location=self.stateLocation,
+            notificationTimeElapsed=self.lastNotificationTime,
+            ringerMode=self.stateRingerMode,
+            screenStatus=self.stateScreenStatus,
+        )
+        return self.state
+
+    def _generate_context(self):
 
         # retrieve current state
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.getCurrentTime()
+        numDaysPassed, currentHour, currentMinute, currentDay = self.currentTime
 
         # get environment info (user context)
         self.lastNotificationTime = utils.getDeltaMinutes(
@@ -124,21 +279,14 @@ class AdvancedEngagementGymBase(gym.Env):
         self.stateLocation, self.stateActivity = self.behavior.getLocationActivity(
                 currentHour, currentMinute, currentDay)
 
-        self.state = State(
-            timeOfDay=self._get_time_of_day(currentHour, currentMinute),
-            dayOfWeek=self._get_day_of_week(currentDay, currentHour, currentMinute),
-            motion=self._get_motion(self.stateActivity),
-            location=self.stateLocation,
-            notificationTimeElapsed=self.lastNotificationTime,
-            ringerMode=self._pick_ringer_mode(),
-            screenStatus=self._pick_screen_status(),
-        )
-        return self.state
+        # the ringer mode is drawn before the screen status
+        self.stateRingerMode = self._pick_ringer_mode()
+        self.stateScreenStatus = self._pick_screen_status()
 
     def _generate_reward(self, action):
         
         # retrieve current state
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.getCurrentTime()
+        numDaysPassed, currentHour, currentMinute, currentDay = self.currentTime
 
         # get probability of each possible user reaction
         probReactions = self.environment.getResponseDistribution(
@@ -146,7 +294,8 @@ class AdvancedEngagementGymBase(gym.Env):
                 self.stateLocation, self.stateActivity, self.lastNotificationTime,
         )
         probReactions = utils.normalize(*probReactions)
-        probReactions = self._adjust_prob_by_screen_ringer(self.state, *probReactions)
+        probReactions = self._adjust_prob_by_screen_ringer(
+                self.stateScreenStatus, self.stateRingerMode, *probReactions)
         probAnsweringNotification, probIgnoringNotification, probDismissingNotification = probReactions
         
         # calculate reward
@@ -154,34 +303,36 @@ class AdvancedEngagementGymBase(gym.Env):
         if not sendNotification:
             reward = 0
         else:
-            userReaction = np.random.choice(
-                    a=[ANSWER_NOTIFICATION_ACCEPT, ANSWER_NOTIFICATION_IGNORE, ANSWER_NOTIFICATION_DISMISS],
-                    p=[probAnsweringNotification, probIgnoringNotification, probDismissingNotification],
-            )
+            userReaction = self._draw(kReactions, probReactions)
             reward = self.rewardCriteria[userReaction]
             self.lastNotificationNumDays = numDaysPassed
             self.lastNotificationHour = currentHour
             self.lastNotificationMinute = currentMinute
 
         # log this session
-        self.simulationResults.append({
-                'context': {
-                    'numDaysPassed': numDaysPassed,
-                    'hour': currentHour,
-                    'minute': currentMinute,
-                    'day': currentDay,
-                    'location': self.stateLocation,
-                    'activity': self.stateActivity,
-                    'lastNotification': self.lastNotificationTime,
-                },
-                'probOfAnswering': probAnsweringNotification,
-                'probOfIgnoring': probIgnoringNotification,
-                'probOfDismissing': probDismissingNotification,
-                'decision': sendNotification,
-                'reward': reward,
-        })
+        self.simulationResults.append(
+                numDaysPassed, currentHour, currentMinute, currentDay,
+                self.stateLocation, self.stateActivity, self.lastNotificationTime,
+                probAnsweringNotification, probIgnoringNotification, probDismissingNotification,
+                sendNotification, reward,
+        )
+        self._update_statistics(numDaysPassed, probAnsweringNotification, sendNotification, reward)
 
         return reward
+
+    def _update_statistics(self, numDaysPassed, probAnsweringNotification, sendNotification, reward):
+        if sendNotification:
+            self.numNotifications += 1
+            if reward > 0:
+                self.numAcceptedNotis += 1
+            elif reward < 0:
+                self.numDismissedNotis += 1
+        self.expectedNumDeliveredNotifications += probAnsweringNotification
+
+        if self.firstNumDaysPassed is None:
+            self.firstNumDaysPassed = numDaysPassed
+        self.secondLastNumDaysPassed = self.lastNumDaysPassed
+        self.lastNumDaysPassed = numDaysPassed
     
     def _get_time_of_day(self, currentHour, currentMinute):
         return currentHour / 24. + currentMinute / 24. / 60.
@@ -190,49 +341,64 @@ class AdvancedEngagementGymBase(gym.Env):
         return currentDay / 7. + currentHour / 7. / 24. + currentMinute / 7. / 24. / 60.
 
     def _get_motion(self, original_activity):
-        mapping = {
-            STATE_ACTIVITY_STATIONARY: State.MOTION_STATIONARY,
-            STATE_ACTIVITY_WALKING: State.MOTION_WALKING,
-            STATE_ACTIVITY_RUNNING: State.MOTION_RUNNING,
-            STATE_ACTIVITY_DRIVING: State.MOTION_DRIVING,
-            STATE_ACTIVITY_COMMUTE: State.MOTION_DRIVING,
-        }
-        return mapping[original_activity] 
+        return kActivityToMotion[original_activity]
+
+    def setRandomState(self, randomState):
+        """
+        Let the gym, its user environment, and its behavior model draw their random numbers from
+        `randomState`, a `np.random.RandomState`, instead of the global `np.random` generator.
+        `None` restores the global generator.
+        """
+        self.randomState = randomState
+        self.environment.setRandomState(randomState)
+        self.behavior.setRandomState(randomState)
+        # the uniform random numbers drawn in advance come from the previous generator
+        self.uniformBlock = []
+        self.uniformIdx = 0
+
+    def _getRandom(self):
+        """
+        Returns either the random state of the gym or the `np.random` module.
+        """
+        return self.randomState if self.randomState is not None else np.random
 
     def _pick_ringer_mode(self):
-        return np.random.choice(
-                a=list(self.ringerModeProb.keys()),
-                p=list(self.ringerModeProb.values()),
-        )
+        return self._draw(self.ringerModes, self.ringerModeProbs)
 
     def _pick_screen_status(self):
-        return np.random.choice(
-                a=list(self.screenStatusProb.keys()),
-                p=list(self.screenStatusProb.values()),
-        )
+        return self._draw(self.screenStatuses, self.screenStatusProbs)
 
-    def _adjust_prob_by_screen_ringer(self, state, p_answer, p_ignore, p_dismiss):
-        p_answer = (p_answer + 0.01) * self.responseAdjustmentScreen[state.screenStatus]
-        p_answer = (p_answer + 0.01) * self.responseAdjustmentRinger[state.ringerMode]
-        return utils.normalize(p_answer, p_ignore, p_dismiss)
-
-    def _printResults(self, results):
-        notificationEvents = [r for r in results if r['decision']]
-        numNotifications = len(notificationEvents)
-        numAcceptedNotis = len([r for r in notificationEvents if r['reward'] > 0])
-        numDismissedNotis = len([r for r in notificationEvents if r['reward'] < 0])
-        
+    def _draw(self, values, probs):
+        """
+        Draw one of `values` with the probabilities `probs` (see `utils.drawIndex()`).
+        """
+        return values[utils.drawIndex(probs, self._next_uniform())]
+
+    def _next_uniform(self):
+        if self.stepMode == AdvancedEngagementGymBase.STEP_MODE_COMPAT:
+            return self._getRandom().random_sample()
+
+        if self.uniformIdx >= len(self.uniformBlock):
+            self.uniformBlock = self._getRandom().random_sample(kUniformBlockSize).tolist()
+            self.uniformIdx = 0
+        uniformSample = self.uniformBlock[self.uniformIdx]
+        self.uniformIdx += 1
+        return uniformSample
+
+    def _adjust_prob_by_screen_ringer(self, screenStatus, ringerMode, p_answer, p_ignore, p_dismiss):
+        p_answer = (p_answer + 0.01) * self.responseAdjustmentScreen[screenStatus]
+        p_answer = (p_answer + 0.01) * self.responseAdjustmentRinger[ringerMode]
+        total = p_answer + p_ignore + p_dismiss
+        return p_answer / total, p_ignore / total, p_dismiss / total
+
+    def _printResults(self, numSteps, totalReward, numNotifications, numAcceptedNotis,
+            numDismissedNotis, expectedNumDeliveredNotifications, deltaDays):
         answerRate = numAcceptedNotis / numNotifications if numNotifications > 0 else 0.
         dismissRate = numDismissedNotis / numNotifications if numNotifications > 0 else 0.
         numActionedNotis = numAcceptedNotis + numDismissedNotis
         responseRate = numAcceptedNotis / numActionedNotis if numActionedNotis > 0 else 0.
 
-        totalReward = sum([r['reward'] for r in results])
-
-        expectedNumDeliveredNotifications = sum([r['probOfAnswering'] for r in results])
-        deltaDays = results[-2]['context']['numDaysPassed'] - results[0]['context']['numDaysPassed'] + 1
-
-        print("  reward=%f / step=%d (%f)" % (totalReward, len(results), totalReward / len(results)))
+        print("  reward=%f / step=%d (%f)" % (totalReward, numSteps, totalReward / numSteps))
         print("  %d notifications have been sent (%.1f / day):" % (numNotifications, numNotifications / deltaDays))
         print("    - %d are answered (%.2f%%)"  % (numAcceptedNotis, answerRate * 100.))
         print("    - %d are dismissed (%.2f%%)"  % (numDismissedNotis, dismissRate * 100.))
@@ -317,5 +483,6 @@ class AdvancedEngagementGymBase(gym.Env):
                 "ringerModeProb": ringerModeProb,
                 "responseAdjustmentScreen": responseAdjustmentScreen,
                 "responseAdjustmentRinger": responseAdjustmentRinger,
+                "stepMode": AdvancedEngagementGymBase.STEP_MODE_COMPAT,
         }
 
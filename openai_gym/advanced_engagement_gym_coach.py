@@ -13,6 +13,26 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'Nurture', '
 from nurture.learning.state import State
 
 
+# the one-hot slots of the observation
+kMotionIdxs = {
+    State.MOTION_STATIONARY: 2,
+    State.MOTION_WALKING: 3,
+    State.MOTION_RUNNING: 4,
+    State.MOTION_DRIVING: 5,
+    State.MOTION_BIKING: 6,
+}
+kLocationIdxs = {
+    State.LOCATION_HOME: 7,
+    State.LOCATION_WORK: 8,
+    State.LOCATION_OTHER: 9,
+}
+kRingerModeIdxs = {
+    State.RINGER_MODE_SILENT: 11,
+    State.RINGER_MODE_VIBRATE: 12,
+    State.RINGER_MODE_NORMAL: 13,
+}
+
+
 class AdvancedEngagementGymCoach(AdvancedEngagementGymBase):
     
     def get_observation_space(self):
@@ -72,3 +92,17 @@ class AdvancedEngagementGymCoach(AdvancedEngagementGymBase):
             state.screenStatus,
         ])
 
+    def write_observation(self, observation, timeOfDay, dayOfWeek, motion, location,
+            notificationTimeElapsed, ringerMode, screenStatus):
+        observation.fill(0.)
+        observation[0] = timeOfDay
+        observation[1] = dayOfWeek
+        if motion in kMotionIdxs:
+            observation[kMotionIdxs[motion]] = 1.
+        if location in kLocationIdxs:
+            observation[kLocationIdxs[location]] = 1.
+        observation[10] = math.log(utils.clip(notificationTimeElapsed, 5.0, 60.0))
+        if ringerMode in kRingerModeIdxs:
+            observation[kRingerModeIdxs[ringerMode]] = 1.
+        observation[14] = screenStatus
+        return observation
@@ -17,12 +17,17 @@ from environment import *
 from behavior import *
 from human_modeling_utils import utils
 from human_modeling_utils.chronometer import Chronometer
+from human_modeling_utils.simulation_log import SimulationLog
 
 
 class BasicEngagementGymBase(gym.Env):
     """Example of a custom env in which you have to walk down a corridor.
     You can configure the length of the corridor via the env config."""
 
+    # the random generator of the gym (see `setRandomState()`). `None` stands for the global
+    # `np.random` generator.
+    randomState = None
+
     def __init__(self, config=None):
 
         if config is None:
@@ -34,6 +39,7 @@ class BasicEngagementGymBase(gym.Env):
         self.verbose = config['verbose']
         self.episodeLengthDay = config['episodeLengthDay']
         self.stepSizeMinute = config['stepSizeMinute']
+        self.resultSink = config.get('resultSink')
 
         self.action_space = Discrete(2)
         self.observation_space = self.get_observation_space()
@@ -42,6 +48,22 @@ class BasicEngagementGymBase(gym.Env):
         self.masterNumDayPassed = 0
 
 
+    def setRandomState(self, randomState):
+        """
+        Let the gym, its user environment, and its behavior model draw their random numbers from
+        `randomState`, a `np.random.RandomState`, instead of the global `np.random` generator.
+        `None` restores the global generator.
+        """
+        self.randomState = randomState
+        self.environment.setRandomState(randomState)
+        self.behavior.setRandomState(randomState)
+
+    def _getRandom(self):
+        """
+        Returns either the random state of the gym or the `np.random` module.
+        """
+        return self.randomState if self.randomState is not None else np.random
+
     @abc.abstractmethod
     def get_observation_space(self):
         """
@@ -59,21 +81,33 @@ class BasicEngagementGymBase(gym.Env):
         # sleep
         self.chronometer = Chronometer(
                 refDay=self.masterNumDayPassed % 7,
-                skipFunc=(lambda hour, _m, _d: hour < 8 or hour >= 22),
+                skipIntervals=[(22 * 60, 8 * 60)],
         )
 
         self.lastNotificationMinute = 0
         self.lastNotificationHour = 0
         self.lastNotificationNumDays = 0
 
-        # statistics
-        self.simulationResults = []
+        # statistics. The step records are handed over to the result sink chunk by chunk while
+        # the episode proceeds, so the report at the end of the episode is kept as running totals
+        self.simulationResults = SimulationLog(sink=self.resultSink)
         self.totalReward = 0.
         self.numSteps = 0
+        self.numNotifications = 0
+        self.numAcceptedNotis = 0
+        self.numDismissedNotis = 0
+        self.expectedNumDeliveredNotifications = 0.
+        self.firstNumDaysPassed = None
+        self.lastNumDaysPassed = None
         
+        # materialize the time points of this episode at once. The episode ends at the first time
+        # point after `episodeLengthDay` days, so one more day is compiled.
+        self.timeline = list(zip(*[a.tolist() for a in self.chronometer.compileTimeline(
+                self.stepSizeMinute, self.episodeLengthDay + 2)]))
+        self.timelineIdx = 0
+
         # fast forward a little bit to the next available time
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
-                self.stepSizeMinute)
+        numDaysPassed, currentHour, currentMinute, currentDay = self._forward_time()
 
         return self.intepret_state(self._generate_state())
 
@@ -84,8 +118,7 @@ class BasicEngagementGymBase(gym.Env):
         reward = self._generate_reward(action)
         
         # prepare for the next state
-        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
-                self.stepSizeMinute)
+        numDaysPassed, currentHour, currentMinute, currentDay = self._forward_time()
         if self.verbose:
             print("Day %d %d:%02d" % (numDaysPassed, currentHour, currentMinute))
 
@@ -101,10 +134,33 @@ class BasicEngagementGymBase(gym.Env):
             # print some intermediate results
             print()
             print("===== end of episode, %d days passed in total ====" % self.masterNumDayPassed)
-            self._printResults(self.simulationResults)
+            self._printResults(
+                    self.numSteps, self.totalReward, self.numNotifications,
+                    self.numAcceptedNotis, self.numDismissedNotis,
+                    self.expectedNumDeliveredNotifications,
+                    self.lastNumDaysPassed - self.firstNumDaysPassed + 1,
+            )
+
+            # persist the rest of the log of this episode. A new log is created in the next
+            # `reset()`.
+            self.simulationResults.flush()
 
         return gymState, reward, done, {}
 
+    def _forward_time(self):
+        """
+        Move the chronometer to the next time point of the precompiled timeline, or tick it if
+        the timeline is used up.
+        """
+        if self.timelineIdx >= len(self.timeline):
+            return self.chronometer.forward(self.stepSizeMinute)
+
+        curTime = self.timeline[self.timelineIdx]
+        self.timelineIdx += 1
+        numDaysPassed, currentHour, currentMinute, _ = curTime
+        self.chronometer.setTime(numDaysPassed, currentHour, currentMinute)
+        return curTime
+
     def _generate_state(self):
 
         # retrieve current state
@@ -149,7 +205,7 @@ class BasicEngagementGymBase(gym.Env):
         if not sendNotification:
             reward = 0
         else:
-            userReaction = np.random.choice(
+            userReaction = self._getRandom().choice(
                     a=[ANSWER_NOTIFICATION_ACCEPT, ANSWER_NOTIFICATION_IGNORE, ANSWER_NOTIFICATION_DISMISS],
                     p=[probAnsweringNotification, probIgnoringNotification, probDismissingNotification],
             )
@@ -159,42 +215,37 @@ class BasicEngagementGymBase(gym.Env):
             self.lastNotificationMinute = currentMinute
 
         # log this session
-        self.simulationResults.append({
-                'context': {
-                    'numDaysPassed': numDaysPassed,
-                    'hour': currentHour,
-                    'minute': currentMinute,
-                    'day': currentDay,
-                    'location': self.stateLocation,
-                    'activity': self.stateActivity,
-                    'lastNotification': self.lastNotificationTime,
-                },
-                'probOfAnswering': probAnsweringNotification,
-                'probOfIgnoring': probIgnoringNotification,
-                'probOfDismissing': probDismissingNotification,
-                'decision': sendNotification,
-                'reward': reward,
-        })
+        self.simulationResults.append(
+                numDaysPassed, currentHour, currentMinute, currentDay,
+                self.stateLocation, self.stateActivity, self.lastNotificationTime,
+                probAnsweringNotification, probIgnoringNotification, probDismissingNotification,
+                sendNotification, reward,
+        )
+        self._update_statistics(numDaysPassed, probAnsweringNotification, sendNotification, reward)
 
         return reward
 
-    def _printResults(self, results):
-        notificationEvents = [r for r in results if r['decision']]
-        numNotifications = len(notificationEvents)
-        numAcceptedNotis = len([r for r in notificationEvents if r['reward'] > 0])
-        numDismissedNotis = len([r for r in notificationEvents if r['reward'] < 0])
-        
+    def _update_statistics(self, numDaysPassed, probAnsweringNotification, sendNotification, reward):
+        if sendNotification:
+            self.numNotifications += 1
+            if reward > 0:
+                self.numAcceptedNotis += 1
+            elif reward < 0:
+                self.numDismissedNotis += 1
+        self.expectedNumDeliveredNotifications += probAnsweringNotification
+
+        if self.firstNumDaysPassed is None:
+            self.firstNumDaysPassed = numDaysPassed
+        self.lastNumDaysPassed = numDaysPassed
+
+    def _printResults(self, numSteps, totalReward, numNotifications, numAcceptedNotis,
+            numDismissedNotis, expectedNumDeliveredNotifications, deltaDays):
         answerRate = numAcceptedNotis / numNotifications if numNotifications > 0 else 0.
         dismissRate = numDismissedNotis / numNotifications if numNotifications > 0 else 0.
         numActionedNotis = numAcceptedNotis + numDismissedNotis
         responseRate = numAcceptedNotis / numActionedNotis if numActionedNotis > 0 else 0.
 
-        totalReward = sum([r['reward'] for r in results])
-
-        expectedNumDeliveredNotifications = sum([r['probOfAnswering'] for r in results])
-        deltaDays = results[-1]['context']['numDaysPassed'] - results[0]['context']['numDaysPassed'] + 1
-
-        print("  reward=%f / step=%d (%f)" % (totalReward, len(results), totalReward / len(results)))
+        print("  reward=%f / step=%d (%f)" % (totalReward, numSteps, totalReward / numSteps))
         print("  %d notifications have been sent (%.1f / day):" % (numNotifications, numNotifications / deltaDays))
         print("    - %d are answered (%.2f%%)"  % (numAcceptedNotis, answerRate * 100.))
         print("    - %d are dismissed (%.2f%%)"  % (numDismissedNotis, dismissRate * 100.))
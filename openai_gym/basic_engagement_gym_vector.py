@@ -0,0 +1,292 @@
+import numpy as np
+
+import gym
+
+from constant import *
+from human_modeling_utils import utils
+from human_modeling_utils.chronometer import Chronometer
+from human_modeling_utils.simulation_log import SimulationLog, kColumnDtypes
+
+
+# the user reactions in the order of the response distributions
+kReactions = [ANSWER_NOTIFICATION_ACCEPT, ANSWER_NOTIFICATION_IGNORE, ANSWER_NOTIFICATION_DISMISS]
+
+
+class BasicEngagementGymVector(gym.vector.VectorEnv):
+    """
+    `BasicEngagementGymVector` steps K independent episodes of `BasicEngagementGymBase` gyms at
+    once. It is a `gym.vector.VectorEnv`, so it can be used wherever a vectorized gym is
+    expected. `step()` takes an action vector and returns the stacked observations, rewards,
+    dones, and infos (a list of K dictionaries), following the step format of the gyms. A
+    finished sub-env is reset automatically: its returned observation is the first one of the
+    next episode, and the last observation of the finished episode is given in
+    `infos[k]['terminal_observation']`.
+
+    The clocks, the last notification times, the time and day states, and the step logs are kept
+    in arrays of K elements, and all the time points are compiled in advance per day of the week
+    the episode starts on. The user environment, the behavior model, and the user reaction are
+    still queried per sub-env and in the order of the sub-envs, because they consume the global
+    random numbers. Hence the observations and rewards are identical to the ones of the K gyms
+    stepped one after another (and reset right after they finish) under the same seed.
+
+    Each sub-env takes its configuration (reward criteria, user environment, behavior model,
+    etc.) from one gym, so the gyms should not share stateful objects such as
+    `ExtraSensoryBehavior`.
+    """
+
+    def __init__(self, envs):
+        """
+        Params:
+          envs: A list of K gyms derived from `BasicEngagementGymBase`. They have to agree on
+                `episodeLengthDay` and `stepSizeMinute`.
+        """
+        self.envs = envs
+        if len(envs) == 0:
+            raise Exception("At least one gym is required")
+        self.episodeLengthDay = envs[0].episodeLengthDay
+        self.stepSizeMinute = envs[0].stepSizeMinute
+        for env in envs:
+            if (env.episodeLengthDay != self.episodeLengthDay
+                    or env.stepSizeMinute != self.stepSizeMinute):
+                raise Exception("All the gyms should have the same episode length and step size")
+
+        super().__init__(len(envs), envs[0].observation_space, envs[0].action_space)
+        self.pendingActions = None
+
+        # the time and day states of every minute of the day and every day of the week
+        self.timeStateTable = np.array(
+                [utils.getTimeState(m // 60, m % 60) for m in range(24 * 60)], dtype=int)
+        self.dayStateTable = np.array([utils.getDayState(d) for d in range(7)], dtype=int)
+
+        # the time points of an episode, compiled lazily per day of the week it starts on
+        self.timelines = [None] * 7
+
+    def reset_wait(self, seed=None, options=None):
+        """
+        Returns:
+          The stacked observations of all the sub-envs
+        """
+        if seed is not None:
+            # the gyms draw from the global random generators, which have to be seeded instead
+            raise Exception("Seeding the sub-envs is not supported")
+
+        numEnvs = self.num_envs
+        self.timelineRefDays = np.zeros(numEnvs, dtype=int)
+        self.timelineIdxs = np.zeros(numEnvs, dtype=int)
+        self.lastNotificationTimestamps = np.zeros(numEnvs, dtype=int)
+        self.lastNotificationTimes = np.zeros(numEnvs, dtype=int)
+        self.stateLocations = np.zeros(numEnvs, dtype=int)
+        self.stateActivities = np.zeros(numEnvs, dtype=int)
+        self.totalRewards = np.zeros(numEnvs)
+        self.expectedNumDeliveredNotifications = np.zeros(numEnvs)
+        self.numSteps = np.zeros(numEnvs, dtype=int)
+
+        maxEpisodeSteps = max(self._getTimeline(d)[4] for d in range(7))
+        self.logColumns = {name: np.zeros((numEnvs, maxEpisodeSteps), dtype=dtype)
+                for name, dtype in kColumnDtypes}
+
+        for k, env in enumerate(self.envs):
+            refDay = env.masterNumDayPassed % 7
+            self._resetSubEnv(k, refDay, *self._getFirstLocationActivity(k, refDay))
+        self._updateLastNotificationTimes()
+        return self._getObservations()
+
+    def step_async(self, actions):
+        """
+        Params:
+          actions: A vector of K actions, where 0 means silent and 1 means sending a notification
+        """
+        actions = np.asarray(actions)
+        assert actions.shape == (self.num_envs,) and np.all((actions == 0) | (actions == 1))
+        self.pendingActions = actions
+
+    def step_wait(self):
+        """
+        Step all the sub-envs with the actions given to `step_async()`.
+
+        Returns:
+          (observations, rewards, dones, infos)
+        """
+        actions, self.pendingActions = self.pendingActions, None
+        if actions is None:
+            raise Exception("step_async() has to be called before step_wait()")
+
+        numEnvs = self.num_envs
+        envIdxs = np.arange(numEnvs)
+        numDaysPassed, hours, minutes, days = self._getCurrentTimes()
+        nextTimelineIdxs = self.timelineIdxs + 1
+        nextNumDaysPassed, nextHours, nextMinutes, nextDays = self._getTimes(
+                self.timelineRefDays, nextTimelineIdxs)
+        dones = nextNumDaysPassed > self.episodeLengthDay
+
+        probs = np.zeros((numEnvs, 3))
+        rewards = np.zeros(numEnvs)
+        sendNotifications = actions == 1
+        hourList, minuteList, dayList = hours.tolist(), minutes.tolist(), days.tolist()
+        nextHourList, nextMinuteList, nextDayList = (
+                nextHours.tolist(), nextMinutes.tolist(), nextDays.tolist())
+        locationList, activityList = self.stateLocations.tolist(), self.stateActivities.tolist()
+        lastNotificationTimeList = self.lastNotificationTimes.tolist()
+        nextLocations = np.zeros(numEnvs, dtype=int)
+        nextActivities = np.zeros(numEnvs, dtype=int)
+        firstLocationActivities = {}
+
+        # the random numbers are drawn sub-env by sub-env, in the same order as separate gyms
+        for k, env in enumerate(self.envs):
+            probReactions = utils.normalize(*env.environment.getResponseDistribution(
+                    hourList[k], minuteList[k], dayList[k],
+                    locationList[k], activityList[k], lastNotificationTimeList[k],
+            ))
+            probs[k] = probReactions
+            if sendNotifications[k]:
+                rewards[k] = env.rewardCriteria[kReactions[utils.drawIndex(probReactions)]]
+            nextLocations[k], nextActivities[k] = env.behavior.getLocationActivity(
+                    nextHourList[k], nextMinuteList[k], nextDayList[k])
+            if env.verbose:
+                print("Day %d %d:%02d" % (nextNumDaysPassed[k], nextHourList[k], nextMinuteList[k]))
+
+            # a finished gym is reset right after its last step
+            if dones[k]:
+                refDay = (env.masterNumDayPassed + self.episodeLengthDay) % 7
+                firstLocationActivities[k] = (
+                        refDay,) + self._getFirstLocationActivity(k, refDay)
+
+        # log this step
+        stepIdxs = self.numSteps
+        logValues = {
+                'numDaysPassed': numDaysPassed,
+                'hour': hours,
+                'minute': minutes,
+                'day': days,
+                'location': self.stateLocations,
+                'activity': self.stateActivities,
+                'lastNotification': self.lastNotificationTimes,
+                'probOfAnswering': probs[:, 0],
+                'probOfIgnoring': probs[:, 1],
+                'probOfDismissing': probs[:, 2],
+                'decision': sendNotifications,
+                'reward': rewards,
+        }
+        for name, values in logValues.items():
+            self.logColumns[name][envIdxs, stepIdxs] = values
+
+        currentTimestamps = _getTimestamps(numDaysPassed, hours, minutes)
+        self.lastNotificationTimestamps = np.where(
+                sendNotifications, currentTimestamps, self.lastNotificationTimestamps)
+        self.timelineIdxs = nextTimelineIdxs
+        self.stateLocations = nextLocations
+        self.stateActivities = nextActivities
+        self.totalRewards += rewards
+        self.expectedNumDeliveredNotifications += probs[:, 0]
+        self.numSteps += 1
+        self._updateLastNotificationTimes()
+
+        observations = self._getObservations()
+        infos = [{} for _ in range(numEnvs)]
+        if len(firstLocationActivities) > 0:
+            for k, (refDay, stateLocation, stateActivity) in firstLocationActivities.items():
+                infos[k]['terminal_observation'] = observations[k]
+                self._finishEpisode(k)
+                self._resetSubEnv(k, refDay, stateLocation, stateActivity)
+            self._updateLastNotificationTimes()
+            observations = self._getObservations()
+
+        return observations, rewards, dones, infos
+
+    def _getFirstLocationActivity(self, k, refDay):
+        """
+        Returns the location and activity at the first time point of an episode starting on
+        day of the week `refDay`.
+        """
+        timeline = self._getTimeline(refDay)
+        return self.envs[k].behavior.getLocationActivity(
+                int(timeline[1][0]), int(timeline[2][0]), int(timeline[3][0]))
+
+    def _resetSubEnv(self, k, refDay, stateLocation, stateActivity):
+        self.timelineRefDays[k] = refDay
+        self.timelineIdxs[k] = 0
+        self.lastNotificationTimestamps[k] = 0
+        self.stateLocations[k] = stateLocation
+        self.stateActivities[k] = stateActivity
+        self.totalRewards[k] = 0.
+        self.expectedNumDeliveredNotifications[k] = 0.
+        self.numSteps[k] = 0
+
+    def _finishEpisode(self, k):
+        env = self.envs[k]
+        env.masterNumDayPassed += self.episodeLengthDay
+
+        numSteps = int(self.numSteps[k])
+        columns = {name: column[k, :numSteps] for name, column in self.logColumns.items()}
+
+        # print some intermediate results. The totals are accumulated in the same order as the
+        # gym does, so the report is the same
+        decisions = columns['decision']
+        rewards = columns['reward']
+        numDaysPassed = columns['numDaysPassed']
+        print()
+        print("===== end of episode, %d days passed in total ====" % env.masterNumDayPassed)
+        env._printResults(
+                numSteps, float(self.totalRewards[k]), int(np.sum(decisions)),
+                int(np.sum(decisions & (rewards > 0))), int(np.sum(decisions & (rewards < 0))),
+                float(self.expectedNumDeliveredNotifications[k]),
+                int(numDaysPassed[-1]) - int(numDaysPassed[0]) + 1,
+        )
+
+        # persist the log of this episode in the same chunks as the gym hands over
+        simulationResults = SimulationLog(sink=env.resultSink)
+        simulationResults.extend(columns)
+        simulationResults.flush()
+
+    def _getTimeline(self, refDay):
+        """
+        Returns:
+          (numDaysPassedArr, hourArr, minuteArr, dayArr, numEpisodeSteps), where the arrays are
+          the time points of an episode starting on day of the week `refDay`, and the episode
+          ends when the `numEpisodeSteps`-th step moves to the last time point
+        """
+        if self.timelines[refDay] is None:
+            # skip 10pm to 8am like the gyms do
+            chronometer = Chronometer(refDay=refDay, skipIntervals=[(22 * 60, 8 * 60)])
+            timeline = chronometer.compileTimeline(self.stepSizeMinute, self.episodeLengthDay + 2)
+            doneIdxs = np.flatnonzero(timeline[0] > self.episodeLengthDay)
+            if len(doneIdxs) == 0:
+                raise Exception("The episode does not end within the compiled time points")
+            numTimePoints = doneIdxs[0] + 1
+            self.timelines[refDay] = tuple(a[:numTimePoints] for a in timeline) + (doneIdxs[0],)
+        return self.timelines[refDay]
+
+    def _getTimes(self, refDays, timelineIdxs):
+        times = [np.zeros(len(refDays), dtype=int) for _ in range(4)]
+        for refDay in np.unique(refDays).tolist():
+            mask = refDays == refDay
+            timeline = self._getTimeline(refDay)
+            for column, values in zip(times, timeline[:4]):
+                column[mask] = values[timelineIdxs[mask]]
+        return times
+
+    def _getCurrentTimes(self):
+        """
+        Returns:
+          (numDaysPassedArr, hourArr, minuteArr, dayArr)
+        """
+        return self._getTimes(self.timelineRefDays, self.timelineIdxs)
+
+    def _updateLastNotificationTimes(self):
+        numDaysPassed, hours, minutes, _ = self._getCurrentTimes()
+        self.lastNotificationTimes = (_getTimestamps(numDaysPassed, hours, minutes)
+                - self.lastNotificationTimestamps)
+
+    def _getObservations(self):
+        _, hours, minutes, days = self._getCurrentTimes()
+        stateTimes = self.timeStateTable[hours * 60 + minutes]
+        stateDays = self.dayStateTable[days]
+        stateLastNotifications = np.where(self.lastNotificationTimes <= 60,
+                STATE_LAST_NOTIFICATION_WITHIN_1HR, STATE_LAST_NOTIFICATION_LONG)
+        states = zip(stateTimes.tolist(), stateDays.tolist(), self.stateLocations.tolist(),
+                self.stateActivities.tolist(), stateLastNotifications.tolist())
+        return np.array([env.intepret_state(s) for env, s in zip(self.envs, states)])
+
+
+def _getTimestamps(numDaysPassed, hours, minutes):
+    return numDaysPassed * 24 * 60 + hours * 60 + minutes
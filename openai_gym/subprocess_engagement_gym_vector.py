@@ -0,0 +1,266 @@
+import multiprocessing
+import random
+import traceback
+import numpy as np
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+
+
+class SubprocessEngagementGymVector:
+    """
+    `SubprocessEngagementGymVector` runs K engagement gyms (e.g., `AdvancedEngagementGymCoach`)
+    in worker processes. Each worker owns a contiguous slice of the gyms. The actions, the
+    observations, the rewards, and the dones live in `multiprocessing.shared_memory` arrays, so
+    the pipes to the workers only carry short commands and acknowledgements.
+
+    The interface follows `BasicEngagementGymVector`: `step()` takes an action vector and returns
+    the stacked observations, rewards, dones, and infos, and a finished gym is reset
+    automatically, with its last observation in `infos[k]['terminal_observation']`.
+
+    Every gym draws from a generator of its own. The worker seeds the global random generators
+    (`np.random` and `random`) with `seed + k` right before it builds the gym `k` (or from the OS
+    entropy if `seed` is not given), and then hands a `np.random.RandomState` which continues
+    the global `np.random` stream over to the gym through `setRandomState()` (see
+    `BasicEngagementGymBase`). The gyms draw all their random numbers from it, so the worker
+    never has to swap the global state while the gyms step. Hence the gym `k` behaves the same
+    as a standalone gym built and run after `np.random.seed(seed + k)` and
+    `random.seed(seed + k)`, whatever the number of workers is, as long as the gym only draws
+    through the generator given to `setRandomState()` once it is built.
+
+    If a worker fails or exits unexpectedly, all the workers are closed and an exception names
+    the worker.
+    """
+
+    def __init__(self, envFactory, numEnvs, numWorkers=None, seed=None, startMethod=None):
+        """
+        Params:
+          envFactory: A function which takes the index of a gym (0 to `numEnvs - 1`) and returns
+                      the gym, which has to implement `setRandomState()`. It is called in the
+                      worker processes, and it has to be picklable unless the workers are forked.
+          numEnvs: The number of gyms
+          numWorkers: The number of worker processes. The default is the number of CPUs, but no
+                      more than `numEnvs`.
+          seed: The base random seed of the gyms
+          startMethod: The start method of `multiprocessing`. The default is "fork" where it is
+                       available, and "spawn" otherwise.
+        """
+        if numWorkers is None:
+            numWorkers = multiprocessing.cpu_count()
+        numWorkers = max(1, min(numWorkers, numEnvs))
+        if startMethod is None:
+            startMethod = ('fork' if 'fork' in multiprocessing.get_all_start_methods()
+                    else 'spawn')
+        context = multiprocessing.get_context(startMethod)
+
+        self.num_envs = numEnvs
+        self.workerEnvIdxs = [idxs.tolist() for idxs in np.array_split(np.arange(numEnvs), numWorkers)]
+        self.sharedMemories = []
+        self.isClosed = False
+
+        self.connections = []
+        self.processes = []
+        for workerIdx, envIdxs in enumerate(self.workerEnvIdxs):
+            parentConn, childConn = context.Pipe()
+            process = context.Process(target=_runWorker,
+                    args=(childConn, envFactory, envIdxs, seed), daemon=True)
+            process.start()
+            childConn.close()
+            self.connections.append(parentConn)
+            self.processes.append(process)
+
+        # the workers build their gyms and report the spaces and the observation layout
+        specs = self._receiveAll()
+        self.single_observation_space, self.single_action_space, obsShape, obsDtype = specs[0]
+
+        self.actions = self._createSharedArray('actions', (numEnvs,), np.int64)
+        self.observations = self._createSharedArray('observations', (numEnvs,) + obsShape, obsDtype)
+        self.terminalObservations = self._createSharedArray(
+                'terminalObservations', (numEnvs,) + obsShape, obsDtype)
+        self.rewards = self._createSharedArray('rewards', (numEnvs,), np.float64)
+        self.dones = self._createSharedArray('dones', (numEnvs,), np.bool_)
+
+        layout = {name: (shm.name, shape, dtype) for name, shm, shape, dtype in self.sharedMemories}
+        self._sendAll(('attach', layout))
+        self._receiveAll()
+
+    def reset(self):
+        """
+        Returns:
+          The stacked observations of all the gyms
+        """
+        self._sendAll(('reset',))
+        self._receiveAll()
+        return self.observations.copy()
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions):
+        """
+        Hand over the actions to the workers without waiting for the results.
+        """
+        self.actions[:] = actions
+        self._sendAll(('step',))
+
+    def step_wait(self):
+        """
+        Returns:
+          (observations, rewards, dones, infos)
+        """
+        self._receiveAll()
+        dones = self.dones.copy()
+        infos = [{} for _ in range(self.num_envs)]
+        for k in np.flatnonzero(dones).tolist():
+            infos[k]['terminal_observation'] = self.terminalObservations[k].copy()
+        return self.observations.copy(), self.rewards.copy(), dones, infos
+
+    def close(self):
+        if self.isClosed:
+            return
+        self.isClosed = True
+        for conn in self.connections:
+            try:
+                conn.send(('close',))
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        for conn in self.connections:
+            conn.close()
+
+        # drop the array views before the memory is released
+        self.actions = self.observations = self.terminalObservations = None
+        self.rewards = self.dones = None
+        for _, shm, _, _ in self.sharedMemories:
+            shm.close()
+            shm.unlink()
+        self.sharedMemories = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+
+    def _createSharedArray(self, name, shape, dtype):
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(create=True,
+                size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self.sharedMemories.append((name, shm, shape, dtype.str))
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def _sendAll(self, message):
+        for workerIdx, conn in enumerate(self.connections):
+            try:
+                conn.send(message)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close()
+                raise Exception("Gym worker %d exited unexpectedly" % workerIdx)
+
+    def _receiveAll(self):
+        results = []
+        for workerIdx, conn in enumerate(self.connections):
+            try:
+                results.append(conn.recv())
+            except (EOFError, ConnectionResetError):
+                # the worker died without reporting, e.g., it was killed
+                self.close()
+                raise Exception("Gym worker %d exited unexpectedly" % workerIdx)
+        for workerIdx, (status, payload) in enumerate(results):
+            if status == 'error':
+                self.close()
+                raise Exception("Gym worker %d failed:\n%s" % (workerIdx, payload))
+        return [payload for _, payload in results]
+
+
+def _attachSharedMemory(name):
+    """
+    Attach to a shared memory block owned by the parent process. The block must not be tracked
+    in the worker, or the resource tracker of the worker unlinks it when the worker exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # `track` is only available since Python 3.13. Before that, the registration is skipped
+    # instead, because the worker may share the resource tracker of the parent.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _buildEnv(envFactory, k, seed):
+    """
+    Build the gym `k` right after seeding the global random generators, and give it a generator
+    which continues the global `np.random` stream.
+    """
+    np.random.seed(seed + k if seed is not None else None)
+    random.seed(seed + k if seed is not None else None)
+    env = envFactory(k)
+    randomState = np.random.RandomState()
+    randomState.set_state(np.random.get_state())
+    env.setRandomState(randomState)
+    return env
+
+def _stepAndReset(env, action):
+    obs, reward, done, info = env.step(action)
+    if done:
+        return obs, reward, done, env.reset()
+    return obs, reward, done, None
+
+def _runWorker(conn, envFactory, envIdxs, seed):
+    sharedMemories = []
+    try:
+        # every gym has its own generator, seeded by the index of the gym, so that the results do
+        # not depend on how the gyms are spread over the workers. Forked workers inherit the
+        # random state of the parent, hence the generators are seeded even without `seed`.
+        envs = [_buildEnv(envFactory, k, seed) for k in envIdxs]
+        firstObservations = [np.asarray(env.reset()) for env in envs]
+        conn.send(('ok', (envs[0].observation_space, envs[0].action_space,
+                firstObservations[0].shape, firstObservations[0].dtype.str)))
+
+        _, layout = conn.recv()
+        arrays = {}
+        for name, (shmName, shape, dtype) in layout.items():
+            shm = _attachSharedMemory(shmName)
+            sharedMemories.append(shm)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        conn.send(('ok', None))
+
+        # the gyms were reset when they were built, which the first `reset()` reuses
+        pendingObservations = firstObservations
+        while True:
+            command = conn.recv()[0]
+            if command == 'reset':
+                if pendingObservations is None:
+                    pendingObservations = [env.reset() for env in envs]
+                for k, obs in zip(envIdxs, pendingObservations):
+                    arrays['observations'][k] = obs
+                pendingObservations = None
+            elif command == 'step':
+                pendingObservations = None
+                for k, env in zip(envIdxs, envs):
+                    obs, reward, done, resetObs = _stepAndReset(env, int(arrays['actions'][k]))
+                    if done:
+                        arrays['terminalObservations'][k] = obs
+                        obs = resetObs
+                    arrays['observations'][k] = obs
+                    arrays['rewards'][k] = reward
+                    arrays['dones'][k] = done
+            elif command == 'close':
+                break
+            conn.send(('ok', None))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        arrays = None
+        for shm in sharedMemories:
+            shm.close()
+        conn.close()
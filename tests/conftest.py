@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of the repository are imported from the root folder, as the main scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
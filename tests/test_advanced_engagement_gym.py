@@ -0,0 +1,194 @@
+import contextlib
+import io
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip('gym')
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'Nurture', 'server', 'notification'))
+try:
+    from nurture.learning.state import State
+except ImportError:
+    # nurture is not installed here, so a `State` with the same fields stands in for it
+    class State:
+        MOTION_STATIONARY, MOTION_WALKING, MOTION_RUNNING, MOTION_DRIVING, MOTION_BIKING = range(5)
+        LOCATION_HOME, LOCATION_WORK, LOCATION_OTHER = range(3)
+        RINGER_MODE_SILENT, RINGER_MODE_VIBRATE, RINGER_MODE_NORMAL = range(3)
+        SCREEN_STATUS_OFF, SCREEN_STATUS_ON = range(2)
+
+        def __init__(self, timeOfDay, dayOfWeek, motion, location, notificationTimeElapsed,
+                ringerMode, screenStatus):
+            self.timeOfDay = timeOfDay
+            self.dayOfWeek = dayOfWeek
+            self.motion = motion
+            self.location = location
+            self.notificationTimeElapsed = notificationTimeElapsed
+            self.ringerMode = ringerMode
+            self.screenStatus = screenStatus
+
+    for name in ['nurture', 'nurture.learning', 'nurture.learning.state']:
+        sys.modules[name] = types.ModuleType(name)
+    sys.modules['nurture.learning.state'].State = State
+
+from constant import *
+from environment import MTurkSurveyUser
+from behavior import RandomBehavior
+from human_modeling_utils import utils
+from human_modeling_utils.chronometer import Chronometer
+from openai_gym.advanced_engagement_gym_base import AdvancedEngagementGymBase
+from openai_gym.advanced_engagement_gym_coach import AdvancedEngagementGymCoach
+
+
+kRootFolder = os.path.join(os.path.dirname(__file__), '..')
+
+
+class _LegacyGymCoach(AdvancedEngagementGymCoach):
+    """
+    The reset and the step of the gym before the step modes were introduced, kept as the
+    reference of `STEP_MODE_COMPAT`. The end-of-episode report is left out.
+    """
+
+    def reset(self):
+        self.chronometer = Chronometer(
+                refDay=self.masterNumDayPassed % 7,
+                skipFunc=(lambda hour, _m, _d: hour < 8 or hour >= 22),
+        )
+        self.lastNotificationMinute = 0
+        self.lastNotificationHour = 0
+        self.lastNotificationNumDays = 0
+        self.chronometer.forward(self.stepSizeMinute)
+        return self.intepret_state(self._generate_state())
+
+    def step(self, action):
+        reward = self._generate_reward(action)
+        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.forward(
+                self.stepSizeMinute)
+        gymState = self.intepret_state(self._generate_state())
+        done = (numDaysPassed > self.episodeLengthDay)
+        if done:
+            self.masterNumDayPassed += self.episodeLengthDay
+        return gymState, reward, done, {}
+
+    def _generate_state(self):
+        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.getCurrentTime()
+        self.lastNotificationTime = utils.getDeltaMinutes(
+                numDaysPassed, currentHour, currentMinute,
+                self.lastNotificationNumDays, self.lastNotificationHour, self.lastNotificationMinute,
+        )
+        self.stateLocation, self.stateActivity = self.behavior.getLocationActivity(
+                currentHour, currentMinute, currentDay)
+        self.state = State(
+            timeOfDay=self._get_time_of_day(currentHour, currentMinute),
+            dayOfWeek=self._get_day_of_week(currentDay, currentHour, currentMinute),
+            motion=self._get_motion(self.stateActivity),
+            location=self.stateLocation,
+            notificationTimeElapsed=self.lastNotificationTime,
+            ringerMode=np.random.choice(a=list(self.ringerModeProb.keys()),
+                    p=list(self.ringerModeProb.values())),
+            screenStatus=np.random.choice(a=list(self.screenStatusProb.keys()),
+                    p=list(self.screenStatusProb.values())),
+        )
+        return self.state
+
+    def _generate_reward(self, action):
+        numDaysPassed, currentHour, currentMinute, currentDay = self.chronometer.getCurrentTime()
+        p_answer, p_ignore, p_dismiss = utils.normalize(*self.environment.getResponseDistribution(
+                currentHour, currentMinute, currentDay,
+                self.stateLocation, self.stateActivity, self.lastNotificationTime,
+        ))
+        p_answer = (p_answer + 0.01) * self.responseAdjustmentScreen[self.state.screenStatus]
+        p_answer = (p_answer + 0.01) * self.responseAdjustmentRinger[self.state.ringerMode]
+        if action != 1:
+            return 0
+        userReaction = np.random.choice(
+                a=[ANSWER_NOTIFICATION_ACCEPT, ANSWER_NOTIFICATION_IGNORE, ANSWER_NOTIFICATION_DISMISS],
+                p=list(utils.normalize(p_answer, p_ignore, p_dismiss)),
+        )
+        self.lastNotificationNumDays = numDaysPassed
+        self.lastNotificationHour = currentHour
+        self.lastNotificationMinute = currentMinute
+        return self.rewardCriteria[userReaction]
+
+
+def _makeConfig(stepMode=None):
+    # `RandomBehavior` draws the same numbers as before the step modes, whereas the lookups of
+    # `ExtraSensoryBehavior` were fixed meanwhile
+    config = {
+            "rewardCriteria": {
+                ANSWER_NOTIFICATION_ACCEPT: 1,
+                ANSWER_NOTIFICATION_IGNORE: 0,
+                ANSWER_NOTIFICATION_DISMISS: -5,
+            },
+            "environment": MTurkSurveyUser(
+                [os.path.join(kRootFolder, 'survey/ver2_mturk/sample_results/1st_batch_results.csv')],
+                dismissWarningMsg=True),
+            "behavior": RandomBehavior(),
+            "verbose": False,
+            "episodeLengthDay": 1,
+            "stepSizeMinute": 7,
+            "screenStatusProb": {State.SCREEN_STATUS_ON: 0.15, State.SCREEN_STATUS_OFF: 0.85},
+            "ringerModeProb": {
+                State.RINGER_MODE_SILENT: 0.4,
+                State.RINGER_MODE_VIBRATE: 0.3,
+                State.RINGER_MODE_NORMAL: 0.3,
+            },
+            "responseAdjustmentScreen": {State.SCREEN_STATUS_ON: 100., State.SCREEN_STATUS_OFF: 1.},
+            "responseAdjustmentRinger": {
+                State.RINGER_MODE_SILENT: 1.,
+                State.RINGER_MODE_VIBRATE: 1.,
+                State.RINGER_MODE_NORMAL: 2.,
+            },
+    }
+    if stepMode is not None:
+        config['stepMode'] = stepMode
+    return config
+
+
+def _runTrajectory(env, actions, seed):
+    np.random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        trajectory = [np.asarray(env.reset()).tolist()]
+        for action in actions:
+            obs, reward, done, _ = env.step(action)
+            trajectory.append((np.asarray(obs).tolist(), reward, done))
+            if done:
+                trajectory.append(np.asarray(env.reset()).tolist())
+    return trajectory
+
+
+def test_compat_mode_matches_legacy_trajectories():
+    actions = (np.random.RandomState(1).random_sample(1000) < 0.3).astype(int).tolist()
+    for seed in [0, 5]:
+        expected = _runTrajectory(_LegacyGymCoach(_makeConfig()), actions, seed)
+        assert sum(1 for t in expected if type(t) is tuple and t[2]) >= 4
+        for stepMode in [None, AdvancedEngagementGymBase.STEP_MODE_COMPAT]:
+            assert _runTrajectory(AdvancedEngagementGymCoach(_makeConfig(stepMode)), actions,
+                    seed) == expected
+
+
+def test_write_observation_matches_intepret_state():
+    env = AdvancedEngagementGymCoach(_makeConfig(AdvancedEngagementGymBase.STEP_MODE_FAST))
+    random = np.random.RandomState(0)
+    observation = np.full(env.observation_space.shape, np.nan, dtype=np.float32)
+    for _ in range(200):
+        fields = dict(
+                timeOfDay=random.random_sample(),
+                dayOfWeek=random.random_sample(),
+                motion=random.choice([State.MOTION_STATIONARY, State.MOTION_WALKING,
+                    State.MOTION_RUNNING, State.MOTION_DRIVING, State.MOTION_BIKING]),
+                location=random.choice([State.LOCATION_HOME, State.LOCATION_WORK,
+                    State.LOCATION_OTHER]),
+                notificationTimeElapsed=int(random.randint(0, 200)),
+                ringerMode=random.choice([State.RINGER_MODE_SILENT, State.RINGER_MODE_VIBRATE,
+                    State.RINGER_MODE_NORMAL]),
+                screenStatus=random.choice([State.SCREEN_STATUS_ON, State.SCREEN_STATUS_OFF]),
+        )
+        expected = env.intepret_state(State(**fields)).astype(np.float32)
+        assert np.array_equal(env.write_observation(observation, **fields), expected)
+        # the default of the base class goes through `intepret_state()` as well
+        assert np.array_equal(AdvancedEngagementGymBase.write_observation(
+                env, observation, **fields), expected)
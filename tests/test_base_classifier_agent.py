@@ -0,0 +1,71 @@
+import numpy as np
+
+from agent import SVMAgent
+from agent.base_classifier_agent import BaseClassifierAgent
+
+
+class _RecordingAgent(SVMAgent):
+
+    def trainModel(self, dataX, dataY, sampleWeight=None):
+        self.trainingData = (dataX, dataY, sampleWeight)
+        return None
+
+    def getRewardLabels(self, model, dataX):
+        return np.zeros(len(dataX))
+
+
+def _writeTrainingFile(path, numRows, seed):
+    rs = np.random.RandomState(seed)
+    rows = np.column_stack([
+        rs.choice([1, 0, -5], numRows),
+        rs.randint(4, size=numRows),
+        rs.randint(2, size=numRows),
+        rs.randint(3, size=numRows),
+        rs.randint(5, size=numRows),
+        rs.randint(2, size=numRows),
+    ])
+    np.savetxt(str(path), rows, fmt='%d', delimiter=',')
+    return rows
+
+
+def _sortedRows(dataX, dataY, repeats):
+    rows = np.column_stack([dataY, dataX])
+    rows = np.repeat(rows, repeats, axis=0)
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+def test_deduplication_is_off_by_default():
+    assert not BaseClassifierAgent.DEDUPLICATE_TRAINING_DATA
+    assert not SVMAgent.DEDUPLICATE_TRAINING_DATA
+
+
+def test_load_model_weights_match_repeated_rows(tmp_path):
+    negRewardWeight = 3
+    rows = _writeTrainingFile(tmp_path / 'train.csv', 500, 0)
+
+    # the rows as `loadModel()` used to build them, with the negative rows repeated
+    agent = _RecordingAgent(negRewardWeight)
+    repeatedX = np.array([agent.encode(*r[1:]) for r in rows])
+    repeatedY = rows[:, 0]
+    repeats = np.where(repeatedY >= 0, 1, negRewardWeight)
+    expected = _sortedRows(repeatedX, repeatedY, repeats)
+
+    for deduplicate in [False, True]:
+        agent = _RecordingAgent(negRewardWeight)
+        agent.DEDUPLICATE_TRAINING_DATA = deduplicate
+        agent.loadModel(str(tmp_path / 'train.csv'), useCache=False)
+        dataX, dataY, weights = agent.trainingData
+        assert len(dataX) == (len(np.unique(rows, axis=0)) if deduplicate else len(rows))
+        assert np.array_equal(_sortedRows(dataX, dataY, weights), expected)
+
+
+def test_load_model_reads_the_cache(tmp_path):
+    _writeTrainingFile(tmp_path / 'train.csv', 200, 1)
+    results = []
+    for _ in range(2):
+        agent = _RecordingAgent()
+        agent.loadModel(str(tmp_path / 'train.csv'))
+        results.append(agent.trainingData)
+    assert (tmp_path / 'train.csv.cache.npz').exists()
+    for a, b in zip(*results):
+        assert np.array_equal(a, b)
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pytest
+
+gym = pytest.importorskip('gym')
+
+from constant import *
+from environment import MTurkSurveyUser, SurveyUser
+from behavior import ExtraSensoryBehavior, RandomBehavior
+from openai_gym.basic_engagement_gym_coach import BasicEngagementGymCoach
+from openai_gym.basic_engagement_gym_vector import BasicEngagementGymVector
+
+
+kRootFolder = os.path.join(os.path.dirname(__file__), '..')
+
+
+def _makeGym(k):
+    # mix the user environments and the behavior models over the sub-envs
+    if k % 3 == 0:
+        behavior = RandomBehavior()
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            behavior = ExtraSensoryBehavior(os.path.join(kRootFolder, 'behavior/sample_data/1.txt'),
+                    daySampling=(1 if k % 3 == 2 else None))
+    if k % 2 == 0:
+        environment = MTurkSurveyUser(
+                [os.path.join(kRootFolder, 'survey/ver2_mturk/sample_results/1st_batch_results.csv')],
+                dismissWarningMsg=True)
+    else:
+        environment = SurveyUser(os.path.join(kRootFolder, 'survey/ver1_pilot/sample_data/01.txt'))
+    return BasicEngagementGymCoach({
+            "rewardCriteria": {
+                ANSWER_NOTIFICATION_ACCEPT: 1,
+                ANSWER_NOTIFICATION_IGNORE: 0,
+                ANSWER_NOTIFICATION_DISMISS: -5,
+            },
+            "environment": environment,
+            "behavior": behavior,
+            "verbose": False,
+            "episodeLengthDay": 1,
+            "stepSizeMinute": 1,
+    })
+
+
+def test_vector_matches_separate_gyms(capsys):
+    numEnvs, numSteps = 4, 2000
+    actions = (np.random.RandomState(7).random_sample((numSteps, numEnvs)) < 0.3).astype(int)
+
+    # the gyms are stepped one after another, and a finished gym is reset right away
+    envs = [_makeGym(k) for k in range(numEnvs)]
+    np.random.seed(0)
+    expected = [[np.asarray(env.reset()).tolist() for env in envs]]
+    for stepActions in actions:
+        row = []
+        for env, action in zip(envs, stepActions.tolist()):
+            obs, reward, done, _ = env.step(action)
+            if done:
+                obs = env.reset()
+            row.append((np.asarray(obs).tolist(), float(reward), bool(done)))
+        expected.append(row)
+    expectedOutput = capsys.readouterr().out
+
+    vector = BasicEngagementGymVector([_makeGym(k) for k in range(numEnvs)])
+    assert isinstance(vector, gym.vector.VectorEnv)
+    np.random.seed(0)
+    results = [vector.reset().tolist()]
+    for stepActions in actions:
+        obs, rewards, dones, infos = vector.step(stepActions)
+        assert len(infos) == numEnvs
+        results.append([(obs[k].tolist(), float(rewards[k]), bool(dones[k]))
+                for k in range(numEnvs)])
+
+    assert any(done for row in expected[1:] for _, _, done in row)
+    assert results == expected
+    assert capsys.readouterr().out == expectedOutput
@@ -0,0 +1,120 @@
+import copy
+import os
+import random
+
+import numpy as np
+import pytest
+
+from agent import QLearningAgent, VectorizedQLearningAgent, AlwaysSendNotificationAgent
+from environment import MTurkSurveyUser, LessStubbornUser
+from behavior import RandomBehavior
+from controller import Controller
+from batch_controller import BatchController
+from human_modeling_utils.simulation_log import kColumnNames
+
+
+kSurveyFile = os.path.join(os.path.dirname(__file__), '..',
+        'survey/ver2_mturk/sample_results/1st_batch_results.csv')
+
+
+def _makeRunObjects(numRuns):
+    np.random.seed(0)
+    random.seed(0)
+    return ([QLearningAgent() for _ in range(numRuns)],
+            [MTurkSurveyUser([kSurveyFile], dismissWarningMsg=True) for _ in range(numRuns)],
+            [RandomBehavior() for _ in range(numRuns)])
+
+
+def _assertSameLogs(log1, log2):
+    assert len(log1) == len(log2)
+    for name in kColumnNames:
+        assert np.array_equal(log1.getColumn(name), log2.getColumn(name)), name
+
+
+def test_single_run_matches_controller():
+    agents, environments, behaviors = _makeRunObjects(1)
+    np.random.seed(42)
+    random.seed(42)
+    expected = Controller(agents[0], environments[0], behaviors[0], simulationWeek=2,
+            verbose=False).execute()
+
+    agents, environments, behaviors = _makeRunObjects(1)
+    np.random.seed(42)
+    random.seed(42)
+    results = BatchController(agents[0], environments[0], behaviors[0], simulationWeek=2,
+            verbose=False).execute()
+    assert len(results) == 1
+    _assertSameLogs(results[0], expected)
+    assert np.count_nonzero(expected.getColumn('decision')) > 0
+
+
+def test_seeded_runs_match_independent_controllers():
+    seeds = [11, 5, 7]
+
+    agents, environments, behaviors = _makeRunObjects(len(seeds))
+    expected = []
+    for i, seed in enumerate(seeds):
+        np.random.seed(seed)
+        random.seed(seed)
+        expected.append(Controller(agents[i], environments[i], behaviors[i],
+                simulationWeek=1, verbose=False).execute())
+
+    agents, environments, behaviors = _makeRunObjects(len(seeds))
+    np.random.seed(123)
+    results = BatchController(agents, environments, behaviors, simulationWeek=1, verbose=False,
+            seeds=seeds).execute()
+    for log, expectedLog in zip(results, expected):
+        _assertSameLogs(log, expectedLog)
+
+    # a run does not depend on the other runs
+    agents, environments, behaviors = _makeRunObjects(len(seeds))
+    results = BatchController(agents[1:], environments[1:], behaviors[1:], simulationWeek=1,
+            verbose=False, seeds=seeds[1:]).execute()
+    for log, expectedLog in zip(results, expected[1:]):
+        _assertSameLogs(log, expectedLog)
+
+
+def test_seeded_runs_share_environment():
+    seeds = [3, 4]
+    environment = LessStubbornUser()
+
+    agents = [QLearningAgent() for _ in seeds]
+    behaviors = [RandomBehavior() for _ in seeds]
+    results = BatchController(agents, environment, behaviors, simulationWeek=1,
+            verbose=False, seeds=seeds).execute()
+
+    agents = [QLearningAgent() for _ in seeds]
+    behaviors = [RandomBehavior() for _ in seeds]
+    expected = BatchController(agents, [copy.deepcopy(environment) for _ in seeds], behaviors,
+            simulationWeek=1, verbose=False, seeds=seeds).execute()
+    for log, expectedLog in zip(results, expected):
+        _assertSameLogs(log, expectedLog)
+
+
+def test_seeded_vectorized_objects_match_independent_controllers():
+    seeds = [11, 5, 7, 2]
+    environment = MTurkSurveyUser([kSurveyFile], dismissWarningMsg=True)
+
+    expected = []
+    for seed in seeds:
+        np.random.seed(seed)
+        expected.append(Controller(QLearningAgent(), environment, RandomBehavior(),
+                simulationWeek=1, verbose=False).execute())
+
+    # a single agent, environment, and behavior model serve all the runs with array operations
+    results = BatchController(VectorizedQLearningAgent(numUsers=len(seeds)), environment,
+            RandomBehavior(), numRuns=len(seeds), simulationWeek=1, verbose=False,
+            seeds=seeds).execute()
+    for log, expectedLog in zip(results, expected):
+        _assertSameLogs(log, expectedLog)
+    assert environment.randomState is None
+
+
+def test_shared_agent_without_batch_implementation():
+    results = BatchController(AlwaysSendNotificationAgent(), LessStubbornUser(), RandomBehavior(),
+            numRuns=3, simulationWeek=1, verbose=False).execute()
+    assert all(log.getColumn('decision').all() for log in results)
+
+    with pytest.raises(Exception, match="serves a single run"):
+        BatchController(QLearningAgent(), LessStubbornUser(), RandomBehavior(), numRuns=3,
+                simulationWeek=1, verbose=False).execute()
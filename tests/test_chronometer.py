@@ -0,0 +1,43 @@
+from human_modeling_utils.chronometer import Chronometer
+
+
+def _isQuiet(hour, minute, day):
+    return hour < 8 or hour >= 22 or (day == 3 and 12 <= hour < 14) or (day == 5 and hour == 13)
+
+
+kQuietIntervals = {day: [(22 * 60, 8 * 60)] + ([(12 * 60, 14 * 60)] if day == 3 else [])
+        + ([(13 * 60, 14 * 60)] if day == 5 else []) for day in range(7)}
+
+
+def test_skip_intervals_match_skip_function():
+    for refDay in range(7):
+        for timeDeltaMinutes in [1, 3, 7, 10, 13, 60, 1439]:
+            chronometers = [
+                    Chronometer(refDay=refDay, skipFunc=_isQuiet),
+                    Chronometer(refDay=refDay, skipIntervals=kQuietIntervals),
+                    Chronometer(refDay=refDay, skipIntervals=[(22 * 60, 8 * 60)],
+                            skipFunc=lambda hour, minute, day: 8 <= hour < 22 and
+                            _isQuiet(hour, minute, day)),
+            ]
+            for chronometer in chronometers:
+                chronometer.setTime(0, 3, 7)
+            for _ in range(500):
+                times = [chronometer.forward(timeDeltaMinutes) for chronometer in chronometers]
+                assert times[0] == times[1] == times[2], (refDay, timeDeltaMinutes)
+            assert (chronometers[0].getWeeklySkipMask() == chronometers[1].getWeeklySkipMask()).all()
+
+
+def test_timeline_matches_forward():
+    for timeDeltaMinutes in [1, 5, 17]:
+        chronometer = Chronometer(refDay=2, startHour=21, startMinute=59,
+                skipIntervals=kQuietIntervals)
+        timeline = list(zip(*[a.tolist() for a in chronometer.compileTimeline(timeDeltaMinutes, 9)]))
+        assert chronometer.getCurrentTime() == (0, 21, 59, 2)
+
+        expected = []
+        while True:
+            time = chronometer.forward(timeDeltaMinutes)
+            if time[0] >= 9:
+                break
+            expected.append(time)
+        assert timeline == expected
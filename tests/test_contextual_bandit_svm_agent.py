@@ -0,0 +1,60 @@
+import pickle
+
+import numpy as np
+
+from agent import BaseAgent
+from agent.contextual_bandit_svm_agent import ContextualBanditSVMAgent, kTunedParameters
+from agent.hyperparameter_search import FullGridSearch
+from human_modeling_utils import state_codec
+
+
+def test_unpickles_objects_with_one_hot_history():
+    agent = ContextualBanditSVMAgent()
+    random = np.random.RandomState(0)
+    stateIdxs = random.randint(state_codec.NUM_STATES, size=40)
+    labels = random.randint(2, size=40)
+
+    # the state of the objects pickled when the history was kept as one-hot encoded lists
+    oldState = {
+        'stage': BaseAgent.STAGE_WAIT_REWARD,
+        'negativeReward': -5,
+        'operatingMode': agent.operatingMode,
+        'xData': [agent.encode(*state_codec.decodeState(int(i))) for i in stateIdxs],
+        'yData': labels.tolist(),
+        'clf': None,
+        'countDown': 3,
+        'currentX': agent.encode(*state_codec.decodeState(int(stateIdxs[-1]))),
+        'chosenAction': True,
+    }
+    restored = ContextualBanditSVMAgent.__new__(ContextualBanditSVMAgent)
+    restored.__setstate__(pickle.loads(pickle.dumps(oldState)))
+
+    expected = np.zeros((state_codec.NUM_STATES, 2), dtype=int)
+    np.add.at(expected, (stateIdxs, labels), 1)
+    assert np.array_equal(restored.dataCounts, expected)
+    assert restored.currentStateIdx == stateIdxs[-1]
+    assert restored.scaler is None and restored.clf is None
+
+    # the restored agent keeps learning, and it can be pickled again
+    restored.feedReward(1)
+    restored.getAction(*state_codec.decodeState(5))
+    assert pickle.loads(pickle.dumps(restored)).dataCounts.sum() == len(stateIdxs) + 1
+
+
+def test_close_stops_training_thread():
+    agent = ContextualBanditSVMAgent(backgroundTraining=True, waitForFreshModel=True,
+            hyperparameterSearch=FullGridSearch(kTunedParameters, numJobs=1))
+    agent.dataCounts[:40, 0] = 1
+    agent.dataCounts[40:80, 1] = 1
+    agent._trainModel()
+    executor = agent.executor
+    assert executor is not None and agent.clf is not None
+
+    agent.close()
+    assert agent.executor is None
+    assert all(not thread.is_alive() for thread in executor._threads)
+
+    # a later training starts another worker
+    agent._trainModel()
+    assert agent.executor is not None
+    agent.close()
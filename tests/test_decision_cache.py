@@ -0,0 +1,112 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from agent import SVMAgent
+from agent.contextual_bandit_svm_agent import ContextualBanditSVMAgent
+from agent.contextual_bandit_svm_prob_agent import ContextualBanditSVMProbAgent
+from agent.decision_cache import DecisionCache
+from agent.hyperparameter_search import FullGridSearch
+from agent.svm_agent import kTunedParameters
+from human_modeling_utils import state_codec
+
+
+def _writeTrainingFile(path, numRows, seed):
+    rs = np.random.RandomState(seed)
+    rows = np.column_stack([
+        rs.choice([1, 0, -5], numRows),
+        rs.randint(4, size=numRows),
+        rs.randint(2, size=numRows),
+        rs.randint(3, size=numRows),
+        rs.randint(5, size=numRows),
+        rs.randint(2, size=numRows),
+    ])
+    np.savetxt(str(path), rows, fmt='%d', delimiter=',')
+
+
+def _makeDataCounts(seed):
+    random = np.random.RandomState(seed)
+    return random.randint(4, size=(state_codec.NUM_STATES, 2))
+
+
+def test_cache_counts_hits_and_rebuilds_after_invalidate():
+    numCalls = [0]
+    def computeTable():
+        numCalls[0] += 1
+        return np.arange(state_codec.NUM_STATES) + numCalls[0]
+
+    cache = DecisionCache(computeTable)
+    states = state_codec.allStates()
+    for stateIdx in [0, 7, 7, state_codec.NUM_STATES - 1]:
+        assert cache.lookup(*states[stateIdx]) == stateIdx + 1
+    assert numCalls[0] == 1
+    assert cache.getCounters() == {'numHits': 3, 'numMisses': 1}
+
+    cache.invalidate()
+    assert cache.lookup(*states[3]) == 3 + 2
+    assert numCalls[0] == 2
+    assert cache.getCounters() == {'numHits': 3, 'numMisses': 2}
+
+    with pytest.raises(Exception):
+        cache.setTable(np.zeros(state_codec.NUM_STATES - 1))
+
+
+def test_svm_agent_decisions_match_predict_after_refit(tmp_path):
+    agent = SVMAgent(hyperparameterSearch=FullGridSearch(kTunedParameters, cv=3, numJobs=1))
+    states = state_codec.allStates()
+    for seed in [0, 1]:
+        _writeTrainingFile(tmp_path / 'train.csv', 300, seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.loadModel(str(tmp_path / 'train.csv'), useCache=False)
+        numMisses = agent.decisionCache.getCounters()['numMisses']
+
+        # the refit invalidates the table, and the cached decisions equal the model queried with
+        # one row at a time
+        decisions = [agent.decisionCache.lookup(*s) > 0 for s in states]
+        expected = [agent.getRewardLabel(agent.model, agent.encode(*s)) for s in states]
+        assert decisions == expected
+        assert agent.decisionCache.getCounters()['numMisses'] == numMisses + 1
+
+
+def test_bandit_agent_decisions_match_predict_after_retrain():
+    agent = ContextualBanditSVMAgent(
+            hyperparameterSearch=FullGridSearch(kTunedParameters, cv=3, numJobs=1))
+    states = state_codec.allStates()
+    for seed in [0, 1]:
+        agent.dataCounts = _makeDataCounts(seed)
+        agent._trainModel()
+        assert agent.clf is not None
+        numMisses = agent.decisionCache.getCounters()['numMisses']
+
+        # `getAction()` explores at random, so the decisions are read from the cache directly
+        decisions = [agent.decisionCache.lookup(*s) for s in states]
+        expected = [bool(agent._predictLabels(agent.scaler, agent.clf, [agent.encode(*s)])[0])
+                for s in states]
+        assert decisions == expected
+        assert agent.decisionCache.getCounters()['numMisses'] == numMisses + 1
+
+
+def test_prob_agent_decisions_follow_negative_reward():
+    agent = ContextualBanditSVMProbAgent(
+            hyperparameterSearch=FullGridSearch(kTunedParameters, cv=3, numJobs=1))
+    states = state_codec.allStates()
+    agent.dataCounts = _makeDataCounts(0)
+    agent.countDown = 0
+
+    # the next reward refits the scaler and the classifier on the history
+    agent.currentStateIdx = 0
+    agent.chosenAction = True
+    agent.stage = agent.STAGE_WAIT_REWARD
+    agent.feedReward(1)
+    assert agent.clf is not None
+
+    for negativeReward in [-0.1, -5.]:
+        agent.setNegativeReward(negativeReward)
+        decisions = [agent.decisionCache.lookup(*s) for s in states]
+        expected = []
+        for s in states:
+            probs = agent.clf.predict_proba(agent.scaler.transform([agent.encode(*s)]))[0]
+            expected.append(probs[0] * negativeReward + probs[1] > 0.)
+        assert decisions == expected
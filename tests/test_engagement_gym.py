@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('gym')
+
+from constant import *
+from environment import MTurkSurveyUser
+from behavior import RandomBehavior
+from human_modeling_utils.result_sink import NpyChunkResultSink
+from openai_gym.basic_engagement_gym_coach import BasicEngagementGymCoach
+
+
+kRootFolder = os.path.join(os.path.dirname(__file__), '..')
+
+
+def _makeConfig(episodeLengthDay, resultSink=None):
+    return {
+            "rewardCriteria": {
+                ANSWER_NOTIFICATION_ACCEPT: 1,
+                ANSWER_NOTIFICATION_IGNORE: 0,
+                ANSWER_NOTIFICATION_DISMISS: -5,
+            },
+            "environment": MTurkSurveyUser(
+                [os.path.join(kRootFolder, 'survey/ver2_mturk/sample_results/1st_batch_results.csv')],
+                dismissWarningMsg=True),
+            "behavior": RandomBehavior(),
+            "verbose": False,
+            "episodeLengthDay": episodeLengthDay,
+            "stepSizeMinute": 1,
+            "resultSink": resultSink,
+    }
+
+
+def test_gym_streams_episode_log_to_sink(tmp_path, capsys):
+    sink = NpyChunkResultSink(str(tmp_path / 'results'))
+    env = BasicEngagementGymCoach(_makeConfig(episodeLengthDay=8, resultSink=sink))
+
+    np.random.seed(0)
+    env.reset()
+    numSteps, done, numChunksWithinEpisode = 0, False, None
+    rewards = []
+    while not done:
+        _, reward, done, _ = env.step(int(np.random.random_sample() < 0.2))
+        rewards.append(reward)
+        numSteps += 1
+        if numSteps == env.simulationResults.chunkSize + 1:
+            numChunksWithinEpisode = sink.numChunks
+
+    # the full chunks are handed over while the episode proceeds, and the rest at the end
+    assert numChunksWithinEpisode is not None and numChunksWithinEpisode >= 1
+    reader = sink.getReader()
+    assert len(reader) == numSteps
+    assert np.array_equal(reader.getColumn('reward'), np.array(rewards, dtype=float))
+
+    decisions = reader.getColumn('decision')
+    assert "%d notifications have been sent" % np.sum(decisions) in capsys.readouterr().out
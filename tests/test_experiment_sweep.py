@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+
+from agent import AlwaysSendNotificationAgent, QLearningAgent
+from environment import StubbornUser, LessStubbornUser
+from behavior import RandomBehavior
+from controller import Controller
+from experiment_sweep import expandGrid, runSweep, summarizeResults
+
+
+def _failToBuild():
+    raise Exception("the environment cannot be built")
+
+
+def test_expand_grid():
+    configs = expandGrid({
+            'agent': [AlwaysSendNotificationAgent, QLearningAgent],
+            'environment': [StubbornUser, (LessStubbornUser, {'deviationProb': 0.2})],
+            'behavior': [RandomBehavior],
+            'seed': [3, 4, 5],
+    })
+
+    assert len(configs) == 12
+    assert [c['runIdx'] for c in configs] == list(range(12))
+    assert [(c['agentIdx'], c['environmentIdx'], c['seed']) for c in configs[:4]] == [
+            (0, 0, 3), (0, 0, 4), (0, 0, 5), (0, 1, 3)]
+    assert configs[-1]['agent'] is QLearningAgent
+    assert configs[-1]['environment'] == (LessStubbornUser, {'deviationProb': 0.2})
+    assert all(c['negativeReward'] == -10. and c['simulationWeek'] == 10 for c in configs)
+
+
+def test_sweep_reports_failed_runs():
+    grid = {
+            'agent': [QLearningAgent],
+            'environment': [LessStubbornUser, _failToBuild],
+            'behavior': [RandomBehavior],
+            'simulationWeek': [1],
+            'seed': [0, 1],
+    }
+    summaries = sorted(runSweep(grid, numWorkers=2), key=lambda s: s['runIdx'])
+
+    assert [s['runIdx'] for s in summaries] == [0, 1, 2, 3]
+    for summary in summaries[2:]:
+        assert summary['environment'] == '_failToBuild'
+        assert "the environment cannot be built" in summary['error']
+    for summary, seed in zip(summaries[:2], [0, 1]):
+        assert 'error' not in summary
+        random.seed(seed)
+        np.random.seed(seed)
+        results = Controller(QLearningAgent(), LessStubbornUser(), RandomBehavior(),
+                simulationWeek=1, verbose=False).execute()
+        expected = summarizeResults(results, 1)
+        assert {k: summary[k] for k in expected} == expected
@@ -0,0 +1,210 @@
+import contextlib
+import io
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from behavior import ExtraSensoryBehavior, writeTraceStore
+from human_modeling_utils import utils
+
+
+kSourceFile = os.path.join(os.path.dirname(__file__), '..', 'behavior/sample_data/1.txt')
+
+
+def _makeBehavior(sourceFiles=kSourceFile, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ExtraSensoryBehavior(sourceFiles, **kwargs)
+
+
+def _writeRoutingFile(path, days):
+    """
+    Write the records of the sample file on `days`, with home and work swapped so that the
+    routing differs from the sample one.
+    """
+    swap = {'home': 'work', 'work': 'home'}
+    with open(kSourceFile) as f:
+        lines = [l.strip().split('\t') for l in f.readlines()]
+    with open(str(path), 'w') as f:
+        for terms in lines:
+            if int(terms[3]) in days:
+                terms[1] = swap.get(terms[1], terms[1])
+                f.write('\t'.join(terms) + '\n')
+    return str(path)
+
+
+def _makeQueries(numQueries, seed):
+    random = np.random.RandomState(seed)
+    return list(zip(random.randint(24, size=numQueries).tolist(),
+            random.randint(60, size=numQueries).tolist(), random.randint(7, size=numQueries).tolist()))
+
+
+def test_unpickles_objects_with_parsed_routings():
+    behavior = _makeBehavior()
+    with open(kSourceFile) as f:
+        routing = [behavior._parseLine(l) for l in f.readlines()]
+
+    # the state of the objects pickled when the records were kept as parsed tuples
+    recordIdx = 500
+    oldState = {
+        'numActivityNan': behavior.numActivityNan,
+        'numLocationNan': behavior.numLocationNan,
+        'routings': [routing],
+        'srcIdx': 0,
+        'recordIdx': recordIdx,
+    }
+    restored = ExtraSensoryBehavior.__new__(ExtraSensoryBehavior)
+    restored.__setstate__(pickle.loads(pickle.dumps(oldState)))
+
+    for key in ['routingTimes', 'routingLocations', 'routingActivities']:
+        assert all((a == b).all() for a, b in zip(getattr(restored, key), getattr(behavior, key)))
+    assert restored.daySampling == ExtraSensoryBehavior.DAY_SAMPLING_OFF
+    assert (restored.dayStarts == behavior.dayStarts).all()
+
+    # the restored object continues the week from the record it had reached
+    recordHour, recordMinute, recordDay = routing[recordIdx][:3]
+    behavior.getLocationActivity(recordHour, recordMinute, recordDay)
+    for hour, minute, day in sorted(_makeQueries(200, 0), key=lambda q: (q[2], q[0], q[1])):
+        if (day, hour, minute) >= (recordDay, recordHour, recordMinute):
+            assert (restored.getLocationActivity(hour, minute, day)
+                    == behavior.getLocationActivity(hour, minute, day))
+
+
+def test_trace_store_lookups_match_text_files(tmp_path):
+    otherFile = _writeRoutingFile(tmp_path / 'other.txt', [1, 3])
+    text = _makeBehavior([kSourceFile, otherFile])
+    storePath = str(tmp_path / 'routings.store')
+    writeTraceStore(storePath, text.routingTimes, text.routingLocations, text.routingActivities,
+            text.numActivityNan, text.numLocationNan)
+
+    # the routings are picked from the store in the given order
+    expected = _makeBehavior([otherFile, kSourceFile])
+    stored = _makeBehavior(None, traceStorePath=storePath, routingIdxs=[1, 0])
+    assert (stored.numActivityNan, stored.numLocationNan) == (
+            expected.numActivityNan, expected.numLocationNan)
+    for key in ['routingTimes', 'routingLocations', 'routingActivities']:
+        assert all(np.array_equal(a, b) for a, b in zip(getattr(stored, key), getattr(expected, key)))
+
+    queries = _makeQueries(300, 1)
+    hours, minutes, days = (np.array(column) for column in zip(*queries))
+    for routingIdx in range(2):
+        for hour, minute, day in queries:
+            assert (stored.lookupLocationActivity(routingIdx, hour, minute, day)
+                    == expected.lookupLocationActivity(routingIdx, hour, minute, day))
+    routingIdxs = np.arange(len(queries)) % 2
+    for a, b in zip(stored.getLocationActivityBatch(hours, minutes, days, routingIdxs),
+            expected.getLocationActivityBatch(hours, minutes, days, routingIdxs)):
+        assert np.array_equal(a, b)
+    for hour, minute, day in queries:
+        assert (stored.getLocationActivity(hour, minute, day)
+                == expected.getLocationActivity(hour, minute, day))
+
+
+def test_pickles_trace_store_behavior(tmp_path):
+    text = _makeBehavior()
+    storePath = str(tmp_path / 'routings.store')
+    writeTraceStore(storePath, text.routingTimes, text.routingLocations, text.routingActivities)
+    stored = _makeBehavior(None, traceStorePath=storePath)
+
+    queries = _makeQueries(200, 2)
+    for hour, minute, day in queries[:100]:
+        stored.getLocationActivity(hour, minute, day)
+
+    # the store is reopened rather than copied, and the object keeps its position
+    pickled = pickle.dumps(stored)
+    assert len(pickled) < len(pickle.dumps(text)) // 10
+    with contextlib.redirect_stdout(io.StringIO()):
+        restored = pickle.loads(pickled)
+    assert restored.traceStorePath == storePath
+    for hour, minute, day in queries[100:]:
+        assert (restored.getLocationActivity(hour, minute, day)
+                == stored.getLocationActivity(hour, minute, day))
+
+
+def _parseDays(behavior, sourceFiles):
+    """
+    Returns:
+      A dictionary from (routing index, day of the week) to the sorted records of the day as
+      (minute of the day, stateLocation, stateActivity)
+    """
+    dayRecords = {}
+    for routingIdx, src in enumerate(sourceFiles):
+        with open(src) as f:
+            for line in f.readlines():
+                hour, minute, day, stateLocation, stateActivity = behavior._parseLine(line)
+                dayRecords.setdefault((routingIdx, day), []).append(
+                        (hour * 60 + minute, stateLocation, stateActivity))
+    for records in dayRecords.values():
+        records.sort(key=lambda r: r[0])
+    return dayRecords
+
+
+def _isAllowedDay(daySampling, queryDay, sampledDay):
+    if daySampling == ExtraSensoryBehavior.DAY_SAMPLING_ANY_DAY:
+        return True
+    elif daySampling == ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_TYPE:
+        return utils.getDayState(queryDay) == utils.getDayState(sampledDay)
+    return queryDay == sampledDay
+
+
+kDaySamplingModes = [
+    ExtraSensoryBehavior.DAY_SAMPLING_ANY_DAY,
+    ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_TYPE,
+    ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_OF_WEEK,
+]
+
+
+def test_sample_days_draw_from_allowed_days(tmp_path):
+    sourceFiles = [kSourceFile, _writeRoutingFile(tmp_path / 'other.txt', [1, 3])]
+    behavior = _makeBehavior(sourceFiles)
+    behavior.setRandomState(np.random.RandomState(0))
+    assert sorted(zip(behavior.dayRoutingIdxs.tolist(), behavior.dayOfWeeks.tolist())) == (
+            [(0, d) for d in range(7)] + [(1, 1), (1, 3)])
+
+    for daySampling in kDaySamplingModes:
+        for day in range(7):
+            dayIdxs = behavior.sampleDays(np.full(500, day), daySampling)
+            # every allowed day is drawn, and no other day
+            allowed = [i for i, d in enumerate(behavior.dayOfWeeks.tolist())
+                    if _isAllowedDay(daySampling, day, d)]
+            assert sorted(set(dayIdxs.tolist())) == allowed
+
+    # a day of the week which no routing recorded cannot be sampled
+    behavior = _makeBehavior(sourceFiles[1],
+            daySampling=ExtraSensoryBehavior.DAY_SAMPLING_SAME_DAY_OF_WEEK)
+    with pytest.raises(Exception):
+        behavior.getLocationActivity(12, 0, 0)
+
+
+def test_sampled_days_replay_recorded_days(tmp_path):
+    sourceFiles = [kSourceFile, _writeRoutingFile(tmp_path / 'other.txt', [1, 3])]
+    for daySampling in kDaySamplingModes:
+        behavior = _makeBehavior(sourceFiles, daySampling=daySampling)
+        behavior.setRandomState(np.random.RandomState(daySampling))
+        dayRecords = _parseDays(behavior, sourceFiles)
+
+        # two weeks queried every 7 minutes, so the second week starts on the same day
+        for week in range(2):
+            lastDay, lastDayIdx = None, None
+            for t in range(0, 7 * 24 * 60, 7):
+                day, hour, minute = t // (24 * 60), t // 60 % 24, t % 60
+                result = behavior.getLocationActivity(hour, minute, day)
+
+                # a day is drawn when the queried day changes, and it answers the whole day
+                dayIdx = behavior.dayIdx
+                if day == lastDay:
+                    assert dayIdx == lastDayIdx
+                lastDay, lastDayIdx = day, dayIdx
+                routingIdx = int(behavior.dayRoutingIdxs[dayIdx])
+                sampledDay = int(behavior.dayOfWeeks[dayIdx])
+                assert _isAllowedDay(daySampling, day, sampledDay)
+
+                # the first record at or after the time of the day, or the last record of the day
+                records = dayRecords[(routingIdx, sampledDay)]
+                record = next((r for r in records if r[0] >= hour * 60 + minute), records[-1])
+                assert result == record[1:]
+                stateLocations, stateActivities = behavior.lookupDayLocationActivity(
+                        [dayIdx], [hour], [minute])
+                assert (stateLocations.tolist(), stateActivities.tolist()) == (
+                        [record[1]], [record[2]])
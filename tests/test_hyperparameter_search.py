@@ -0,0 +1,83 @@
+import numpy as np
+
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.svm import SVC
+
+from agent.hyperparameter_search import CountGridSearchCV, FullGridSearch, getCountFolds
+from agent.contextual_bandit_svm_agent import ContextualBanditSVMAgent, kTunedParameters
+
+
+def _makeCountData(seed, numData):
+    agent = ContextualBanditSVMAgent()
+    rs = np.random.RandomState(seed)
+    stateXs = agent.stateXs.astype(float)
+    probPositive = 1. / (1. + np.exp(-(stateXs @ rs.randn(stateXs.shape[1]))))
+    stateIdxs = rs.randint(0, len(stateXs), numData)
+    labels = (rs.random_sample(numData) < probPositive[stateIdxs]).astype(int)
+    dataCounts = np.zeros((len(stateXs), 2), dtype=int)
+    np.add.at(dataCounts, (stateIdxs, labels), 1)
+    rowIdxs, dataY = np.nonzero(dataCounts)
+    return stateXs[rowIdxs], dataY, dataCounts[rowIdxs, dataY]
+
+
+def _repeatFolds(dataY, counts, numFolds):
+    """
+    Returns:
+      (rowIdxs, folds), where `rowIdxs` repeats each row by its count in the order of the class
+      and then of the row, and `folds` are the splits of `StratifiedKFold` over the repeated rows
+    """
+    order = np.argsort(dataY, kind='stable')
+    rowIdxs = np.repeat(order, counts[order])
+    folds = list(StratifiedKFold(numFolds).split(np.zeros(len(rowIdxs)), dataY[rowIdxs]))
+    return rowIdxs, folds
+
+
+def test_count_folds_follow_stratified_k_fold():
+    dataY = np.array([1, 0, 1, 0])
+    counts = np.array([3, 2, 0, 7])
+    testCounts = getCountFolds(dataY, counts, 5)
+
+    assert np.array_equal(testCounts.sum(axis=1), counts)
+    assert np.array_equal(testCounts.sum(axis=0), [3, 3, 2, 2, 2])
+    assert np.array_equal(testCounts, [[1, 1, 0, 0, 1], [2, 0, 0, 0, 0], [0, 0, 0, 0, 0],
+            [0, 2, 2, 2, 1]])
+
+
+def test_count_search_matches_search_over_repeated_rows():
+    for seed, numData in [(0, 60), (1, 300), (2, 1200)]:
+        dataX, dataY, counts = _makeCountData(seed, numData)
+        clf = CountGridSearchCV(SVC(), kTunedParameters, cv=5, n_jobs=1).fit(dataX, dataY, counts)
+
+        rowIdxs, folds = _repeatFolds(dataY, counts, 5)
+        testCounts = getCountFolds(dataY, counts, 5)
+        for f, (_, testIdxs) in enumerate(folds):
+            assert np.array_equal(
+                    np.bincount(rowIdxs[testIdxs], minlength=len(counts)), testCounts[:, f])
+        repeatedClf = GridSearchCV(SVC(), kTunedParameters, cv=folds, n_jobs=1).fit(
+                dataX[rowIdxs], dataY[rowIdxs])
+
+        assert clf.best_params_ == repeatedClf.best_params_
+        assert np.allclose(clf.cv_results_['mean_test_score'],
+                repeatedClf.cv_results_['mean_test_score'], atol=1e-6)
+        assert np.array_equal(clf.predict(dataX), repeatedClf.predict(dataX))
+
+
+def test_full_grid_search_with_counts():
+    dataX, dataY, counts = _makeCountData(3, 200)
+    clf = FullGridSearch(kTunedParameters, cv=5, numJobs=1).fit(SVC(), dataX, dataY,
+            counts=counts)
+    assert isinstance(clf, CountGridSearchCV)
+    assert np.isfinite(clf.best_score_)
+
+
+def test_bandit_agent_skips_training_without_enough_data(capsys):
+    agent = ContextualBanditSVMAgent()
+    agent.dataCounts[0, 1] = 2
+    agent.dataCounts[1, 0] = 2
+    assert agent._fitModel(agent.dataCounts) == (None, None)
+
+    # both labels are required as well
+    agent.dataCounts[2, 1] = 10
+    agent.dataCounts[:, 0] = 0
+    assert agent._fitModel(agent.dataCounts) == (None, None)
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,125 @@
+import os
+import shutil
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from constant import *
+from environment import MTurkSurveyUser
+from human_modeling_utils import state_codec
+from human_modeling_utils import utils
+
+
+kSurveyFile = os.path.join(os.path.dirname(__file__), '..',
+        'survey/ver2_mturk/sample_results/1st_batch_results.csv')
+
+
+def _copySurveyFile(tmp_path):
+    filePath = str(tmp_path / 'results.csv')
+    shutil.copy(kSurveyFile, filePath)
+    return filePath
+
+
+def _filterFunc(r):
+    return ord(r['rawWorkerID'][-1]) % 3 == 2
+
+
+def test_cached_columns_are_memory_mapped(tmp_path):
+    filePath = _copySurveyFile(tmp_path)
+    parsed = MTurkSurveyUser([filePath], dismissWarningMsg=True, useCache=False)
+    MTurkSurveyUser([filePath], dismissWarningMsg=True)
+    cached = MTurkSurveyUser([filePath], dismissWarningMsg=True)
+
+    assert isinstance(cached.records.columns['rawHour'], np.memmap)
+    assert list(cached.records) == list(parsed.records)
+    assert cached.records[7] == list(parsed.records)[7]
+    for name in ['bucketMinutes', 'bucketOutcomes', 'bucketResponses']:
+        for a, b in zip(getattr(cached, name), getattr(parsed, name)):
+            assert np.array_equal(a, b)
+
+
+def test_buckets_follow_record_order(tmp_path):
+    filePath = _copySurveyFile(tmp_path)
+    user = MTurkSurveyUser([filePath, filePath], filterFunc=_filterFunc, dismissWarningMsg=True)
+
+    records = [r for r in MTurkSurveyUser([filePath], dismissWarningMsg=True).records
+            if _filterFunc(r)] * 2
+    assert user.getNumTotalRecords() == len(records)
+    assert user.getNumUniqueWorkers() == len(set(r['rawWorkerID'] for r in records))
+
+    # the records of a bucket keep the order of the files and the rows
+    for bucketIdx, minutes in enumerate(user.bucketMinutes):
+        expectedMinutes = [r['rawHour'] * 60 + r['rawMinute'] for r in records
+                if _getBucket(r) == bucketIdx]
+        assert minutes.tolist() == expectedMinutes
+
+
+def _getBucket(r):
+    return state_codec.encodeBucket(r['stateDay'], r['stateLocation'], r['stateActivity'],
+            r['stateNotification'])
+
+
+def test_expected_reward_is_reentrant():
+    sampling = MTurkSurveyUser([kSurveyFile], dismissWarningMsg=True)
+    expected = MTurkSurveyUser([kSurveyFile], dismissWarningMsg=True,
+            responseMode=MTurkSurveyUser.RESPONSE_MODE_EXPECTED)
+    contexts = [(hour, 30, day, location, 0, 100) for hour in range(8, 22) for day in range(7)
+            for location in range(3)]
+
+    expectedRewards = []
+    for context in contexts:
+        probAnswer, _, probDismiss = expected.getResponseDistribution(*context)
+        expectedRewards.append(probAnswer - 5. * probDismiss)
+
+    # the expected rewards are computed while other threads keep sampling. The sampling does not
+    # share any scratch array between the threads either.
+    sampledDistributions = {(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0), (0.1, 0.8, 0.1)}
+
+    def getRewards(_):
+        for _ in range(10):
+            for context in contexts:
+                assert sampling.getResponseDistribution(*context) in sampledDistributions
+        return [sampling.getExpectedReward(*context, -5.) for context in contexts]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for rewards in executor.map(getRewards, range(16)):
+            assert rewards == expectedRewards
+    assert sampling.responseMode == MTurkSurveyUser.RESPONSE_MODE_SAMPLE
+
+
+def _sampleResponseFromRecords(records, hour, minute, day, stateLocation, stateActivity,
+        lastNotificationTime):
+    # the per-record sampling which the bucket arrays replaced
+    stateDay = utils.getDayState(day)
+    stateNotification = utils.getLastNotificationState(lastNotificationTime)
+    records = [r for r in records if (r['stateDay'], r['stateLocation'], r['stateActivity'],
+            r['stateNotification']) == (stateDay, stateLocation, stateActivity, stateNotification)]
+    if len(records) == 0:
+        return (0.1, 0.8, 0.1)
+
+    timeDiffs = [abs(utils.getDeltaMinutes(0, hour, minute, 0, r['rawHour'], r['rawMinute']))
+            for r in records]
+    weights = np.array([1. / (t + 5.) for t in timeDiffs])
+    chosenRecord = np.random.choice(a=records, p=weights / np.sum(weights))
+    return {
+            ANSWER_NOTIFICATION_ACCEPT: (1.0, 0.0, 0.0),
+            ANSWER_NOTIFICATION_IGNORE: (0.0, 1.0, 0.0),
+            ANSWER_NOTIFICATION_DISMISS: (0.0, 0.0, 1.0),
+    }[chosenRecord['answerNotification']]
+
+
+def test_sampling_matches_record_choice():
+    user = MTurkSurveyUser([kSurveyFile], dismissWarningMsg=True)
+    records = list(user.records)
+
+    rs = np.random.RandomState(0)
+    contexts = [(int(rs.randint(24)), int(rs.randint(60)), int(rs.randint(7)),
+            int(rs.choice(utils.allLocationStates())), int(rs.choice(utils.allActivityStates())),
+            int(rs.choice([5, 30, 100]))) for _ in range(2000)]
+
+    np.random.seed(1)
+    expected = [_sampleResponseFromRecords(records, *context) for context in contexts]
+    np.random.seed(1)
+    assert [user.getResponseDistribution(*context) for context in contexts] == expected
+    assert len(set(expected)) == 4
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from agent import NNAgent
+
+
+def _makeRandomModel(numInputs, seed):
+    rs = np.random.RandomState(seed)
+    shapes = [(numInputs, 32), (32,), (32, 32), (32,), (32, 3), (3,)]
+    return {'weights': [rs.randn(*shape).astype(np.float32) for shape in shapes]}
+
+
+def test_forward_matches_keras_predict():
+    pytest.importorskip('keras')
+    from keras.models import Sequential
+    from keras.layers import Dense, Dropout
+
+    agent = NNAgent()
+    agent.rewardLabels = [1, 0, -5]
+    stateXs = agent.stateXs.astype(float)
+
+    # the network of `trainModel()`, with random weights which make the outputs diverse
+    kerasModel = Sequential()
+    kerasModel.add(Dense(32, input_dim=stateXs.shape[1], activation='relu'))
+    kerasModel.add(Dropout(0.5))
+    kerasModel.add(Dense(32, activation='relu'))
+    kerasModel.add(Dropout(0.5))
+    kerasModel.add(Dense(3, activation='softmax'))
+    model = _makeRandomModel(stateXs.shape[1], 0)
+    kerasModel.set_weights(model['weights'])
+    expected = kerasModel.predict(stateXs, verbose=0)
+
+    logits = agent._forward(model, agent.stateXs)
+    probs = np.exp(logits - np.max(logits, axis=1, keepdims=True))
+    probs /= np.sum(probs, axis=1, keepdims=True)
+    assert np.allclose(probs, expected, rtol=1e-4, atol=1e-6)
+    assert len(np.unique(np.argmax(expected, axis=1))) == 3
+    assert np.array_equal(agent.getRewardLabels(model, agent.stateXs),
+            np.array(agent.rewardLabels)[np.argmax(expected, axis=1)])
+
+
+def test_saved_weights_give_same_labels(tmp_path):
+    agent = NNAgent()
+    agent.model = _makeRandomModel(agent.stateXs.shape[1], 0)
+    agent.rewardLabels = [1, 0, -5]
+    filepath = str(tmp_path / 'model.npz')
+    agent.saveModel(filepath)
+
+    restored = NNAgent()
+    restored.loadWeights(filepath)
+    assert restored.rewardLabels == agent.rewardLabels
+    assert np.array_equal(restored.getRewardLabels(restored.model, restored.stateXs),
+            agent.getRewardLabels(agent.model, agent.stateXs))
+    assert (restored.getRewardLabel(restored.model, restored.stateXs[7])
+            == agent.getRewardLabels(agent.model, agent.stateXs)[7])
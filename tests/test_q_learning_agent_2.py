@@ -0,0 +1,56 @@
+import numpy as np
+
+from agent import BaseAgent, QLearningAgent2, VectorizedQLearningAgent2
+from human_modeling_utils import state_codec
+
+
+def _makeHistory(numSteps, seed):
+    rs = np.random.RandomState(seed)
+    pool = state_codec.allStates()
+    pool = [pool[i] for i in rs.choice(len(pool), 8, replace=False)]
+    return [(pool[rs.randint(len(pool))], bool(rs.randint(2)), float(rs.choice([1, 0, -5])))
+            for _ in range(numSteps)]
+
+
+def _replayStepByStep(agent, history):
+    # the per-transition replay which `feedBatchRewards()` used to do
+    for i in range(len(history) - 1):
+        curState, curAction, reward = history[i]
+        nxtState, _, _ = history[i + 1]
+        agent._updateQTable(curState, curAction, reward, nxtState)
+        agent.numSteps += 1
+
+
+def _getQTable(agent):
+    return np.array([[agent.qTable[state][False], agent.qTable[state][True]]
+            for state in state_codec.allStates()])
+
+
+def test_batch_replay_matches_step_by_step_updates():
+    histories = [_makeHistory(n, seed) for seed, n in enumerate([130, 1, 75, 260])]
+
+    expectedAgent = QLearningAgent2(BaseAgent.MODE_BATCH)
+    agent = QLearningAgent2(BaseAgent.MODE_BATCH)
+    vectorizedAgent = VectorizedQLearningAgent2(operatingMode=BaseAgent.MODE_BATCH)
+    for history in histories:
+        _replayStepByStep(expectedAgent, history)
+        agent.feedBatchRewards(history)
+        vectorizedAgent.feedBatchRewards(history)
+
+        expected = _getQTable(expectedAgent)
+        assert np.array_equal(_getQTable(agent), expected)
+        assert np.array_equal(vectorizedAgent.qTable, expected)
+        assert agent.numSteps == vectorizedAgent.numSteps == expectedAgent.numSteps
+
+
+def test_epochs_replay_the_history_again():
+    history = _makeHistory(90, seed=7)
+
+    expectedAgent = QLearningAgent2(BaseAgent.MODE_BATCH)
+    for _ in range(3):
+        _replayStepByStep(expectedAgent, history)
+
+    agent = QLearningAgent2(BaseAgent.MODE_BATCH)
+    agent.feedBatchRewards(history, numEpochs=3)
+    assert np.array_equal(_getQTable(agent), _getQTable(expectedAgent))
+    assert agent.numSteps == expectedAgent.numSteps == 3 * 89
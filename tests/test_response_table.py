@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from environment import SurveyUser
+from environment.response_table import ResponseTable
+from environment.response_table import kResponseAnswer, kResponseIgnore, kResponseDismiss
+from human_modeling_utils import state_codec
+from human_modeling_utils import utils
+
+
+kSurveyFile = os.path.join(os.path.dirname(__file__), '..', 'survey/ver1_pilot/sample_data/01.txt')
+
+kEmptyDistribution = (0.1, 0.0, 0.9)
+
+
+def _makeBuckets(seed):
+    random = np.random.RandomState(seed)
+    bucketMinutes, bucketResponses = [], []
+    for bucket in range(state_codec.NUM_STATE_BUCKETS):
+        numRecords = random.randint(4) if bucket % 3 != 0 else 0
+        bucketMinutes.append(random.randint(24 * 60, size=numRecords))
+        bucketResponses.append(random.randint(3, size=numRecords))
+    return bucketMinutes, bucketResponses
+
+
+def test_table_matches_kernel():
+    bucketMinutes, bucketResponses = _makeBuckets(0)
+    table = ResponseTable(bucketMinutes, bucketResponses, kEmptyDistribution)
+
+    for bucket in range(state_codec.NUM_STATE_BUCKETS):
+        minutes, responses = bucketMinutes[bucket].tolist(), bucketResponses[bucket].tolist()
+        for minuteOfDay in [0, 1, 359, 720, 1000, 1439]:
+            if len(minutes) == 0:
+                expected = kEmptyDistribution
+            else:
+                weights = [1. / (abs(minuteOfDay - m) + 5.) for m in minutes]
+                expected = tuple(sum(w for w, r in zip(weights, responses) if r == response)
+                        / sum(weights) for response in [kResponseAnswer, kResponseIgnore,
+                        kResponseDismiss])
+            assert np.allclose(table.getDistribution(bucket, minuteOfDay), expected)
+        assert np.array_equal(table.getDistributions(bucket, np.array([0, 720, 1439])),
+                np.array([table.getDistribution(bucket, m) for m in [0, 720, 1439]]))
+
+
+def test_table_matches_survey_user():
+    environment = SurveyUser(kSurveyFile, useResponseTable=True)
+    for bucket, records in enumerate(environment.behavior):
+        for hour, minute in [(0, 0), (8, 30), (17, 59), (23, 59)]:
+            probAnswer = environment.responseTable.getDistribution(bucket, hour * 60 + minute)[0]
+            if len(records) == 0:
+                assert probAnswer == kEmptyDistribution[0]
+                continue
+            # the weights of the records as `SurveyUser` computes them without the table
+            weights = np.array([1. / (abs(utils.getDeltaMinutes(0, hour, minute, 0, r['rawHour'],
+                    r['rawMinute'])) + 5.) for r in records])
+            answers = np.array([r['answerNotification'] for r in records])
+            assert np.isclose(probAnswer, np.sum(weights[answers]) / np.sum(weights))
+
+
+def test_cache_file_is_reused_until_records_change(tmp_path, monkeypatch):
+    cachePath = str(tmp_path / 'table.npz')
+    bucketMinutes, bucketResponses = _makeBuckets(1)
+    built = ResponseTable(bucketMinutes, bucketResponses, kEmptyDistribution, cachePath)
+    assert os.path.exists(cachePath)
+
+    # the same records load the file without computing any bucket
+    def failToCompute(self, bucket):
+        raise AssertionError("bucket %d is computed instead of loaded" % bucket)
+    with monkeypatch.context() as patch:
+        patch.setattr(ResponseTable, '_computeBucket', failToCompute)
+        loaded = ResponseTable(bucketMinutes, bucketResponses, kEmptyDistribution, cachePath)
+    assert loaded.isBucketReady.all()
+    assert np.array_equal(loaded.table, built.table)
+
+    # other records change the fingerprint, hence the table is computed and the file rewritten
+    bucketMinutes[4] = np.append(bucketMinutes[4], 100)
+    bucketResponses[4] = np.append(bucketResponses[4], kResponseAnswer)
+    changed = ResponseTable(bucketMinutes, bucketResponses, kEmptyDistribution, cachePath)
+    assert changed.fingerprint != built.fingerprint
+    assert not np.array_equal(changed.table[4], built.table[4])
+    with np.load(cachePath) as data:
+        assert str(data['fingerprint']) == changed.fingerprint
+        assert np.array_equal(data['table'], changed.table)
@@ -0,0 +1,97 @@
+import numpy as np
+
+from human_modeling_utils.simulation_log import SimulationLog, kColumnNames, kContextColumns
+
+
+def _makeRecords(numRecords, seed):
+    """
+    Returns:
+      A list of the records in the format which the controller logged before `SimulationLog`
+    """
+    random = np.random.RandomState(seed)
+    records = []
+    for i in range(numRecords):
+        probs = random.dirichlet([1., 1., 1.]).tolist()
+        decision = bool(random.randint(2))
+        records.append({
+                'context': {
+                    'numDaysPassed': i // 84,
+                    'hour': int(random.randint(8, 22)),
+                    'minute': int(random.randint(60)),
+                    'day': (i // 84) % 7,
+                    'location': int(random.randint(3)),
+                    'activity': int(random.randint(4)),
+                    'lastNotification': int(random.randint(10000)),
+                },
+                'probOfAnswering': probs[0],
+                'probOfIgnoring': probs[1],
+                'probOfDismissing': probs[2],
+                'decision': decision,
+                'reward': [1, 0, -10][random.randint(3)] if decision else 0,
+        })
+    return records
+
+
+def _toArgs(record):
+    return ([record['context'][name] for name in kContextColumns]
+            + [record[name] for name in kColumnNames if name not in kContextColumns])
+
+
+def test_rows_match_records():
+    records = _makeRecords(50, 0)
+    for chunkSize in [1, 7, 64]:
+        log = SimulationLog(chunkSize=chunkSize)
+        for i, record in enumerate(records):
+            log.append(*_toArgs(record))
+            # the columns follow the appended records
+            assert len(log.getColumn('probOfAnswering')) == i + 1
+            assert log.getColumn('probOfAnswering')[-1] == record['probOfAnswering']
+
+        assert len(log) == len(records)
+        assert list(log) == records
+        assert log[-1] == records[-1]
+        assert log[3:20:4] == records[3:20:4]
+
+
+def test_extend_matches_append():
+    records = _makeRecords(30, 1)
+    appended = SimulationLog(chunkSize=8)
+    for record in records:
+        appended.append(*_toArgs(record))
+
+    extended = SimulationLog(chunkSize=8)
+    columns = {name: np.array(values) for name, values
+            in zip(kColumnNames, zip(*[_toArgs(record) for record in records]))}
+    extended.extend({name: column[:11] for name, column in columns.items()})
+    assert len(extended.getColumn('reward')) == 11
+    extended.extend({name: column[11:] for name, column in columns.items()})
+
+    assert list(extended) == records
+    for name in kColumnNames:
+        assert np.array_equal(extended.getColumn(name), appended.getColumn(name))
+
+
+class _ListSink:
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, columns):
+        self.chunks.append({name: column.copy() for name, column in columns.items()})
+
+
+def test_columns_follow_flushes():
+    records = _makeRecords(12, 2)
+    sink = _ListSink()
+    log = SimulationLog(chunkSize=4, sink=sink)
+    for record in records[:6]:
+        log.append(*_toArgs(record))
+    assert log.getColumn('hour').tolist() == [r['context']['hour'] for r in records[4:6]]
+
+    log.flush()
+    assert len(log.getColumn('hour')) == 0
+    for record in records[6:8]:
+        log.append(*_toArgs(record))
+    assert log.getColumn('hour').tolist() == [r['context']['hour'] for r in records[6:8]]
+    assert np.concatenate([c['reward'] for c in sink.chunks]).tolist() == [
+            r['reward'] for r in records[:6]]
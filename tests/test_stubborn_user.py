@@ -0,0 +1,30 @@
+import pickle
+import random
+
+import numpy as np
+
+from environment import StubbornUser, LessStubbornUser
+from human_modeling_utils import state_codec
+
+
+def test_unpickles_objects_with_behavior_dictionaries():
+    for environmentClass in [StubbornUser, LessStubbornUser]:
+        random.seed(3)
+        environment = environmentClass()
+
+        # the state of the objects pickled when the behavior was keyed by the state tuples
+        oldState = environment.__dict__.copy()
+        oldState['behavior'] = {state: bool(take) for state, take
+                in zip(state_codec.allStates(), environment.behavior.tolist())}
+        restored = pickle.loads(pickle.dumps(environment))
+        restored.__setstate__(oldState)
+
+        assert restored.behavior.dtype == environment.behavior.dtype
+        assert (restored.behavior == environment.behavior).all()
+        for hour, minute, day in [(3, 0, 0), (9, 30, 2), (13, 5, 5), (20, 59, 6)]:
+            for stateLocation, stateActivity in [(0, 0), (1, 2), (2, 3)]:
+                for lastNotificationTime in [0, 30, 240]:
+                    query = (hour, minute, day, stateLocation, stateActivity,
+                            lastNotificationTime)
+                    assert (restored.getResponseDistribution(*query)
+                            == environment.getResponseDistribution(*query))
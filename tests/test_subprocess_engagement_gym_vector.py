@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import random
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from openai_gym.subprocess_engagement_gym_vector import SubprocessEngagementGymVector
+
+
+class _CoinGym:
+    """
+    A tiny gym which draws from both global random generators when it is built, and afterwards
+    from the generator given to `setRandomState()`, like the engagement gyms do.
+    """
+
+    observation_space = None
+    action_space = None
+    randomState = None
+
+    def __init__(self, k):
+        self.offset = k + np.random.randint(100) + random.randint(0, 9)
+
+    def setRandomState(self, randomState):
+        self.randomState = randomState
+
+    def _getRandom(self):
+        return self.randomState if self.randomState is not None else np.random
+
+    def reset(self):
+        self.numSteps = 0
+        return np.array([self.offset, self._getRandom().randint(10)])
+
+    def step(self, action):
+        self.numSteps += 1
+        obs = np.array([self.offset + self.numSteps, self._getRandom().randint(10)])
+        reward = self._getRandom().random_sample() * action
+        return obs, reward, self.numSteps == 7, {}
+
+
+def _makeGym(k):
+    return _CoinGym(k)
+
+
+def _runVector(numWorkers, actions, seed):
+    numEnvs = actions.shape[1]
+    with SubprocessEngagementGymVector(_makeGym, numEnvs, numWorkers=numWorkers, seed=seed,
+            startMethod='fork') as vector:
+        results = [vector.reset().tolist()]
+        for stepActions in actions:
+            obs, rewards, dones, _ = vector.step(stepActions)
+            results.append((obs.tolist(), rewards.tolist(), dones.tolist()))
+    return results
+
+
+def _runStandalone(actions, seed):
+    numEnvs = actions.shape[1]
+    perEnv = []
+    for k in range(numEnvs):
+        np.random.seed(seed + k)
+        random.seed(seed + k)
+        env = _makeGym(k)
+        rows = [env.reset().tolist()]
+        for action in actions[:, k].tolist():
+            obs, reward, done, _ = env.step(action)
+            if done:
+                obs = env.reset()
+            rows.append((obs.tolist(), reward, done))
+        perEnv.append(rows)
+
+    results = [[rows[0] for rows in perEnv]]
+    for i in range(1, len(actions) + 1):
+        results.append(tuple([rows[i][j] for rows in perEnv] for j in range(3)))
+    return results
+
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+        reason="the workers are forked")
+
+
+def test_results_do_not_depend_on_number_of_workers():
+    actions = np.random.RandomState(0).randint(2, size=(20, 5))
+    expected = _runStandalone(actions, seed=3)
+    for numWorkers in [1, 2, 5]:
+        assert _runVector(numWorkers, actions, seed=3) == expected
+
+
+def test_dead_worker_is_reported():
+    vector = SubprocessEngagementGymVector(_makeGym, 4, numWorkers=2, seed=0, startMethod='fork')
+    vector.reset()
+    os.kill(vector.processes[1].pid, signal.SIGKILL)
+    vector.processes[1].join()
+    with pytest.raises(Exception, match="worker 1"):
+        vector.step(np.zeros(4, dtype=int))
+    assert vector.isClosed
+
+
+def _makeEngagementGym(k):
+    gym = pytest.importorskip('gym')
+    from constant import ANSWER_NOTIFICATION_ACCEPT, ANSWER_NOTIFICATION_IGNORE, \
+            ANSWER_NOTIFICATION_DISMISS
+    from environment import MTurkSurveyUser
+    from behavior import RandomBehavior
+    from openai_gym.basic_engagement_gym_coach import BasicEngagementGymCoach
+
+    rootFolder = os.path.join(os.path.dirname(__file__), '..')
+    return BasicEngagementGymCoach({
+            "rewardCriteria": {
+                ANSWER_NOTIFICATION_ACCEPT: 1,
+                ANSWER_NOTIFICATION_IGNORE: 0,
+                ANSWER_NOTIFICATION_DISMISS: -5,
+            },
+            "environment": MTurkSurveyUser(
+                    [os.path.join(rootFolder, 'survey/ver2_mturk/sample_results/1st_batch_results.csv')],
+                    dismissWarningMsg=True),
+            "behavior": RandomBehavior(),
+            "verbose": False,
+            "episodeLengthDay": 1,
+            "stepSizeMinute": 1,
+    })
+
+
+def test_engagement_gym_throughput(record_property):
+    pytest.importorskip('gym')
+    numEnvs, numSteps, seed = 8, 1000, 11
+    actions = (np.random.RandomState(5).random_sample((numSteps, numEnvs)) < 0.3).astype(int)
+
+    # standalone gyms, stepped one after another on the global random generators
+    expected = []
+    standaloneTime = 0.
+    for k in range(numEnvs):
+        np.random.seed(seed + k)
+        random.seed(seed + k)
+        env = _makeEngagementGym(k)
+        env.reset()
+        rewards = []
+        startTime = time.perf_counter()
+        for action in actions[:, k].tolist():
+            _, reward, done, _ = env.step(action)
+            if done:
+                env.reset()
+            rewards.append(reward)
+        standaloneTime += time.perf_counter() - startTime
+        expected.append(rewards)
+    standaloneThroughput = numEnvs * numSteps / standaloneTime
+
+    with SubprocessEngagementGymVector(_makeEngagementGym, numEnvs, numWorkers=2, seed=seed,
+            startMethod='fork') as vector:
+        vector.reset()
+        startTime = time.perf_counter()
+        rewards = []
+        for stepActions in actions:
+            _, stepRewards, _, _ = vector.step(stepActions)
+            rewards.append(stepRewards.tolist())
+        vectorThroughput = numEnvs * numSteps / (time.perf_counter() - startTime)
+
+    assert np.array(rewards).T.tolist() == expected
+
+    record_property('standalone_steps_per_second', standaloneThroughput)
+    record_property('vector_steps_per_second', vectorThroughput)
+    print("engagement gym steps per second: standalone %.0f, 2 workers %.0f"
+            % (standaloneThroughput, vectorThroughput))
+    # the gyms have to run at a rate comparable to standalone ones, which rules out any overhead
+    # per step of the gym itself (e.g., swapping the global random states)
+    assert vectorThroughput > 0.3 * standaloneThroughput
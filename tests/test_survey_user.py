@@ -0,0 +1,33 @@
+import os
+import pickle
+
+import numpy as np
+
+from environment import SurveyUser
+from human_modeling_utils import state_codec
+
+
+kSurveyFile = os.path.join(os.path.dirname(__file__), '..', 'survey/ver1_pilot/sample_data/01.txt')
+
+
+def test_survey_user_unpickles_bucket_dictionary():
+    environment = SurveyUser(kSurveyFile)
+
+    # the state of the objects pickled when the records were keyed by the bucket tuples
+    oldState = environment.__dict__.copy()
+    oldState['behavior'] = {bucketTuple: records for bucketTuple, records
+            in zip(state_codec.allBuckets(), environment.behavior)}
+    del oldState['responseTable']
+    restored = pickle.loads(pickle.dumps(environment))
+    restored.__setstate__(oldState)
+
+    assert restored.behavior == environment.behavior
+    assert restored.responseTable is None
+    for day in [1, 6]:
+        for stateLocation in [0, 1, 2]:
+            for stateActivity in [0, 1]:
+                query = (10, 0, day, stateLocation, stateActivity, 100)
+                restored.setRandomState(np.random.RandomState(0))
+                environment.setRandomState(np.random.RandomState(0))
+                assert (restored.getResponseDistribution(*query)
+                        == environment.getResponseDistribution(*query))
@@ -0,0 +1,14 @@
+import numpy as np
+
+from human_modeling_utils import utils
+
+
+def test_draw_index_matches_random_choice():
+    rs = np.random.RandomState(0)
+    probsList = [utils.normalize(*rs.random_sample(rs.randint(1, 5))) for _ in range(200)]
+    probsList += [[0.2, 0.0, 0.8], [0.0, 0.0, 1.0], [0.25, 0.75], [0.1, 0.7, 0.2]]
+
+    np.random.seed(1)
+    expected = [np.random.choice(len(p), p=p) for p in probsList]
+    np.random.seed(1)
+    assert [utils.drawIndex(p) for p in probsList] == expected
@@ -0,0 +1,80 @@
+import numpy as np
+
+from agent import (QLearningAgent, QLearningAgent2, VectorizedQLearningAgent,
+        VectorizedQLearningAgent2)
+from agent import q_learning_agent, q_learning_agent_2
+from human_modeling_utils import state_codec
+
+
+def _makeStates(numSteps, seed):
+    # a handful of states, so that they are visited many times
+    rs = np.random.RandomState(seed)
+    pool = state_codec.allStates()
+    pool = [pool[i] for i in rs.choice(len(pool), 6, replace=False)]
+    return [pool[i] for i in rs.randint(len(pool), size=numSteps)]
+
+
+def _getReward(state, action):
+    if not action:
+        return 0
+    return 1 if state_codec.encodeState(*state) % 3 == 0 else -5
+
+
+def _runAgent(agent, states):
+    actions = []
+    for state in states:
+        action = agent.getAction(*state)
+        agent.feedReward(_getReward(state, action))
+        actions.append(bool(action))
+    return actions
+
+
+def _getQTable(agent):
+    return np.array([[agent.qTable[state][False], agent.qTable[state][True]]
+            for state in state_codec.allStates()])
+
+
+def test_single_user_matches_q_learning_agent():
+    states = _makeStates(1500, seed=0)
+    for agentClass, vectorizedClass in [(QLearningAgent, VectorizedQLearningAgent),
+            (QLearningAgent2, VectorizedQLearningAgent2)]:
+        agent = agentClass()
+        np.random.seed(3)
+        expected = _runAgent(agent, states)
+        assert any(expected) and not all(expected)
+
+        vectorizedAgent = vectorizedClass()
+        np.random.seed(3)
+        assert _runAgent(vectorizedAgent, states) == expected
+        assert np.array_equal(vectorizedAgent.qTable, _getQTable(agent))
+
+
+def test_many_users_match_separate_agents(monkeypatch):
+    # without exploration, the decisions do not depend on the order of the random draws
+    monkeypatch.setattr(q_learning_agent, 'kInitEps', 0.)
+    monkeypatch.setattr(q_learning_agent, 'kMinEps', 0.)
+    monkeypatch.setattr(q_learning_agent_2, 'kInitEps', 0.)
+    monkeypatch.setattr(q_learning_agent_2, 'kMinEps', 0.)
+
+    numUsers = 4
+    userStates = [_makeStates(500, seed=k) for k in range(numUsers)]
+    for agentClass, vectorizedClass in [(QLearningAgent, VectorizedQLearningAgent),
+            (QLearningAgent2, VectorizedQLearningAgent2)]:
+        agents = [agentClass() for _ in range(numUsers)]
+        expected = [_runAgent(agent, states) for agent, states in zip(agents, userStates)]
+
+        class _GreedyAgent(vectorizedClass):
+            INIT_EPS = 0.
+            MIN_EPS = 0.
+
+        vectorizedAgent = _GreedyAgent(numUsers=numUsers)
+        results = []
+        for stepStates in zip(*userStates):
+            actions = vectorizedAgent.getActionBatch(*np.array(stepStates).T)
+            vectorizedAgent.feedRewardBatch([_getReward(state, action)
+                    for state, action in zip(stepStates, actions.tolist())])
+            results.append(actions.tolist())
+
+        assert [list(actions) for actions in zip(*results)] == expected
+        for k, agent in enumerate(agents):
+            assert np.array_equal(vectorizedAgent.qTable[k], _getQTable(agent))